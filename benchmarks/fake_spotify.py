@@ -0,0 +1,240 @@
+import hashlib
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+from spotipy.exceptions import SpotifyException
+
+# Items a Spotify playlist can hold
+PLAYLIST_ITEM_LIMIT = 10000
+
+_ID_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+def _spotify_id(seed: str) -> str:
+    # Deterministic 22 character base62 id, shaped like a real Spotify id
+    number = int(hashlib.sha1(seed.encode()).hexdigest(), 16)
+    chars = []
+    for _ in range(22):
+        number, digit = divmod(number, 62)
+        chars.append(_ID_ALPHABET[digit])
+    return ''.join(chars)
+
+class Catalog:
+    # Synthetic Spotify catalog of num_tracks tracks spread over albums and artists.
+    # Track i is "Track i" on "Album <a>" by "Artist <a % num_artists>", a = i // tracks_per_album.
+
+    def __init__(self, num_tracks: int = 50000, num_artists: int = 2000, tracks_per_album: int = 12,
+                 seed: int = 0):
+        rng = random.Random(seed)
+        self.tracks = []
+        self._by_title_artist = {}
+        self._by_text = {}
+        self._by_artist: Dict[str, List[Dict]] = {}
+        self._by_isrc: Dict[str, Dict] = {}
+        self.albums: List[Dict] = []
+        self.album_tracks: Dict[str, List[Dict]] = {}
+        self._albums_by_artist: Dict[str, List[Dict]] = {}
+        for i in range(num_tracks):
+            album_index = i // tracks_per_album
+            artist_index = album_index % num_artists
+            artists = [{'id': _spotify_id(f"artist:{artist_index}"), 'name': f"Artist {artist_index}"}]
+            if i % tracks_per_album == 0:
+                album = {'id': _spotify_id(f"album:{album_index}"), 'name': f"Album {album_index}",
+                         'artists': artists, 'total_tracks': 0}
+                self.albums.append(album)
+                self.album_tracks[album['id']] = []
+                self._albums_by_artist.setdefault(artists[0]['name'].lower(), []).append(album)
+            track = {
+                'id': _spotify_id(f"track:{i}"),
+                'name': f"Track {i}",
+                'artists': artists,
+                'album': {'id': album['id'], 'name': album['name']},
+                'duration_ms': rng.randint(90, 420) * 1000,
+                'track_number': i % tracks_per_album + 1,
+                'external_ids': {'isrc': f"QZ{seed % 100:02d}{i:08d}"}
+            }
+            self.tracks.append(track)
+            self.album_tracks[album['id']].append(track)
+            album['total_tracks'] += 1
+            title, artist = track['name'].lower(), track['artists'][0]['name'].lower()
+            self._by_title_artist[(title, artist)] = track
+            self._by_text[f"{title} {artist}"] = track
+            self._by_artist.setdefault(artist, []).append(track)
+            self._by_isrc[track['external_ids']['isrc'].lower()] = track
+
+    def search(self, query: str) -> List[Dict]:
+        # Resolve field filter queries ("track:X artist:Y") to the exact track, and free
+        # text queries ("X Y") to the exact track ranked behind a few others by the same
+        # artist, the way a popularity ranked result list often is. "isrc:X" finds the
+        # track with that ISRC.
+        query = query.lower().strip()
+        if query.startswith('isrc:'):
+            track = self._by_isrc.get(query[len('isrc:'):].strip())
+            return [track] if track else []
+        if query.startswith('track:') and ' artist:' in query:
+            title, artist = query[len('track:'):].split(' artist:', 1)
+            track = self._by_title_artist.get((title.strip(), artist.strip()))
+            return [track] if track else []
+        track = self._by_text.get(query)
+        if not track:
+            return []
+        others = [other for other in self._by_artist[track['artists'][0]['name'].lower()] if other is not track]
+        return others[:4] + [track]
+
+    def search_albums(self, query: str) -> List[Dict]:
+        # Resolve "album:X artist:Y" to that album ranked behind a couple of the artist's others
+        query = query.lower().strip()
+        if not query.startswith('album:') or ' artist:' not in query:
+            return []
+        name, artist = (part.strip() for part in query[len('album:'):].split(' artist:', 1))
+        albums = self._albums_by_artist.get(artist, [])
+        exact = [album for album in albums if album['name'].lower() == name]
+        return [album for album in albums if album['name'].lower() != name][:2] + exact
+
+class FakeSpotify:
+    # In-process stand-in for spotipy.Spotify implementing the calls SpotifyUploader makes.
+    #
+    # latency:        seconds each call takes (jitter adds up to that fraction on top)
+    # throttle_rate:  probability that any call fails with a 429
+    # rate_limit:     requests/second above which calls fail with a 429 (0 = unlimited)
+    # retry_after:    Retry-After seconds sent with every 429
+
+    def __init__(self, catalog: Optional[Catalog] = None, latency: float = 0.05, jitter: float = 0.5,
+                 throttle_rate: float = 0.0, rate_limit: float = 0.0, retry_after: float = 1.0,
+                 user_id: str = 'benchmark-user', seed: int = 0):
+        self.catalog = catalog or Catalog()
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.user_id = user_id
+        self.calls: Dict[str, int] = {}
+        self.throttled = 0
+        self.playlists: Dict[str, Dict] = {}
+        self._random = random.Random(seed)
+        self._window: List[float] = []
+        self._lock = threading.Lock()
+
+    def _request(self, endpoint: str) -> None:
+        # Account for one request, then either throttle it or wait out its latency
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            now = time.monotonic()
+            throttle = self._random.random() < self.throttle_rate
+            if self.rate_limit:
+                # Sliding one second window
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.rate_limit:
+                    throttle = True
+                else:
+                    self._window.append(now)
+            delay = self.latency * (1 + self._random.random() * self.jitter)
+            if throttle:
+                self.throttled += 1
+        time.sleep(delay)
+        if throttle:
+            raise SpotifyException(429, -1, f"{endpoint}: API rate limit exceeded",
+                                   headers={'Retry-After': str(self.retry_after)})
+
+    def _page(self, items: List[Dict], limit: int, offset: int, kind: str, key: str) -> Dict:
+        end = offset + limit
+        return {
+            'items': items[offset:end],
+            'total': len(items),
+            'limit': limit,
+            'offset': offset,
+            'next': {'kind': kind, 'key': key, 'limit': limit, 'offset': end} if end < len(items) else None
+        }
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    # Users and playlists
+
+    def current_user(self) -> Dict:
+        self._request('current_user')
+        return {'id': self.user_id}
+
+    def user_playlists(self, user: str, limit: int = 50, offset: int = 0) -> Dict:
+        self._request('user_playlists')
+        items = [{'id': playlist_id, 'name': playlist['name'], 'owner': {'id': self.user_id}}
+                 for playlist_id, playlist in self.playlists.items()]
+        return self._page(items, limit, offset, 'user_playlists', user)
+
+    def user_playlist_create(self, user: str, name: str, public: bool = True, collaborative: bool = False,
+                             description: str = '') -> Dict:
+        self._request('user_playlist_create')
+        playlist_id = _spotify_id(f"playlist:{name}:{len(self.playlists)}")
+        with self._lock:
+            self.playlists[playlist_id] = {'name': name, 'track_ids': [], 'version': 0}
+        return {'id': playlist_id, 'name': name}
+
+    def _playlist(self, playlist_id: str) -> Dict:
+        if playlist_id not in self.playlists:
+            raise SpotifyException(404, -1, f"Playlist {playlist_id} not found")
+        return self.playlists[playlist_id]
+
+    def _snapshot_id(self, playlist_id: str) -> str:
+        return _spotify_id(f"snapshot:{playlist_id}:{self.playlists[playlist_id]['version']}")
+
+    def playlist(self, playlist_id: str, fields: Optional[str] = None, **kwargs) -> Dict:
+        # fields filters aren't interpreted; every field the uploader asks for is returned
+        self._request('playlist')
+        playlist = self._playlist(playlist_id)
+        return {
+            'id': playlist_id,
+            'name': playlist['name'],
+            'snapshot_id': self._snapshot_id(playlist_id),
+            'tracks': {'total': len(playlist['track_ids'])}
+        }
+
+    def playlist_items(self, playlist_id: str, fields: Optional[str] = None, limit: int = 100, offset: int = 0,
+                       **kwargs) -> Dict:
+        self._request('playlist_items')
+        items = [{'track': {'id': track_id}} for track_id in self._playlist(playlist_id)['track_ids']]
+        return self._page(items, limit, offset, 'playlist_items', playlist_id)
+
+    def playlist_tracks(self, playlist_id: str, fields: Optional[str] = None, limit: int = 100, offset: int = 0,
+                        **kwargs) -> Dict:
+        return self.playlist_items(playlist_id, fields, limit, offset)
+
+    def playlist_add_items(self, playlist_id: str, items: List[str], position: Optional[int] = None) -> Dict:
+        self._request('playlist_add_items')
+        if len(items) > 100:
+            raise SpotifyException(400, -1, "You can add a maximum of 100 tracks per request")
+        with self._lock:
+            playlist = self._playlist(playlist_id)
+            if len(playlist['track_ids']) + len(items) > PLAYLIST_ITEM_LIMIT:
+                raise SpotifyException(400, -1, f"Playlists can't hold more than {PLAYLIST_ITEM_LIMIT} items")
+            playlist['track_ids'].extend(item.split(':')[-1] for item in items)
+            playlist['version'] += 1
+        return {'snapshot_id': self._snapshot_id(playlist_id)}
+
+    def next(self, result: Dict) -> Optional[Dict]:
+        page = result.get('next')
+        if not page:
+            return None
+        if page['kind'] == 'user_playlists':
+            return self.user_playlists(page['key'], page['limit'], page['offset'])
+        if page['kind'] == 'album_tracks':
+            return self.album_tracks(page['key'], page['limit'], page['offset'])
+        return self.playlist_items(page['key'], limit=page['limit'], offset=page['offset'])
+
+    # Catalog
+
+    def search(self, q: str, limit: int = 10, offset: int = 0, type: str = 'track', market: Optional[str] = None) -> Dict:
+        self._request('search')
+        items = self.catalog.search_albums(q) if type == 'album' else self.catalog.search(q)
+        return {type + 's': {'items': items[offset:offset + limit], 'total': len(items),
+                             'limit': limit, 'offset': offset, 'next': None}}
+
+    def album_tracks(self, album_id: str, limit: int = 50, offset: int = 0, market: Optional[str] = None) -> Dict:
+        self._request('album_tracks')
+        if album_id not in self.catalog.album_tracks:
+            raise SpotifyException(404, -1, f"Album {album_id} not found")
+        # Simplified track objects, which carry no album
+        items = [{key: value for key, value in track.items() if key not in ('album', 'external_ids')}
+                 for track in self.catalog.album_tracks[album_id]]
+        return self._page(items, limit, offset, 'album_tracks', album_id)
@@ -0,0 +1,235 @@
+import argparse
+import os
+import random
+import struct
+from typing import Dict, List, Optional
+
+# Synthetic iPod library for scan benchmarks.
+#
+#     poetry run python -m benchmarks.library /tmp/fake-ipod --files 10000
+#
+# Builds iPod_Control/Music/F00..F49 with randomly named files the way the iPod
+# stores them, and an iTunesDB listing most of them. The mix covers what real
+# libraries contain: MP3s with ID3v2.3 and v2.4 tags, M4As, files with large cover
+# art, files with no tags at all, and files whose title tag holds "Artist - Title".
+# Audio payloads are short so large libraries fit on disk; tags are realistic.
+
+MUSIC_DIRS = 50
+
+# One second of 128kbps 44.1kHz MPEG-1 Layer III is ~38 frames of 417 bytes
+_MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+_ARTISTS = ['Radiohead', 'Björk', 'Sigur Rós', 'The Beatles', 'Daft Punk', 'Beyoncé', 'Miles Davis',
+            'Fleetwood Mac', 'Kendrick Lamar', 'Nirvana', 'Röyksopp', 'Aphex Twin', 'Joni Mitchell',
+            'Outkast', 'Massive Attack', 'Pixies', 'Talking Heads', 'Stevie Wonder', 'Portishead', 'Blur']
+_GENRES = ['Rock', 'Electronic', 'Jazz', 'Hip-Hop', 'Pop', 'Alternative', 'Soul', 'Folk']
+
+# Share of each kind of file in the library
+DEFAULT_MIX = {
+    'mp3': 0.55,
+    'mp3_v24': 0.10,
+    'm4a': 0.20,
+    'artwork': 0.06,
+    'combined_title': 0.06,
+    'tagless': 0.03
+}
+
+def _syncsafe(value: int) -> bytes:
+    return bytes([(value >> 21) & 0x7f, (value >> 14) & 0x7f, (value >> 7) & 0x7f, value & 0x7f])
+
+def _id3_text_frame(frame_id: str, text: str, version: int) -> bytes:
+    # UTF-16 text in v2.3, UTF-8 in v2.4 (which also uses syncsafe frame sizes)
+    if version == 4:
+        payload = b'\x03' + text.encode('utf-8')
+        size = _syncsafe(len(payload))
+    else:
+        payload = b'\x01' + text.encode('utf-16')
+        size = struct.pack('>I', len(payload))
+    return frame_id.encode() + size + b'\x00\x00' + payload
+
+def _id3_picture_frame(image: bytes, version: int) -> bytes:
+    payload = b'\x00image/jpeg\x00\x03\x00' + image
+    size = _syncsafe(len(payload)) if version == 4 else struct.pack('>I', len(payload))
+    return b'APIC' + size + b'\x00\x00' + payload
+
+def build_mp3(tags: Dict[str, str], audio_frames: int, version: int = 3, image: bytes = b'',
+              padding: int = 1024) -> bytes:
+    # An ID3v2 tag (frames given as {frame_id: text}) followed by CBR MPEG audio
+    if not tags and not image:
+        return _MP3_FRAME * audio_frames
+    frames = b''.join(_id3_text_frame(frame_id, text, version) for frame_id, text in tags.items())
+    if image:
+        frames += _id3_picture_frame(image, version)
+    frames += b'\x00' * padding
+    return b'ID3' + bytes([version, 0, 0]) + _syncsafe(len(frames)) + frames + _MP3_FRAME * audio_frames
+
+def _atom(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+def _full_atom(kind: bytes, payload: bytes) -> bytes:
+    return _atom(kind, b'\x00\x00\x00\x00' + payload)
+
+def _data_atom(value: bytes, data_type: int) -> bytes:
+    return _atom(b'data', struct.pack('>II', data_type, 0) + value)
+
+def build_m4a(tags: Dict[bytes, str], seconds: int, audio_bytes: int, image: bytes = b'',
+              freeform: Optional[Dict[str, str]] = None) -> bytes:
+    # A minimal AAC file: ftyp, a moov with one sound track and iTunes metadata, and mdat.
+    # freeform items ({name: text}) are written as com.apple.iTunes '----' atoms.
+    mvhd = _full_atom(b'mvhd', struct.pack('>IIII', 0, 0, 1000, seconds * 1000) + b'\x00' * 80)
+    mdhd = _full_atom(b'mdhd', struct.pack('>IIII', 0, 0, 44100, seconds * 44100) + b'\x00' * 4)
+    hdlr = _full_atom(b'hdlr', b'\x00' * 4 + b'soun' + b'\x00' * 13)
+    esds = _full_atom(b'esds', bytes.fromhex('03190000000411401500000000000000000000000005021210060102'))
+    mp4a = _atom(b'mp4a', b'\x00' * 6 + struct.pack('>H', 1) + b'\x00' * 8 +
+                 struct.pack('>HHHHI', 2, 16, 0, 0, 44100 << 16) + esds)
+    stbl = _atom(b'stbl', _full_atom(b'stsd', struct.pack('>I', 1) + mp4a) +
+                 _full_atom(b'stts', struct.pack('>I', 0)) + _full_atom(b'stsc', struct.pack('>I', 0)) +
+                 _full_atom(b'stsz', struct.pack('>II', 0, 0)) + _full_atom(b'stco', struct.pack('>I', 0)))
+    minf = _atom(b'minf', _full_atom(b'smhd', b'\x00' * 4) + stbl)
+    trak = _atom(b'trak', _full_atom(b'tkhd', b'\x00' * 80) + _atom(b'mdia', mdhd + hdlr + minf))
+
+    items = b''.join(_atom(key, _data_atom(text.encode('utf-8'), 1)) for key, text in tags.items())
+    for name, text in (freeform or {}).items():
+        items += _atom(b'----', _full_atom(b'mean', b'com.apple.iTunes') + _full_atom(b'name', name.encode()) +
+                       _data_atom(text.encode('utf-8'), 1))
+    if image:
+        items += _atom(b'covr', _data_atom(image, 13))
+    meta = _full_atom(b'meta', _full_atom(b'hdlr', b'\x00' * 4 + b'mdirappl' + b'\x00' * 9) + _atom(b'ilst', items))
+    moov = _atom(b'moov', mvhd + trak + _atom(b'udta', meta))
+    return _atom(b'ftyp', b'M4A \x00\x00\x00\x00M4A mp42isom') + moov + _atom(b'mdat', b'\x00' * audio_bytes)
+
+def _mhod(kind: int, text: str) -> bytes:
+    encoded = text.encode('utf-16-le')
+    return (b'mhod' + struct.pack('<IIIII', 24, 40 + len(encoded), kind, 0, 0) +
+            struct.pack('<IIII', 1, len(encoded), 1, 0) + encoded)
+
+def _mhit(track: Dict) -> bytes:
+    strings = {1: track['title'], 2: track['location'], 3: track['album'], 4: track['artist'], 5: track['genre']}
+    strings = {kind: text for kind, text in strings.items() if text}
+    mhods = b''.join(_mhod(kind, text) for kind, text in strings.items())
+    header = bytearray(0x184)
+    header[0:4] = b'mhit'
+    struct.pack_into('<III', header, 4, len(header), len(header) + len(mhods), len(strings))
+    struct.pack_into('<IIIIII', header, 40, track['seconds'] * 1000, track['track_number'], 0,
+                     track['year'], 128, 44100 << 16)
+    return bytes(header) + mhods
+
+def build_itunesdb(tracks: List[Dict]) -> bytes:
+    # mhbd > mhsd (track list) > mhlt > mhit for each track
+    items = b''.join(_mhit(track) for track in tracks)
+    mhlt = b'mhlt' + struct.pack('<II', 92, len(tracks)) + b'\x00' * 80
+    mhsd = b'mhsd' + struct.pack('<III', 96, 96 + len(mhlt) + len(items), 1) + b'\x00' * 80
+    body = mhsd + mhlt + items
+    return b'mhbd' + struct.pack('<II', 104, 104 + len(body)) + b'\x00' * 92 + body
+
+def _pick_kind(rng: random.Random, mix: Dict[str, float]) -> str:
+    roll = rng.random() * sum(mix.values())
+    for kind, share in mix.items():
+        roll -= share
+        if roll < 0:
+            return kind
+    return kind
+
+def generate_library(root: str, count: int, seed: int = 0, mix: Optional[Dict[str, float]] = None,
+                     audio_kb: int = 16, artwork_kb: int = 300, itunesdb: bool = True,
+                     itunesdb_coverage: float = 0.95) -> Dict[str, int]:
+    # Write count files under root/iPod_Control/Music and, unless itunesdb is False, an
+    # iTunesDB listing itunesdb_coverage of the tagged ones (the rest stand in for files
+    # copied onto the iPod by hand). Returns how many files of each kind were written.
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    music_path = os.path.join(root, 'iPod_Control', 'Music')
+    audio_frames = max(1, audio_kb * 1024 // len(_MP3_FRAME))
+    # Cover art content doesn't matter, only its size
+    image = b'\xff\xd8\xff\xe0' + os.urandom(artwork_kb * 1024)
+
+    names = [set() for _ in range(MUSIC_DIRS)]
+    counts: Dict[str, int] = {}
+    tracks = []
+    for i in range(count):
+        kind = _pick_kind(rng, mix)
+        counts[kind] = counts.get(kind, 0) + 1
+        artist = rng.choice(_ARTISTS)
+        track = {
+            'title': f"Song {i}",
+            'artist': artist,
+            'album': f"{artist} Album {i % 7}",
+            'genre': rng.choice(_GENRES),
+            'year': rng.randint(1965, 2008),
+            'track_number': i % 12 + 1,
+            'seconds': rng.randint(90, 420),
+            # Every third file carries an ISRC, written hyphenated half the time as some taggers do
+            'isrc': (f"QZ-LIB-{i % 100:02d}-{i:05d}" if i % 2 else f"QZLIB{i:07d}") if i % 3 == 0 else None
+        }
+
+        # iPod style names: F00..F49, four random letters
+        directory = i % MUSIC_DIRS
+        while True:
+            name = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(4))
+            if name not in names[directory]:
+                names[directory].add(name)
+                break
+        extension = '.m4a' if kind == 'm4a' or (kind == 'artwork' and i % 2) else '.mp3'
+        folder = f"F{directory:02d}"
+        os.makedirs(os.path.join(music_path, folder), exist_ok=True)
+        file_path = os.path.join(music_path, folder, name + extension)
+
+        if extension == '.m4a':
+            tags = {b'\xa9nam': track['title'], b'\xa9ART': artist, b'\xa9alb': track['album'],
+                    b'\xa9gen': track['genre'], b'\xa9day': str(track['year'])}
+            freeform = {'ISRC': track['isrc']} if track['isrc'] else None
+            data = build_m4a(tags, track['seconds'], audio_kb * 1024, image if kind == 'artwork' else b'', freeform)
+        elif kind == 'tagless':
+            data = build_mp3({}, audio_frames)
+        else:
+            tags = {'TIT2': track['title'], 'TPE1': artist, 'TALB': track['album'], 'TCON': track['genre'],
+                    'TRCK': str(track['track_number'])}
+            if kind == 'combined_title':
+                # Title tag carries both, no artist tag
+                tags['TIT2'] = f"{artist} - {track['title']}"
+                del tags['TPE1']
+            if i % 2:
+                # Written the way encoders do, from the audio actually in the file
+                tags['TLEN'] = str(audio_frames * 1152 * 1000 // 44100)
+            if track['isrc']:
+                tags['TSRC'] = track['isrc']
+            version = 4 if kind == 'mp3_v24' else 3
+            tags['TDRC' if version == 4 else 'TYER'] = str(track['year'])
+            data = build_mp3(tags, audio_frames, version, image if kind == 'artwork' else b'')
+        with open(file_path, 'wb') as f:
+            f.write(data)
+
+        if kind != 'tagless' and rng.random() < itunesdb_coverage:
+            track['location'] = f":iPod_Control:Music:{folder}:{name}{extension}"
+            if kind == 'combined_title':
+                track['title'], track['artist'] = f"{artist} - {track['title']}", ''
+            tracks.append(track)
+
+    if itunesdb:
+        itunes_path = os.path.join(root, 'iPod_Control', 'iTunes')
+        os.makedirs(itunes_path, exist_ok=True)
+        with open(os.path.join(itunes_path, 'iTunesDB'), 'wb') as f:
+            f.write(build_itunesdb(tracks))
+        counts['itunesdb_tracks'] = len(tracks)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic iPod music library")
+    parser.add_argument('root', help="directory to build the library in")
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--audio-kb', type=int, default=16, help="audio payload per file")
+    parser.add_argument('--artwork-kb', type=int, default=300, help="cover art size in artwork-heavy files")
+    parser.add_argument('--itunesdb-coverage', type=float, default=0.95,
+                        help="fraction of tagged files listed in the iTunesDB")
+    parser.add_argument('--no-itunesdb', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    counts = generate_library(args.root, args.files, seed=args.seed, audio_kb=args.audio_kb,
+                              artwork_kb=args.artwork_kb, itunesdb=not args.no_itunesdb,
+                              itunesdb_coverage=args.itunesdb_coverage)
+    print(f"Generated {args.files} files in {args.root}: " +
+          ", ".join(f"{kind} {count}" for kind, count in sorted(counts.items())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+from ipod_to_spotify.metadata import iter_ipod_audio
+from ipod_to_spotify.metrics import read_io_counters
+from .library import generate_library
+
+# Scan benchmark over synthetic iPod libraries.
+#
+#     poetry run python -m benchmarks.scan --files 1000 10000 100000
+#
+# Libraries are generated once per size under --workdir and reused by later runs.
+# Every strategy is measured in a fresh interpreter so peak RSS belongs to that
+# strategy alone. Byte counts come from /proc/self/io (Linux): rchar counts bytes
+# returned by read calls (pages touched through mmap aren't included), read_bytes
+# counts what actually came from the disk (0 when the library is in the page cache;
+# use --drop-caches as root for cold runs). With the process engine the reads happen
+# in worker processes and aren't included.
+
+# Scan strategy name -> environment settings
+STRATEGIES = {
+    'itunesdb': {'SCAN_SOURCE': 'auto', 'SCAN_READER': 'fast'},
+    'fast': {'SCAN_SOURCE': 'files', 'SCAN_READER': 'fast'},
+    'fast-no-duration': {'SCAN_SOURCE': 'files', 'SCAN_READER': 'fast', 'SCAN_READ_DURATION': 'false'},
+    'mutagen': {'SCAN_SOURCE': 'files', 'SCAN_READER': 'mutagen'},
+    'mutagen-serial': {'SCAN_SOURCE': 'files', 'SCAN_READER': 'mutagen', 'SCAN_WORKERS': '1'},
+    'mutagen-process': {'SCAN_SOURCE': 'files', 'SCAN_READER': 'mutagen', 'SCAN_ENGINE': 'process'}
+}
+
+def measure_scan(ipod_path: str) -> Dict:
+    # Scan once with the current environment's settings and report what it cost
+    io_before = read_io_counters()
+    started = time.perf_counter()
+    songs = 0
+    unknown = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for song in iter_ipod_audio(ipod_path):
+            songs += 1
+            if song['title'] == 'Unknown Title' or song['artist'] == 'Unknown Artist':
+                unknown += 1
+    elapsed = time.perf_counter() - started
+    io_after = read_io_counters()
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {
+        'songs': songs,
+        'unknown': unknown,
+        'seconds': round(elapsed, 3),
+        'files_per_sec': round(songs / elapsed, 1) if elapsed else 0,
+        'rchar': io_after.get('rchar', 0) - io_before.get('rchar', 0),
+        'read_bytes': io_after.get('read_bytes', 0) - io_before.get('read_bytes', 0),
+        'peak_rss_mb': round(peak_rss / 1024, 1)
+    }
+
+def ensure_library(workdir: str, count: int, seed: int) -> str:
+    # Generate the library for this size unless a previous run already did
+    root = os.path.join(workdir, f"ipod-{count}")
+    marker = os.path.join(root, '.generated')
+    if not os.path.exists(marker):
+        print(f"Generating {count} file library in {root}...", flush=True)
+        counts = generate_library(root, count, seed=seed)
+        with open(marker, 'w') as f:
+            json.dump(counts, f)
+    return root
+
+def _drop_caches() -> bool:
+    try:
+        subprocess.run(['sync'], check=False)
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except OSError:
+        return False
+
+def run_strategy(ipod_path: str, strategy: str, workers: Optional[int]) -> Dict:
+    # Measure one strategy in a child interpreter
+    env = dict(os.environ, **STRATEGIES[strategy])
+    if workers and 'SCAN_WORKERS' not in STRATEGIES[strategy]:
+        env['SCAN_WORKERS'] = str(workers)
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.scan', '--measure', ipod_path],
+                            env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark iPod scanning on synthetic libraries")
+    parser.add_argument('--files', type=int, nargs='+', default=[1000, 10000], help="library sizes to test")
+    parser.add_argument('--strategies', nargs='+', default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument('--workers', type=int, help="SCAN_WORKERS for the pooled strategies")
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'ipod-to-spotify-bench'),
+                        help="where generated libraries are kept")
+    parser.add_argument('--drop-caches', action='store_true', help="drop the page cache before each run (root)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--measure', metavar='IPOD_PATH', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_scan(args.measure)))
+        return
+
+    results = []
+    for count in args.files:
+        root = ensure_library(args.workdir, count, args.seed)
+        for strategy in args.strategies:
+            if args.drop_caches and not _drop_caches():
+                print("Could not drop the page cache (needs root), runs will be warm")
+                args.drop_caches = False
+            result = run_strategy(root, strategy, args.workers)
+            result.update({'files': count, 'strategy': strategy})
+            results.append(result)
+            print(f"{count:>7} files  {strategy:<17}{result['files_per_sec']:>10} files/s"
+                  f"{result['rchar'] / 1048576:>10.1f} MB read{result['read_bytes'] / 1048576:>9.1f} MB disk"
+                  f"{result['peak_rss_mb']:>9} MB RSS", flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
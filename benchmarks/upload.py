@@ -0,0 +1,156 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+from ipod_to_spotify.ratelimit import RateGovernor
+from ipod_to_spotify.song import Song
+from ipod_to_spotify.spotify import SpotifyUploader
+from .fake_spotify import Catalog, FakeSpotify
+
+# Offline benchmark of SpotifyUploader.upload_songs against FakeSpotify.
+#
+#     poetry run python -m benchmarks.upload --songs 2000 --latency 0.05 --workers 1 8
+#
+# Every run works in a scratch directory, so the caches and reports in the project
+# directory are left alone.
+
+def make_songs(catalog: Catalog, count: int, hit_rate: float = 0.9, duplicate_rate: float = 0.1,
+               invalid_rate: float = 0.02, isrc_rate: float = 0.0, album_rate: float = 0.0,
+               seed: int = 0) -> List[Song]:
+    # Build a library of count songs: mostly catalog tracks, some with no match on
+    # Spotify, some repeated (as re-imports are) and some with unknown metadata.
+    # isrc_rate of the catalog tracks carry their ISRC tag, and album_rate of them
+    # bring the rest of their album along, the way whole albums are ripped.
+    rng = random.Random(seed)
+    songs = []
+    while len(songs) < count:
+        i = len(songs)
+        roll = rng.random()
+        if songs and roll < duplicate_rate:
+            entries = [songs[rng.randrange(len(songs))].to_dict()]
+        elif roll < duplicate_rate + invalid_rate:
+            entries = [{'title': 'Unknown Title', 'artist': f"Artist {i}", 'album': 'Unknown Album'}]
+        elif rng.random() < hit_rate:
+            picked = catalog.tracks[rng.randrange(len(catalog.tracks))]
+            tracks = catalog.album_tracks[picked['album']['id']] if rng.random() < album_rate else [picked]
+            entries = []
+            for track in tracks:
+                data = {'title': track['name'], 'artist': track['artists'][0]['name'],
+                        'album': track['album']['name'], 'length_seconds': track['duration_ms'] // 1000}
+                if rng.random() < isrc_rate:
+                    data['isrc'] = track['external_ids']['isrc']
+                entries.append(data)
+        else:
+            entries = [{'title': f"Unreleased {i}", 'artist': f"Garage Band {i % 97}", 'album': 'Demos'}]
+        for data in entries[:count - len(songs)]:
+            i = len(songs)
+            data['file_path'] = f"/iPod_Control/Music/F{i % 50:02d}/{i:06d}.mp3"
+            data['format'] = 'mp3'
+            songs.append(Song.from_dict(data))
+    return songs
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+def run_upload(client: FakeSpotify, songs: List[Song], workers: int, rate: float, playlist_name: str) -> Dict:
+    # Time one upload_songs run and the latency of every API call it makes, including
+    # time spent waiting on the rate governor and retrying 429s
+    os.environ['SPOTIFY_WORKERS'] = str(workers)
+    governor = RateGovernor(rate=rate, max_rate=rate, state_file=None)
+    uploader = SpotifyUploader(client=client, governor=governor)
+
+    latencies = []
+    call = uploader._call
+
+    def timed_call(method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return call(method, *args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    uploader._call = timed_call
+    calls_before = client.total_calls
+    throttled_before = client.throttled
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = uploader.upload_songs(songs, playlist_name)
+    elapsed = time.perf_counter() - started
+    uploader.store.close()
+
+    api_calls = client.total_calls - calls_before
+    return {
+        'workers': workers,
+        'songs': len(songs),
+        'seconds': round(elapsed, 3),
+        'songs_per_sec': round(len(songs) / elapsed, 1),
+        'api_calls': api_calls,
+        'calls_per_song': round(api_calls / len(songs), 3),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 1),
+        'throttled': client.throttled - throttled_before,
+        'added': results['success_count'],
+        'failed': results['failed_count']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload_songs against a local Spotify stand-in")
+    parser.add_argument('--songs', type=int, default=2000, help="songs in the synthetic library")
+    parser.add_argument('--catalog', type=int, default=50000, help="tracks in the synthetic Spotify catalog")
+    parser.add_argument('--hit-rate', type=float, default=0.9, help="fraction of songs that exist on Spotify")
+    parser.add_argument('--isrc-rate', type=float, default=0.0, help="fraction of matching songs tagged with an ISRC")
+    parser.add_argument('--album-rate', type=float, default=0.0,
+                        help="fraction of matching songs that come with the rest of their album")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per API call")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="probability of a 429 on any call")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="server side requests/second limit (0 = none)")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument('--rate', type=float, default=30.0, help="client request rate (the governor's ceiling)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8], help="SPOTIFY_WORKERS values to compare")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.catalog, seed=args.seed)
+    songs = make_songs(catalog, args.songs, hit_rate=args.hit_rate, isrc_rate=args.isrc_rate,
+                       album_rate=args.album_rate, seed=args.seed)
+
+    results = []
+    project_dir = os.getcwd()
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as scratch:
+            os.chdir(scratch)
+            try:
+                client = FakeSpotify(catalog, latency=args.latency, throttle_rate=args.throttle_rate,
+                                     rate_limit=args.rate_limit, retry_after=args.retry_after, seed=args.seed)
+                # A first run against an empty search cache and playlist, then a rerun of
+                # the same library with everything cached and already uploaded
+                for scenario in ('cold', 'warm'):
+                    result = run_upload(client, songs, workers, args.rate, 'Benchmark')
+                    result['scenario'] = scenario
+                    results.append(result)
+            finally:
+                os.chdir(project_dir)
+
+    print(f"{'scenario':<9}{'workers':>8}{'songs/s':>10}{'calls':>8}{'calls/song':>12}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'429s':>6}")
+    for result in results:
+        print(f"{result['scenario']:<9}{result['workers']:>8}{result['songs_per_sec']:>10}"
+              f"{result['api_calls']:>8}{result['calls_per_song']:>12}{result['p50_ms']:>9}"
+              f"{result['p99_ms']:>9}{result['throttled']:>6}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
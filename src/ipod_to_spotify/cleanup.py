@@ -1,13 +1,32 @@
 import os
+import shutil
 import sys
 
 def cleanup():
     # Files to clean up
     files_to_remove = [
-        'metadata_check_results.json', # Metadata check results
-        'ipod_songs.json',        # Scanned songs metadata
-        'upload_results.json',    # Upload results and statistics
-        'playlist_cache.json',    # Spotify playlist cache
+        'ipod_library.db',        # Songs, upload and metadata check results, playlists and search cache
+        'ipod_library.db-wal',    # Library store write-ahead log
+        'ipod_library.db-shm',    # Library store shared memory index
+        'ipod_songs.jsonl',       # Scanned songs metadata (older versions)
+        'ipod_raw_metadata.jsonl', # Raw tags and technical info (older versions)
+        'ipod_songs.json',        # Scanned songs metadata (older versions)
+        'ipod_raw_metadata.json', # Raw metadata sidecar (older versions)
+        'ipod_scan_index.json',   # File fingerprints for incremental rescans (older versions)
+        'devices',                # Per-device libraries from multi-iPod scans (older versions)
+        'metadata_check_results.jsonl', # Metadata check results (older versions)
+        'metadata_check_results.json',  # Metadata check results (older versions)
+        'upload_results.jsonl',   # Upload results (older versions)
+        'upload_results.json',    # Upload results (older versions)
+        'playlist_cache.json',    # Spotify playlist cache (older versions)
+        'playlist_tracks_cache.json',  # Cached playlist contents (older versions)
+        'search_cache.db',        # Cached Spotify search results (older versions)
+        'search_cache.db-wal',    # Search cache write-ahead log (older versions)
+        'search_cache.db-shm',    # Search cache shared memory index (older versions)
+        'rate_limit_state.json',  # Learned Spotify request rate
+        'upload_journal.jsonl',   # Progress of an interrupted upload
+        'metrics.json',           # Timings and counters from the last run
+        'metrics.prom',           # The same metrics in Prometheus text format
         '.cache'                  # Spotify authentication cache
     ]
     
@@ -17,7 +36,10 @@ def cleanup():
     for file in files_to_remove:
         if os.path.exists(file):
             try:
-                os.remove(file)
+                if os.path.isdir(file):
+                    shutil.rmtree(file)
+                else:
+                    os.remove(file)
                 print(f"Removed: {file}")
                 found = True
             except Exception as e:
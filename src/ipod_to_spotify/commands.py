@@ -1,38 +1,249 @@
 import os
 import json
-from typing import Optional, List, Dict
-from .metadata import scan_ipod_for_audio
-from .device import find_ipod_path
-from .spotify import process_songs
+from typing import Optional, List, Dict, Iterator
+from .metadata import iter_ipod_audio, make_search_key
+from .device import find_ipod_paths, device_id, device_label
+from .spotify import process_songs, SpotifyUploader
+from .song import Song
+from .library import iter_songs
+from .journal import UploadJournal
+from .reports import ReportWriter
+from .store import LibraryStore, MAIN_LIBRARY
+from .metrics import metrics, print_above_progress
+from .pool import ordered_map, prefetch
 from . import env
 
-def load_existing_songs() -> Optional[List[Dict]]:
-    """Load songs from existing JSON file if it exists."""
-    if os.path.exists('ipod_songs.json'):
+# Multi-device scans keep each iPod's songs in a library of their own, named by volume
+DEVICE_LIBRARY_PREFIX = 'device:'
+
+# Library files saved by older versions, moved into the store the first time it's opened
+LEGACY_LIBRARY_FILES = [('ipod_songs.jsonl', 'ipod_raw_metadata.jsonl'),
+                        ('ipod_songs.json', 'ipod_raw_metadata.json')]
+LEGACY_SCAN_INDEX = 'ipod_scan_index.json'
+
+def import_legacy_library(store: LibraryStore) -> bool:
+    """Move a library saved as JSON files by an older version into the store.
+    
+    Its scan index comes along, so the next rescan can still be incremental.
+    The files are deleted once the import succeeds. Returns whether there was
+    one to import.
+    """
+    for songs_path, raw_path in LEGACY_LIBRARY_FILES:
+        if not os.path.exists(songs_path):
+            continue
+        fingerprints = {}
+        if os.path.exists(LEGACY_SCAN_INDEX):
+            try:
+                with open(LEGACY_SCAN_INDEX, 'r') as f:
+                    fingerprints = json.load(f)
+            except json.JSONDecodeError:
+                pass
         try:
-            with open('ipod_songs.json', 'r') as f:
-                songs = json.load(f)
-            return songs
-        except json.JSONDecodeError:
-            print("Error reading existing songs file. Will need to rescan.")
-    return None
+            with store.writer(MAIN_LIBRARY) as writer:
+                for song in iter_songs(songs_path, raw_path):
+                    if song.genre is None and song.raw_metadata.get('TCON'):
+                        # Saved before songs had a genre field, with the raw metadata alongside
+                        song.genre = song.raw_metadata['TCON'][0]
+                    writer.write(song, fingerprints.get(song.file_path))
+        except (json.JSONDecodeError, KeyError):
+            print(f"Error reading '{songs_path}', it can't be imported.")
+            return False
+        for path in (songs_path, raw_path, LEGACY_SCAN_INDEX):
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"Moved {writer.count} songs from '{songs_path}' into '{store.path}'")
+        return True
+    return False
+
+def load_existing_songs(store: LibraryStore, library: str = MAIN_LIBRARY) -> Optional[List[Song]]:
+    """Load songs from the library store if it has any.
+    
+    Libraries saved as JSON files by older versions are imported first.
+    Raw metadata stays in the store until a report asks for it, so the store
+    must stay open while the songs are in use.
+    """
+    if not store.has_library(library):
+        if library != MAIN_LIBRARY or not import_legacy_library(store):
+            return None
+    return store.load_songs(library) or None
+
+def load_scan_index(store: LibraryStore, library: str = MAIN_LIBRARY) -> Dict[str, List[int]]:
+    """Load file fingerprints from the previous scan if they exist."""
+    return store.fingerprints(library)
+
+def iter_new_songs(store: LibraryStore, ipod_path: str, incremental: bool = False, keep_raw_metadata: bool = False,
+                   show_progress: bool = True, library: str = MAIN_LIBRARY, export_metrics: bool = True) -> Iterator[Song]:
+    """Scan iPod for songs, yielding each one as it's found and writing it to the library store.
+    
+    The new library only replaces the old one once the scan completes. With
+    incremental=True only files that are new or changed since the last scan
+    are re-read; everything else is taken from the existing library. Songs keep
+    their raw metadata in memory with keep_raw_metadata=True, for consumers that
+    need it before the scan (and so the stored library) is complete.
+    """
+    previous_songs = None
+    fingerprints = {}
+    if incremental:
+        previous_songs = load_existing_songs(store, library)
+        fingerprints = load_scan_index(store, library)
+        if previous_songs is None or not fingerprints:
+            print_above_progress(f"No previous scan index found for {ipod_path}, doing a full scan.")
+            previous_songs = None
+    
+    with store.writer(library, keep_raw_metadata) as writer:
+        for song in iter_ipod_audio(ipod_path, previous_songs=previous_songs, fingerprints=fingerprints,
+                                    show_progress=show_progress):
+            writer.write(song, fingerprints.get(song.file_path))
+            yield song
+        if not writer.count:
+            writer.discard()
+    
+    if writer.count:
+        if library == MAIN_LIBRARY:
+            # It's one iPod's songs now, not a combination of several
+            store.set_main_devices([])
+        where = f"'{store.path}'" if library == MAIN_LIBRARY else f"library '{library}' of '{store.path}'"
+        print_above_progress(f"Saved metadata for {writer.count} songs to {where}")
+        if export_metrics:
+            metrics.export()
+
+def scan_new_songs(store: LibraryStore, ipod_path: str, incremental: bool = False) -> Optional[List[Song]]:
+    """Scan iPod for songs, writing them to the library store as they're found."""
+    return list(iter_new_songs(store, ipod_path, incremental=incremental))
+
+def dedupe_across_devices(libraries: List[List[Song]]) -> List[Song]:
+    """Combine per-device libraries, dropping songs an earlier device already has.
+    
+    Songs count as the same when they'd share a Spotify search (normalized title
+    and artist). Duplicates within one device are kept, as a single scan keeps them.
+    """
+    combined = []
+    seen_keys = set()
+    dropped = 0
+    for songs in libraries:
+        device_keys = set()
+        for song in songs:
+            if song['title'] != 'Unknown Title' and song['artist'] != 'Unknown Artist':
+                key = make_search_key(song['title'], song['artist'])
+                if key in seen_keys:
+                    dropped += 1
+                    continue
+                device_keys.add(key)
+            combined.append(song)
+        seen_keys.update(device_keys)
+    if dropped:
+        print(f"Skipped {dropped} songs already found on another iPod")
+    return combined
+
+def assign_device_libraries(store: LibraryStore, ipod_paths: List[str]) -> List[str]:
+    """The library of each iPod, 'device:<volume name>'.
+    
+    An iPod keeps the library it was first given (see device_id), so the names
+    don't depend on the order the volumes are found in. Volumes sharing a name
+    get numbered libraries ('device:IPOD-2', 'device:IPOD-3', ...).
+    """
+    known = store.device_libraries()
+    taken = set(known.values())
+    libraries = []
+    for ipod_path in ipod_paths:
+        key = device_id(ipod_path)
+        library = known.get(key)
+        if library is None or library in libraries:
+            label = device_label(ipod_path)
+            library = DEVICE_LIBRARY_PREFIX + label
+            number = 2
+            while library in taken:
+                library = f"{DEVICE_LIBRARY_PREFIX}{label}-{number}"
+                number += 1
+            known[key] = library
+            taken.add(library)
+        libraries.append(library)
+    store.set_device_libraries(known)
+    return libraries
 
-def scan_new_songs(ipod_path: str) -> Optional[List[Dict]]:
-    """Scan iPod for songs and save to JSON."""
-    songs = scan_ipod_for_audio(ipod_path)
-    if songs:
-        with open('ipod_songs.json', 'w') as f:
-            json.dump(songs, f, indent=2)
-        print(f"Saved metadata for {len(songs)} songs to 'ipod_songs.json'")
+def scan_all_devices(store: LibraryStore, ipod_paths: List[str], incremental: bool = True) -> Optional[List[Song]]:
+    """Scan several iPods at once into per-device libraries, then combine them.
+    
+    Each device keeps its own library (with its scan index) in the store, named
+    'device:<volume name>' (see assign_device_libraries), so incremental
+    rescans work per device. The deduplicated combination becomes the main
+    library every other option works from, keeping each song's fingerprint
+    from its device library. Devices the main library was combined from before
+    that aren't connected now keep their stored songs, so rescanning some of
+    the iPods never drops the others.
+    """
+    libraries = assign_device_libraries(store, ipod_paths)
+    missing = [library for library in store.main_devices() if library not in libraries]
+    
+    def scan(device) -> List[Song]:
+        ipod_path, library = device
+        songs = list(iter_new_songs(store, ipod_path, incremental=incremental, show_progress=False,
+                                    library=library, export_metrics=False))
+        print(f"{ipod_path}: {len(songs)} songs")
+        return songs
+    
+    if len(ipod_paths) > 1:
+        print(f"\nScanning {len(ipod_paths)} iPods at the same time...")
+    device_songs = list(ordered_map(scan, zip(ipod_paths, libraries), len(ipod_paths)))
+    for library in missing:
+        device_songs.append(store.load_songs(library))
+        print(f"{library[len(DEVICE_LIBRARY_PREFIX):]} isn't connected, keeping its "
+              f"{len(device_songs[-1])} songs from the last scan")
+    songs = dedupe_across_devices(device_songs)
+    metrics.export()
+    if not songs:
+        return None
+    
+    libraries += missing
+    fingerprints = {}
+    for library in libraries:
+        fingerprints.update(store.fingerprints(library))
+    with store.writer(MAIN_LIBRARY) as writer:
+        for song in songs:
+            writer.write(song, fingerprints.get(song.file_path))
+    store.set_main_devices(libraries)
+    print(f"Saved {len(songs)} songs from {len(libraries)} iPod(s) to '{store.path}'")
     return songs
 
-def print_song_samples(songs: List[Dict]):
+def print_song_samples(songs: List[Song]):
     """Print sample of songs found."""
     print("\nSample songs:")
     for song in songs[:5]:
         print(f"  - {song['title']} by {song['artist']} ({song['album']})")
 
-def handle_spotify_upload(songs: List[Dict]):
+def choose_playlist_name() -> Optional[str]:
+    """Ask which playlist to upload to; None means the default 'iPod Library'."""
+    # Check if default playlist name is set in env
+    default_name = env.get_default_playlist_name()
+    if default_name != 'iPod Library':  # Non-default value found in env
+        print("\nChoose playlist name option:")
+        print(f"1. Use name from .env file ({default_name})")
+        print("2. Enter custom name")
+        print("3. Use default name (iPod Library)")
+        
+        while True:
+            name_choice = input("\nEnter your choice (1-3): ").strip()
+            if name_choice == "1":
+                playlist_name = default_name
+                break
+            elif name_choice == "2":
+                playlist_name = input("\nEnter playlist name: ").strip()
+                if not playlist_name:
+                    print("Using default name (iPod Library)")
+                    playlist_name = None
+                break
+            elif name_choice == "3":
+                playlist_name = None  # Will use default iPod Library
+                break
+            else:
+                print("Invalid choice. Please enter 1-3.")
+    else:
+        playlist_name = input("\nEnter playlist name (press Enter for default 'iPod Library'): ").strip()
+        if not playlist_name:
+            playlist_name = None
+    return playlist_name
+
+def handle_spotify_upload(store: LibraryStore, songs: List[Song]):
     """Handle Spotify upload process."""
     error = env.load_spotify_env()
     if error:
@@ -47,43 +258,16 @@ def handle_spotify_upload(songs: List[Dict]):
     while True:
         choice = input("\nEnter your choice (1 or 2): ").strip()
         if choice == "1":
-            # Check if default playlist name is set in env
-            default_name = env.get_default_playlist_name()
-            if default_name != 'iPod Library':  # Non-default value found in env
-                print("\nChoose playlist name option:")
-                print(f"1. Use name from .env file ({default_name})")
-                print("2. Enter custom name")
-                print("3. Use default name (iPod Library)")
-                
-                while True:
-                    name_choice = input("\nEnter your choice (1-3): ").strip()
-                    if name_choice == "1":
-                        playlist_name = default_name
-                        break
-                    elif name_choice == "2":
-                        playlist_name = input("\nEnter playlist name: ").strip()
-                        if not playlist_name:
-                            print("Using default name (iPod Library)")
-                            playlist_name = None
-                        break
-                    elif name_choice == "3":
-                        playlist_name = None  # Will use default iPod Library
-                        break
-                    else:
-                        print("Invalid choice. Please enter 1-3.")
-            else:
-                playlist_name = input("\nEnter playlist name (press Enter for default 'iPod Library'): ").strip()
-                if not playlist_name:
-                    playlist_name = None
+            playlist_name = choose_playlist_name()
             
             try:
-                results = process_songs(songs_data=songs, playlist_name=playlist_name)
+                results = process_songs(songs_data=songs, playlist_name=playlist_name, store=store)
                 
                 # Display upload results summary
                 print("\nUpload Results Summary:")
                 print(f"Total songs processed: {results['total_songs']}")
                 print(f"Successfully uploaded: {results['success_count']} songs")
-                print(f"Already in playlist: {results['skipped_count']} songs")
+                print(f"Already in playlist or duplicate: {results['skipped_count']} songs")
                 print(f"Failed to upload: {results['failed_count']} songs")
                 print(f"Invalid metadata: {results['invalid_metadata_count']} songs")
                 
@@ -92,19 +276,21 @@ def handle_spotify_upload(songs: List[Dict]):
                     print(f"Success rate: {success_rate:.1f}%")
                 
                 # Show sample of failed songs if any
-                if results['failed_songs']:
+                if results['failed_count']:
                     print("\nSample of failed uploads:")
-                    for song in results['failed_songs'][:3]:
+                    for song in results['failed_sample'][:3]:
                         print(f"\nTitle: {song['title']}")
                         print(f"Artist: {song['artist']}")
                         print(f"Album: {song['album']}")
                         print(f"Reason: {song.get('reason', 'Unknown error')}")
                     
-                    if len(results['failed_songs']) > 3:
-                        print(f"\n... and {len(results['failed_songs']) - 3} more failed songs")
+                    if results['failed_count'] > 3:
+                        print(f"\n... and {results['failed_count'] - 3} more failed songs")
                 
-                print("\nDetailed results saved to 'upload_results.json'")
+                print(f"\nDetailed results saved to '{store.path}' (run {results['run_id']})")
                 
+            except KeyboardInterrupt:
+                print_resume_hint()
             except Exception as e:
                 print(f"\nError during Spotify upload: {str(e)}")
                 print("Please check your Spotify credentials and try again.")
@@ -115,103 +301,133 @@ def handle_spotify_upload(songs: List[Dict]):
         else:
             print("Invalid choice. Please enter 1 or 2.")
 
-def check_metadata(songs: List[Dict]):
-    """Check for invalid metadata without uploading to Spotify."""
-    invalid_songs = []
-    for song in songs:
-        if song['title'] == 'Unknown Title' or song['artist'] == 'Unknown Artist':
-            invalid_reason = []
-            if song['title'] == 'Unknown Title':
-                invalid_reason.append('Unknown Title')
-            if song['artist'] == 'Unknown Artist':
-                invalid_reason.append('Unknown Artist')
-            
-            # Create detailed metadata report
-            song_report = {
-                'file_path': song['file_path'],
-                'title': song['title'],
-                'artist': song['artist'],
-                'album': song['album'],
-                'raw_title': song.get('raw_title', 'Unknown Title'),
-                'format': song.get('format', 'unknown'),
-                'reason': f"Invalid metadata: {' '.join(invalid_reason)}",
-                'raw_metadata': song.get('raw_metadata', {})
-            }
+def print_resume_hint(pipelined: bool = False):
+    """Tell the user how to pick up an interrupted upload."""
+    print("\n\nUpload interrupted. Progress has been saved to 'upload_journal.jsonl'.")
+    if pipelined:
+        # The interrupted scan was never saved, so resuming scans the iPod again
+        print("Run `poetry run start --resume` with the iPod connected to rescan it and continue where it left off.")
+    else:
+        print("Run `poetry run start --resume` to continue where it left off.")
 
-            # Add technical details if available
-            tech_info = {}
-            raw_meta = song.get('raw_metadata', {})
-            if raw_meta:
-                if 'bitrate' in raw_meta:
-                    tech_info['bitrate'] = f"{raw_meta['bitrate'] // 1000}kbps"
-                if 'sample_rate' in raw_meta:
-                    tech_info['sample_rate'] = f"{raw_meta['sample_rate'] // 1000}kHz"
-                if 'length_seconds' in raw_meta:
-                    minutes = raw_meta['length_seconds'] // 60
-                    seconds = raw_meta['length_seconds'] % 60
-                    tech_info['duration'] = f"{minutes}:{seconds:02d}"
-                if 'mode' in raw_meta:
-                    tech_info['mode'] = raw_meta['mode']
-            
-            if tech_info:
-                song_report['technical_info'] = tech_info
+def resume_spotify_upload(store: LibraryStore, songs: List[Song]):
+    """Continue an interrupted Spotify upload without prompting."""
+    error = env.load_spotify_env()
+    if error:
+        print("\nCannot upload to Spotify:")
+        print(error)
+        return
+    
+    journal = UploadJournal.load()
+    if not journal:
+        print("No interrupted upload found, use the menu to start a new one.")
+        return
+    
+    try:
+        process_songs(songs_data=songs, resume=True, store=store)
+    except KeyboardInterrupt:
+        print_resume_hint()
+    except Exception as e:
+        print(f"\nError during Spotify upload: {str(e)}")
+        print("Run `poetry run start --resume` to try again.")
 
-            # Add additional metadata if available
-            additional_meta = {}
-            if raw_meta:
-                # Map common ID3 tags to readable names
-                tag_mapping = {
-                    'TCON': 'genre',
-                    'TDRC': 'year',
-                    'TRCK': 'track_number',
-                    'TPOS': 'disc_number',
-                    'TPE2': 'album_artist',
-                    'TCOM': 'composer'
-                }
+def check_metadata(store: LibraryStore, songs: List[Song]):
+    """Check for invalid metadata without uploading to Spotify.
+    
+    Each invalid song is saved to the library store as it is found, so only the
+    counts and a few samples are kept in memory.
+    """
+    with ReportWriter(store, 'metadata_check', ('invalid_metadata',)) as report:
+        formats = {'mp3_count': 0, 'mp4_count': 0, 'other_format_count': 0}
+        total_songs = 0
+        for song in songs:
+            total_songs += 1
+            song_format = song.get('format')
+            formats[f"{song_format}_count" if song_format in ['mp3', 'mp4'] else 'other_format_count'] += 1
+            if song['title'] == 'Unknown Title' or song['artist'] == 'Unknown Artist':
+                invalid_reason = []
+                if song['title'] == 'Unknown Title':
+                    invalid_reason.append('Unknown Title')
+                if song['artist'] == 'Unknown Artist':
+                    invalid_reason.append('Unknown Artist')
                 
-                for tag, readable_name in tag_mapping.items():
-                    if tag in raw_meta and raw_meta[tag]:
-                        additional_meta[readable_name] = raw_meta[tag][0]
+                # Raw metadata is only loaded for songs that end up in the report
+                raw_meta = song.get('raw_metadata', {})
                 
-                # Add any user-defined text frames
-                if 'TXXX' in raw_meta:
-                    additional_meta['user_defined'] = raw_meta['TXXX']
+                # Create detailed metadata report
+                song_report = {
+                    'file_path': song['file_path'],
+                    'title': song['title'],
+                    'artist': song['artist'],
+                    'album': song['album'],
+                    'raw_title': song.get('raw_title', 'Unknown Title'),
+                    'format': song.get('format', 'unknown'),
+                    'reason': f"Invalid metadata: {' '.join(invalid_reason)}",
+                    'raw_metadata': raw_meta
+                }
+
+                # Add technical details if available
+                tech_info = {}
+                if raw_meta:
+                    if 'bitrate' in raw_meta:
+                        tech_info['bitrate'] = f"{raw_meta['bitrate'] // 1000}kbps"
+                    if 'sample_rate' in raw_meta:
+                        tech_info['sample_rate'] = f"{raw_meta['sample_rate'] // 1000}kHz"
+                    if 'length_seconds' in raw_meta:
+                        minutes = raw_meta['length_seconds'] // 60
+                        seconds = raw_meta['length_seconds'] % 60
+                        tech_info['duration'] = f"{minutes}:{seconds:02d}"
+                    if 'mode' in raw_meta:
+                        tech_info['mode'] = raw_meta['mode']
                 
-                # Add any comments
-                if 'COMM' in raw_meta:
-                    additional_meta['comments'] = raw_meta['COMM']
+                if tech_info:
+                    song_report['technical_info'] = tech_info
 
-            if additional_meta:
-                song_report['additional_metadata'] = additional_meta
-            
-            invalid_songs.append(song_report)
-    
-    # Save results to file with more organized structure
-    output_data = {
-        'total_songs': len(songs),
-        'invalid_metadata_count': len(invalid_songs),
-        'summary': {
-            'mp3_count': sum(1 for s in songs if s.get('format') == 'mp3'),
-            'mp4_count': sum(1 for s in songs if s.get('format') == 'mp4'),
-            'other_format_count': sum(1 for s in songs if s.get('format') not in ['mp3', 'mp4'])
-        },
-        'invalid_metadata_songs': invalid_songs
-    }
-    
-    with open('metadata_check_results.json', 'w') as f:
-        json.dump(output_data, f, indent=2)
+                # Add additional metadata if available
+                additional_meta = {}
+                if raw_meta:
+                    # Map common ID3 tags to readable names
+                    tag_mapping = {
+                        'TCON': 'genre',
+                        'TDRC': 'year',
+                        'TRCK': 'track_number',
+                        'TPOS': 'disc_number',
+                        'TPE2': 'album_artist',
+                        'TCOM': 'composer',
+                        'TSRC': 'isrc'
+                    }
+                    
+                    for tag, readable_name in tag_mapping.items():
+                        if tag in raw_meta and raw_meta[tag]:
+                            additional_meta[readable_name] = raw_meta[tag][0]
+                    
+                    # Add any user-defined text frames
+                    if 'TXXX' in raw_meta:
+                        additional_meta['user_defined'] = raw_meta['TXXX']
+                    
+                    # Add any comments
+                    if 'COMM' in raw_meta:
+                        additional_meta['comments'] = raw_meta['COMM']
+
+                if additional_meta:
+                    song_report['additional_metadata'] = additional_meta
+                
+                report.write('invalid_metadata', song_report)
+        
+        results = report.close(total_songs, formats=formats)
+    invalid_count = results['invalid_metadata_count']
     
     # Print summary
     print("\nMetadata Check Summary:")
-    print(f"Total songs checked: {len(songs)}")
-    print(f"Songs with invalid metadata: {len(invalid_songs)}")
+    print(f"Total songs checked: {total_songs}")
+    print(f"Songs with invalid metadata: {invalid_count}")
     print("\nFormat breakdown:")
-    for format_type, count in output_data['summary'].items():
+    for format_type, count in formats.items():
         print(f"  {format_type.replace('_', ' ').title()}: {count}")
     
-    if invalid_songs:
+    if invalid_count:
         print("\nSample of invalid songs:")
-        for song in invalid_songs[:5]:
+        for song in results['invalid_metadata_sample']:
             print(f"\nFile: {song['file_path']}")
             print(f"Format: {song['format']}")
             print(f"Raw Title: {song['raw_title']}")
@@ -231,15 +447,29 @@ def check_metadata(songs: List[Dict]):
             
             print(f"Reason: {song['reason']}")
         
-        if len(invalid_songs) > 5:
-            print(f"\n... and {len(invalid_songs) - 5} more")
+        if invalid_count > 5:
+            print(f"\n... and {invalid_count - 5} more")
         
-        print("\nFull results saved to 'metadata_check_results.json'")
+        print(f"\nFull results saved to '{store.path}' (run {results['run_id']})")
 
-def handle_ipod_scan() -> Optional[List[Dict]]:
-    """Handle iPod scanning process."""
+def locate_ipod() -> Optional[str]:
+    """Find the iPod, asking for its path if it isn't detected. None if the user gives up."""
     print("Looking for iPod...")
-    ipod_path = find_ipod_path()
+    ipod_paths = find_ipod_paths()
+    ipod_path = ipod_paths[0] if ipod_paths else None
+    
+    if len(ipod_paths) > 1:
+        print(f"\nFound {len(ipod_paths)} iPods (run `poetry run start --all-devices` to scan them all):")
+        for number, path in enumerate(ipod_paths, 1):
+            print(f"{number}. {path}")
+        while True:
+            choice = input(f"\nWhich one? (1-{len(ipod_paths)}, Enter for 1): ").strip() or "1"
+            if choice.isdigit() and 1 <= int(choice) <= len(ipod_paths):
+                ipod_path = ipod_paths[int(choice) - 1]
+                break
+            print(f"Invalid choice. Please enter 1-{len(ipod_paths)}.")
+    elif ipod_path:
+        print(f"Found potential iPod at: {ipod_path}")
     
     if not ipod_path:
         print("\nNo iPod detected automatically. Please make sure:")
@@ -259,4 +489,85 @@ def handle_ipod_scan() -> Optional[List[Dict]]:
             else:
                 print("Invalid choice. Please enter 1 or 2.")
     
-    return scan_new_songs(ipod_path) 
\ No newline at end of file
+    return ipod_path
+
+def handle_ipod_scan(store: LibraryStore, incremental: bool = False) -> Optional[List[Song]]:
+    """Handle iPod scanning process.
+    
+    An incremental rescan of a library combined from several iPods goes through
+    their per-device libraries, so it doesn't replace the combination with one iPod.
+    """
+    if incremental and store.main_devices():
+        return handle_all_devices_scan(store)
+    ipod_path = locate_ipod()
+    if not ipod_path:
+        return None
+    
+    return scan_new_songs(store, ipod_path, incremental=incremental)
+
+def handle_all_devices_scan(store: LibraryStore) -> Optional[List[Song]]:
+    """Scan every connected iPod at once and combine their libraries."""
+    print("Looking for iPods...")
+    ipod_paths = find_ipod_paths()
+    if not ipod_paths:
+        print("\nNo iPods detected. Please make sure they're connected in disk mode.")
+        return None
+    for ipod_path in ipod_paths:
+        print(f"Found potential iPod at: {ipod_path}")
+    return scan_all_devices(store, ipod_paths)
+
+def handle_pipelined_upload(store: LibraryStore, incremental: bool = False, resume: bool = False):
+    """Scan the iPod and upload to Spotify at the same time.
+    
+    Songs flow from the scan straight into Spotify searches and playlist
+    batches through a bounded queue, so the iPod and the network are busy
+    together instead of one after the other. With resume, an interrupted
+    pipelined upload is continued: the iPod is scanned again and everything
+    the interrupted run already resolved or added is reused. A library combined
+    from several iPods is rescanned through their per-device libraries before
+    the upload starts instead (see scan_all_devices).
+    """
+    error = env.load_spotify_env()
+    if error:
+        print("\nCannot upload to Spotify:")
+        print(error)
+        return
+    
+    if incremental and store.main_devices():
+        print("\nYour song data combines several iPods, so they're rescanned before the upload starts")
+        songs = handle_all_devices_scan(store)
+        if not songs:
+            return
+        playlist_name = None if resume else choose_playlist_name()
+        try:
+            SpotifyUploader(store=store).upload_songs(songs, playlist_name, resume=resume)
+        except KeyboardInterrupt:
+            print_resume_hint()
+        except Exception as e:
+            print(f"\nError during Spotify upload: {str(e)}")
+            print("Please check your Spotify credentials and try again.")
+        return
+    
+    ipod_path = locate_ipod()
+    if not ipod_path:
+        return
+    # A resumed run gets its playlist from the journal
+    playlist_name = None if resume else choose_playlist_name()
+    
+    songs = None
+    try:
+        # Sign in before the scan starts so any browser prompt isn't mixed with scan output
+        uploader = SpotifyUploader(store=store)
+        songs = prefetch(iter_new_songs(store, ipod_path, incremental=incremental, keep_raw_metadata=True,
+                                        show_progress=False),
+                         env.get_pipeline_queue_size())
+        uploader.upload_songs(songs, playlist_name, resume=resume, pipelined=True)
+    except KeyboardInterrupt:
+        print_resume_hint(pipelined=True)
+    except Exception as e:
+        print(f"\nError during Spotify upload: {str(e)}")
+        print("Please check your Spotify credentials and try again.")
+    finally:
+        if songs is not None:
+            # Stop the scan (discarding its unfinished library) if the upload gave up
+            songs.close() 
\ No newline at end of file
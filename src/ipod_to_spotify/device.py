@@ -1,19 +1,76 @@
 import os
+import re
+from typing import List
 
-def find_ipod_path():
-    # Try to find the iPod path on macOS.
-    volumes_path = "/Volumes"
-    if not os.path.exists(volumes_path):
-        return None
-    
-    # List all volumes and look for iPod-like names
-    for volume in os.listdir(volumes_path):
-        volume_path = os.path.join(volumes_path, volume)
-        ipod_control_path = os.path.join(volume_path, "iPod_Control")
-        
-        # Check if this volume has iPod_Control folder (typical for iPods)
-        if os.path.exists(ipod_control_path):
-            print(f"Found potential iPod at: {volume_path}")
-            return volume_path
-    
-    return None 
\ No newline at end of file
+# Where macOS mounts removable volumes
+MACOS_VOLUMES_PATH = "/Volumes"
+
+# Linux mount table; iPods show up wherever the desktop or fstab mounts them
+# (/media/<user>/..., /run/media/<user>/..., /mnt/...)
+MOUNTS_PATH = "/proc/self/mounts"
+
+# Kernel pseudo filesystems in the mount table, which never hold an iPod
+_PSEUDO_FILESYSTEMS = {
+    'proc', 'sysfs', 'devtmpfs', 'devpts', 'cgroup', 'cgroup2', 'securityfs', 'debugfs',
+    'tracefs', 'pstore', 'bpf', 'mqueue', 'hugetlbfs', 'configfs', 'fusectl', 'autofs',
+    'binfmt_misc', 'efivarfs', 'rpc_pipefs', 'nsfs'
+}
+
+def _unescape_mount_point(field: str) -> str:
+    # The mount table writes spaces, tabs and backslashes in paths as octal escapes (\040)
+    return re.sub(r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), field)
+
+def _mounted_volumes() -> List[str]:
+    # Mount points from the Linux mount table, or [] where there isn't one
+    try:
+        with open(MOUNTS_PATH, 'r') as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+
+    volumes = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) >= 3 and fields[2] not in _PSEUDO_FILESYSTEMS:
+            volumes.append(_unescape_mount_point(fields[1]))
+    return volumes
+
+def find_ipod_paths() -> List[str]:
+    # Every mounted volume with an iPod_Control folder (typical for iPods): the volumes
+    # under /Volumes on macOS, and every mount point in the mount table on Linux
+    candidates = []
+    if os.path.isdir(MACOS_VOLUMES_PATH):
+        candidates += [os.path.join(MACOS_VOLUMES_PATH, volume) for volume in sorted(os.listdir(MACOS_VOLUMES_PATH))]
+    candidates += _mounted_volumes()
+
+    ipod_paths = []
+    seen = set()
+    for volume_path in candidates:
+        # The same volume can be reached through several mount points
+        real_path = os.path.realpath(volume_path)
+        if real_path in seen:
+            continue
+        seen.add(real_path)
+        if os.path.isdir(os.path.join(volume_path, "iPod_Control")):
+            ipod_paths.append(volume_path)
+    return ipod_paths
+
+def device_id(ipod_path: str) -> str:
+    # What identifies an iPod from one run to the next, whatever it's mounted as and
+    # whichever order the volumes are listed in: the FireWire GUID (or serial number)
+    # from its SysInfo file, or failing that the volume's mount point
+    try:
+        with open(os.path.join(ipod_path, 'iPod_Control', 'Device', 'SysInfo'), 'r', errors='replace') as f:
+            info = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        info = {}
+    for key in ('FirewireGuid', 'pszSerialNumber'):
+        value = info.get(key, '').strip()
+        if value:
+            return f"{key}:{value}"
+    return os.path.realpath(ipod_path)
+
+def device_label(ipod_path: str) -> str:
+    # Short, filesystem safe name for a device, from its volume name
+    name = os.path.basename(os.path.normpath(ipod_path))
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('._') or 'ipod'
@@ -112,4 +112,86 @@ def get_spotify_creds() -> Dict[str, str]:
 
 def get_default_playlist_name() -> str:
     # Get default playlist name from env or return fallback
-    return os.getenv('DEFAULT_PLAYLIST_NAME', 'iPod Library') 
\ No newline at end of file
+    return os.getenv('DEFAULT_PLAYLIST_NAME', 'iPod Library')
+
+def _load_optional_env() -> None:
+    # Load .env if present, without validation, so settings work before Spotify is configured
+    env_path = _find_env_file()
+    if os.path.exists(env_path):
+        load_dotenv(env_path)
+
+def _get_int_setting(name: str, default: int, minimum: int = 0) -> int:
+    # Read an optional integer setting, falling back to default if unset or invalid
+    _load_optional_env()
+    try:
+        return max(minimum, int(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+def get_scan_workers() -> int:
+    # Number of workers used to extract metadata while scanning (1 disables the pool)
+    return _get_int_setting('SCAN_WORKERS', min(8, (os.cpu_count() or 1) * 2), minimum=1)
+
+def get_spotify_workers() -> int:
+    # Number of Spotify searches run concurrently while uploading (1 disables the pool)
+    return _get_int_setting('SPOTIFY_WORKERS', 8, minimum=1)
+
+def get_scan_engine() -> str:
+    # Worker pool type used while scanning: 'thread' (default) or 'process'
+    _load_optional_env()
+    engine = os.getenv('SCAN_ENGINE', 'thread').strip().lower()
+    return engine if engine in ('thread', 'process') else 'thread'
+
+def get_search_cache_settings() -> Dict[str, int]:
+    # TTLs (in days) and size bound for the on-disk Spotify search cache
+    return {
+        'ttl_days': _get_int_setting('SEARCH_CACHE_TTL_DAYS', 90),
+        'miss_ttl_days': _get_int_setting('SEARCH_CACHE_MISS_TTL_DAYS', 14),
+        'max_entries': _get_int_setting('SEARCH_CACHE_MAX_ENTRIES', 200000, minimum=1)
+    }
+
+def get_search_candidates() -> int:
+    # Spotify results fetched per search and ranked locally (Spotify allows up to 50)
+    return min(50, _get_int_setting('SEARCH_CANDIDATES', 10, minimum=1))
+
+def get_resolve_by_album() -> bool:
+    # Whether songs sharing an album are matched against the album's tracklist before
+    # falling back to searching for each song
+    _load_optional_env()
+    return os.getenv('RESOLVE_BY_ALBUM', 'true').strip().lower() not in ('0', 'false', 'no', 'off')
+
+def get_playlist_sharding() -> str:
+    # How uploads too big for one playlist are split: 'numbered' ("iPod Library (2)", ...),
+    # 'artist' (one playlist per first letter) or 'genre'
+    _load_optional_env()
+    mode = os.getenv('PLAYLIST_SHARDING', 'numbered').strip().lower()
+    return mode if mode in ('numbered', 'artist', 'genre') else 'numbered'
+
+def get_playlist_shard_size() -> int:
+    # Tracks per playlist before the next one is started (Spotify allows up to 10000)
+    return min(10000, _get_int_setting('PLAYLIST_SHARD_SIZE', 10000, minimum=1))
+
+def get_pipeline_queue_size() -> int:
+    # Scanned songs allowed to wait for Spotify when scanning and uploading at the same time
+    return _get_int_setting('PIPELINE_QUEUE_SIZE', 1000, minimum=1)
+
+def get_playlist_index_ttl_hours() -> int:
+    # How long the local index of the user's playlists is trusted before it is rebuilt
+    return _get_int_setting('PLAYLIST_INDEX_TTL_HOURS', 24)
+
+def get_scan_source() -> str:
+    # Where scans read metadata from: 'auto' (iTunesDB when present, tags for the rest) or 'files'
+    _load_optional_env()
+    source = os.getenv('SCAN_SOURCE', 'auto').strip().lower()
+    return source if source in ('auto', 'files') else 'auto'
+
+def get_scan_reader() -> str:
+    # How tags are read from files: 'fast' (tags-only readers, mutagen fallback) or 'mutagen'
+    _load_optional_env()
+    reader = os.getenv('SCAN_READER', 'fast').strip().lower()
+    return reader if reader in ('fast', 'mutagen') else 'fast'
+
+def get_scan_read_duration() -> bool:
+    # Whether the fast reader also works out each song's duration (TLEN or Xing/VBRI header)
+    _load_optional_env()
+    return os.getenv('SCAN_READ_DURATION', 'true').strip().lower() not in ('0', 'false', 'no', 'off')
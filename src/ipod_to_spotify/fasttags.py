@@ -0,0 +1,339 @@
+import mmap
+import os
+import struct
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+# Tags-only readers for the two formats an iPod mostly holds. Unlike mutagen's File()
+# they never decode audio stream info unless asked for a duration, and never read
+# artwork: MP3 tags are walked through a memory map so APIC payloads are skipped
+# without being paged in, and MP4 files are walked atom by atom with seeks so only
+# the ilst metadata is read. Both return None for anything they don't handle, so the
+# caller can fall back to mutagen.
+
+# ID3v2.2 three character frame IDs mapped to their v2.3/2.4 names
+_ID3V22_FRAMES = {
+    'TT2': 'TIT2', 'TP1': 'TPE1', 'TAL': 'TALB', 'TYE': 'TYER', 'TRK': 'TRCK',
+    'TPA': 'TPOS', 'TCO': 'TCON', 'COM': 'COMM', 'TP2': 'TPE2', 'TCM': 'TCOM',
+    'TPB': 'TPUB', 'TBP': 'TBPM', 'TLE': 'TLEN', 'TKE': 'TKEY', 'TXX': 'TXXX',
+    'TCR': 'TCOP', 'TEN': 'TENC', 'TSS': 'TSSE', 'TRC': 'TSRC', 'PIC': 'APIC'
+}
+
+# Frames kept in raw_metadata, the same set extract_metadata reads through mutagen
+ID3_FRAMES = (
+    'TIT2', 'TPE1', 'TALB', 'TDRC', 'TYER', 'TRCK', 'TPOS', 'TCON', 'COMM', 'TPE2',
+    'TCOM', 'TPUB', 'TBPM', 'TLEN', 'TKEY', 'TXXX', 'TCOP', 'TENC', 'TSSE', 'TSRC'
+)
+
+_ENCODINGS = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}
+
+# MPEG audio frame header tables
+_MPEG_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+_MPEG_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+# How far past the ID3 tag to look for the first MPEG frame
+_SYNC_SEARCH_BYTES = 64 * 1024
+
+# MP4 container atoms on the path to the metadata
+_MP4_CONTAINERS = {b'moov', b'udta', b'meta', b'ilst'}
+_MP4_FIELDS = {b'\xa9nam': 'title', b'\xa9ART': 'artist', b'\xa9alb': 'album', b'\xa9gen': 'genre'}
+# Freeform ('----') items kept, by (mean, name)
+_MP4_FREEFORM_FIELDS = {(b'com.apple.iTunes', b'ISRC'): 'isrc'}
+
+def _syncsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+def _decode_strings(data: bytes, encoding: int) -> List[str]:
+    # Decode a text frame payload into its null separated values
+    text = data.decode(_ENCODINGS.get(encoding, 'latin-1'), errors='replace')
+    values = text.split('\x00')
+    while values and not values[-1]:
+        values.pop()
+    return values or ['']
+
+def _split_terminated(data: bytes, encoding: int) -> Tuple[bytes, bytes]:
+    # Split off a null terminated string (two byte null for UTF-16 encodings)
+    if encoding in (1, 2):
+        for index in range(0, len(data) - 1, 2):
+            if data[index:index + 2] == b'\x00\x00':
+                return data[:index], data[index + 2:]
+        return data, b''
+    head, _, tail = data.partition(b'\x00')
+    return head, tail
+
+def _iter_id3_frames(tag: mmap.mmap, start: int, end: int, version: int) -> Iterator[Tuple[str, int, int, int]]:
+    # Yield (frame_id, data_start, data_end, format_flags) for each frame in the tag body
+    header_size = 6 if version == 2 else 10
+    position = start
+    while position + header_size <= end:
+        if version == 2:
+            frame_id = tag[position:position + 3]
+            size = int.from_bytes(tag[position + 3:position + 6], 'big')
+            flags = 0
+        else:
+            frame_id = tag[position:position + 4]
+            size_bytes = tag[position + 4:position + 8]
+            size = _syncsafe(size_bytes) if version == 4 else int.from_bytes(size_bytes, 'big')
+            flags = tag[position + 9]
+
+        # Padding reached
+        if not frame_id.strip(b'\x00'):
+            return
+        data_start = position + header_size
+        if data_start + size > end:
+            return
+
+        yield frame_id.decode('latin-1'), data_start, data_start + size, flags
+        position = data_start + size
+
+def _mpeg_stream_info(mapped: mmap.mmap, audio_start: int, file_size: int, tlen_ms: Optional[int]) -> Dict:
+    # Length, bitrate, sample rate and channel mode from the first MPEG frame and its
+    # Xing/Info or VBRI header; falls back to a constant bitrate estimate
+    search_end = min(file_size - 4, audio_start + _SYNC_SEARCH_BYTES)
+    position = mapped.find(b'\xff', audio_start, search_end)
+    while position != -1:
+        header = int.from_bytes(mapped[position:position + 4], 'big')
+        if (header >> 21) & 0x7ff == 0x7ff:
+            version_bits = (header >> 19) & 3
+            layer_bits = (header >> 17) & 3
+            bitrate_index = (header >> 12) & 0xf
+            rate_index = (header >> 10) & 3
+            if version_bits != 1 and layer_bits != 0 and bitrate_index not in (0, 15) and rate_index != 3:
+                break
+        position = mapped.find(b'\xff', position + 1, search_end)
+    if position == -1:
+        return {'length_seconds': tlen_ms // 1000} if tlen_ms else {}
+
+    version = {0: 2.5, 2: 2, 3: 1}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = _MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+    mode = (header >> 6) & 3
+    if layer == 1:
+        samples_per_frame = 384
+    elif layer == 3 and version != 1:
+        samples_per_frame = 576
+    else:
+        samples_per_frame = 1152
+
+    info = {'bitrate': bitrate, 'sample_rate': sample_rate, 'mode': mode}
+    frames = None
+    if version == 1:
+        xing_offset = position + 4 + (17 if mode == 3 else 32)
+    else:
+        xing_offset = position + 4 + (9 if mode == 3 else 17)
+    if mapped[xing_offset:xing_offset + 4] in (b'Xing', b'Info'):
+        xing_flags = int.from_bytes(mapped[xing_offset + 4:xing_offset + 8], 'big')
+        if xing_flags & 1:
+            frames = int.from_bytes(mapped[xing_offset + 8:xing_offset + 12], 'big')
+    elif mapped[position + 36:position + 40] == b'VBRI':
+        frames = int.from_bytes(mapped[position + 50:position + 54], 'big')
+
+    if tlen_ms:
+        length = tlen_ms / 1000
+    elif frames:
+        length = frames * samples_per_frame / sample_rate
+        info['bitrate'] = int((file_size - position) * 8 / length) if length else bitrate
+    else:
+        length = (file_size - position) * 8 / bitrate if bitrate else 0
+    info['length_seconds'] = int(length)
+    return info
+
+def read_mp3_tags(file_path: str, with_duration: bool = False) -> Optional[Dict]:
+    # Read the ID3v2 tag of an MP3 into the song dict extract_metadata builds.
+    # Returns None if the file has no ID3v2 tag or uses features we don't handle
+    # (compressed or encrypted frames).
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < 10:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            header = mapped[:10]
+            if header[:3] != b'ID3' or header[3] not in (2, 3, 4):
+                return None
+            version, flags = header[3], header[5]
+            if version == 2 and flags & 0x40:
+                # ID3v2.2 compression was never standardised
+                return None
+            tag_end = min(file_size, 10 + _syncsafe(header[6:10]))
+
+            body_start = 10
+            if flags & 0x40 and version in (3, 4):
+                ext_size = mapped[10:14]
+                body_start += _syncsafe(ext_size) if version == 4 else 4 + int.from_bytes(ext_size, 'big')
+
+            raw_metadata = {}
+            fields = {}
+            tlen_ms = None
+            # ID3v2.3 unsynchronises the whole tag, v2.4 flags it per frame
+            tag_unsync = bool(flags & 0x80) and version in (2, 3)
+            for frame_id, start, end, frame_flags in _iter_id3_frames(mapped, body_start, tag_end, version):
+                if version == 2:
+                    frame_id = _ID3V22_FRAMES.get(frame_id, frame_id)
+                if frame_id not in ID3_FRAMES:
+                    # Artwork and everything else we don't use is never read
+                    continue
+                if version == 4 and frame_flags & 0x0c:
+                    return None
+                if version == 3 and frame_flags & 0xc0:
+                    return None
+
+                data = mapped[start:end]
+                if version == 4 and frame_flags & 0x01:
+                    # Data length indicator
+                    data = data[4:]
+                if tag_unsync or (version == 4 and frame_flags & 0x02):
+                    data = data.replace(b'\xff\x00', b'\xff')
+                if not data:
+                    continue
+
+                encoding, payload = data[0], data[1:]
+                if frame_id == 'TXXX':
+                    desc, value = _split_terminated(payload, encoding)
+                    entry = {'desc': _decode_strings(desc, encoding)[0], 'text': _decode_strings(value, encoding)}
+                    raw_metadata.setdefault(frame_id, []).append(entry)
+                elif frame_id == 'COMM':
+                    lang = payload[:3].decode('latin-1', errors='replace')
+                    desc, value = _split_terminated(payload[3:], encoding)
+                    entry = {'lang': lang, 'desc': _decode_strings(desc, encoding)[0],
+                             'text': _decode_strings(value, encoding)}
+                    raw_metadata.setdefault(frame_id, []).append(entry)
+                else:
+                    text = '\x00'.join(_decode_strings(payload, encoding))
+                    raw_metadata.setdefault(frame_id, []).append(text)
+                    if frame_id in ('TIT2', 'TPE1', 'TALB', 'TSRC', 'TCON') and frame_id not in fields:
+                        fields[frame_id] = text
+                    if frame_id == 'TLEN' and text.strip().isdigit():
+                        tlen_ms = int(text.strip())
+
+            # mutagen upgrades ID3v2.3 years to TDRC, match what it would report
+            if 'TYER' in raw_metadata and 'TDRC' not in raw_metadata:
+                raw_metadata['TDRC'] = raw_metadata.pop('TYER')
+
+            if with_duration:
+                audio_start = tag_end + (10 if flags & 0x10 and version == 4 else 0)
+                raw_metadata.update(_mpeg_stream_info(mapped, audio_start, file_size, tlen_ms))
+
+    return {
+        'file_path': file_path,
+        'title': fields.get('TIT2', 'Unknown Title'),
+        'artist': fields.get('TPE1', 'Unknown Artist'),
+        'album': fields.get('TALB', 'Unknown Album'),
+        'isrc': fields.get('TSRC'),
+        'genre': fields.get('TCON'),
+        'raw_metadata': raw_metadata,
+        'format': 'mp3'
+    }
+
+def _iter_atoms(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    # Yield (type, payload_start, payload_end) for the atoms between start and end
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, atom_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            return
+        yield atom_type, position + header_size, min(end, position + size)
+        position += size
+
+def _mp4_data_value(f: BinaryIO, start: int, end: int) -> Optional[str]:
+    # Text of the first 'data' atom inside an ilst item
+    for atom_type, data_start, data_end in _iter_atoms(f, start, end):
+        if atom_type == b'data':
+            f.seek(data_start)
+            payload = f.read(data_end - data_start)
+            # 4 bytes type indicator, 4 bytes locale; type 1 is UTF-8 text
+            if payload[:4] == b'\x00\x00\x00\x01':
+                return payload[8:].decode('utf-8', errors='replace')
+            return None
+    return None
+
+def _mp4_freeform_key(f: BinaryIO, start: int, end: int) -> Optional[Tuple[bytes, bytes]]:
+    # (mean, name) of a '----' item, e.g. (b'com.apple.iTunes', b'ISRC'); both are full
+    # atoms, so their strings follow 4 bytes of version and flags
+    names = {}
+    for atom_type, data_start, data_end in _iter_atoms(f, start, end):
+        if atom_type in (b'mean', b'name'):
+            f.seek(data_start + 4)
+            names[atom_type] = f.read(data_end - data_start - 4)
+    if b'mean' not in names or b'name' not in names:
+        return None
+    return names[b'mean'], names[b'name']
+
+def read_mp4_tags(file_path: str, with_duration: bool = False) -> Optional[Dict]:
+    # Read the iTunes-style ilst metadata of an MP4/M4A into the song dict extract_metadata
+    # builds, without reading the media data. Returns None if this isn't an MP4 file.
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        f.seek(4)
+        if f.read(4) != b'ftyp':
+            return None
+
+        fields = {}
+        raw_metadata = {}
+
+        def walk(start: int, end: int) -> None:
+            for atom_type, payload_start, payload_end in _iter_atoms(f, start, end):
+                if atom_type in _MP4_CONTAINERS:
+                    # meta is a full atom: 4 bytes of version and flags before its children
+                    walk(payload_start + (4 if atom_type == b'meta' else 0), payload_end)
+                elif atom_type in _MP4_FIELDS:
+                    value = _mp4_data_value(f, payload_start, payload_end)
+                    if value:
+                        fields[_MP4_FIELDS[atom_type]] = value
+                elif atom_type == b'----':
+                    key = _mp4_freeform_key(f, payload_start, payload_end)
+                    if key in _MP4_FREEFORM_FIELDS:
+                        value = _mp4_data_value(f, payload_start, payload_end)
+                        if value:
+                            fields[_MP4_FREEFORM_FIELDS[key]] = value
+                elif atom_type == b'mvhd' and with_duration:
+                    f.seek(payload_start)
+                    version = f.read(4)[0]
+                    if version == 1:
+                        timescale, duration = struct.unpack('>IQ', f.read(28)[16:28])
+                    else:
+                        timescale, duration = struct.unpack('>II', f.read(16)[8:16])
+                    if timescale:
+                        raw_metadata['length_seconds'] = int(duration / timescale)
+
+        walk(0, file_size)
+
+    return {
+        'file_path': file_path,
+        'title': fields.get('title', 'Unknown Title'),
+        'artist': fields.get('artist', 'Unknown Artist'),
+        'album': fields.get('album', 'Unknown Album'),
+        'isrc': fields.get('isrc'),
+        'genre': fields.get('genre'),
+        'raw_metadata': raw_metadata,
+        'format': 'mp4'
+    }
+
+def read_tags_fast(file_path: str, with_duration: bool = False) -> Optional[Dict]:
+    # Tags-only fast path for extract_metadata. Returns a song dict (before title
+    # parsing), or None when the file should be read with mutagen instead.
+    extension = os.path.splitext(file_path)[1].lower()
+    try:
+        if extension == '.mp3':
+            return read_mp3_tags(file_path, with_duration)
+        if extension in ('.m4a', '.m4p', '.aac', '.alac'):
+            return read_mp4_tags(file_path, with_duration)
+    except (OSError, ValueError, IndexError, KeyError, struct.error):
+        return None
+    return None
@@ -0,0 +1,150 @@
+import os
+import struct
+from typing import Dict, Optional, Tuple
+from .metrics import print_above_progress
+
+# Data set (mhsd) holding the track list
+_TRACKS_DATASET = 1
+
+# String data objects (mhod) we read, by mhod type
+_MHOD_FIELDS = {
+    1: 'title',
+    2: 'location',
+    3: 'album',
+    4: 'artist',
+    5: 'genre',
+    12: 'composer',
+    22: 'album_artist'
+}
+
+# mhod string encodings
+_UTF8 = 2
+
+class ITunesDBError(Exception):
+    pass
+
+def _header(data: bytes, offset: int, tag: bytes) -> Tuple[int, int]:
+    # Check the chunk tag at offset and return (header_length, total_length)
+    if data[offset:offset + 4] != tag:
+        raise ITunesDBError(f"Expected {tag.decode()} at offset {offset}, found {data[offset:offset + 4]!r}")
+    return struct.unpack_from('<II', data, offset + 4)
+
+def _read_mhod(data: bytes, offset: int) -> Tuple[Optional[str], Optional[str], int]:
+    # Parse one data object; returns (field, text, total_length). field is None for
+    # types we don't use.
+    header_len, total_len = _header(data, offset, b'mhod')
+    mhod_type = struct.unpack_from('<I', data, offset + 12)[0]
+    field = _MHOD_FIELDS.get(mhod_type)
+    if field is None:
+        return None, None, total_len
+
+    encoding, length = struct.unpack_from('<II', data, offset + 24)
+    raw = data[offset + 40:offset + 40 + length]
+    text = raw.decode('utf-8' if encoding == _UTF8 else 'utf-16-le', errors='replace')
+    return field, text, total_len
+
+def _read_mhit(data: bytes, offset: int) -> Tuple[Dict, int]:
+    # Parse a track item and its data objects; returns (track fields, total_length)
+    header_len, total_len = _header(data, offset, b'mhit')
+    num_mhods = struct.unpack_from('<I', data, offset + 12)[0]
+    length_ms, track_number, _, year, bitrate, sample_rate = struct.unpack_from('<IIIIII', data, offset + 40)
+    track = {
+        'length_ms': length_ms,
+        'track_number': track_number,
+        'year': year,
+        'bitrate': bitrate,
+        # Stored as a 16.16 fixed point number
+        'sample_rate': sample_rate >> 16
+    }
+    if header_len >= 100:
+        track['disc_number'] = struct.unpack_from('<I', data, offset + 92)[0]
+
+    position = offset + header_len
+    for _ in range(num_mhods):
+        field, text, mhod_len = _read_mhod(data, position)
+        if field and text:
+            track[field] = text
+        position += mhod_len
+    return track, total_len
+
+def parse_itunesdb(data: bytes) -> Dict[str, Dict]:
+    # Parse the track list of an iTunesDB file.
+    # Returns {location: track fields} where location is the iPod-relative path,
+    # e.g. ':iPod_Control:Music:F00:ABCD.mp3'.
+    header_len, total_len = _header(data, 0, b'mhbd')
+    tracks = {}
+    offset = header_len
+    end = min(total_len, len(data))
+
+    while offset < end:
+        mhsd_header, mhsd_len = _header(data, offset, b'mhsd')
+        dataset_type = struct.unpack_from('<I', data, offset + 12)[0]
+        if dataset_type == _TRACKS_DATASET:
+            mhlt = offset + mhsd_header
+            mhlt_header, num_tracks = _header(data, mhlt, b'mhlt')
+            position = mhlt + mhlt_header
+            for _ in range(num_tracks):
+                track, mhit_len = _read_mhit(data, position)
+                if track.get('location'):
+                    tracks[track['location']] = track
+                position += mhit_len
+        if mhsd_len == 0:
+            break
+        offset += mhsd_len
+
+    return tracks
+
+def _track_to_metadata(file_path: str, track: Dict) -> Dict:
+    # Build the same song dict extract_metadata builds for this file, before title parsing
+    raw_metadata = {'source': 'itunesdb'}
+    frames = {
+        'TCON': track.get('genre'),
+        'TDRC': track.get('year') or None,
+        'TRCK': track.get('track_number') or None,
+        'TPOS': track.get('disc_number') or None,
+        'TPE2': track.get('album_artist'),
+        'TCOM': track.get('composer')
+    }
+    for tag, value in frames.items():
+        if value:
+            raw_metadata[tag] = [str(value)]
+    if track['bitrate']:
+        raw_metadata['bitrate'] = track['bitrate'] * 1000
+    if track['sample_rate']:
+        raw_metadata['sample_rate'] = track['sample_rate']
+    if track['length_ms']:
+        raw_metadata['length_seconds'] = track['length_ms'] // 1000
+
+    extension = os.path.splitext(file_path)[1].lower()
+    metadata = {
+        'file_path': file_path,
+        'title': track.get('title') or 'Unknown Title',
+        'artist': track.get('artist') or 'Unknown Artist',
+        'album': track.get('album') or 'Unknown Album',
+        'genre': track.get('genre'),
+        'raw_metadata': raw_metadata,
+        'format': 'mp3' if extension == '.mp3' else 'mp4' if extension in ('.m4a', '.m4p', '.aac') else None
+    }
+    return metadata
+
+def read_itunesdb(ipod_path: str) -> Optional[Dict[str, Dict]]:
+    # Read every track from the iPod's iTunesDB.
+    # Returns {lowercased absolute file path: song dict}, or None if there is no usable database.
+    db_path = os.path.join(ipod_path, 'iPod_Control', 'iTunes', 'iTunesDB')
+    if not os.path.exists(db_path):
+        return None
+
+    try:
+        with open(db_path, 'rb') as f:
+            tracks = parse_itunesdb(f.read())
+    except (OSError, ITunesDBError, struct.error) as e:
+        print_above_progress(f"Could not read iTunesDB ({e}), reading tags from every file instead")
+        return None
+
+    songs = {}
+    for location, track in tracks.items():
+        parts = [part for part in location.split(':') if part]
+        file_path = os.path.join(ipod_path, *parts)
+        # FAT volumes are case-insensitive, so match paths the same way
+        songs[file_path.lower()] = _track_to_metadata(file_path, track)
+    return songs
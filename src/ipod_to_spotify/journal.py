@@ -0,0 +1,84 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+class UploadJournal:
+    # Write-ahead log of an upload run, one JSON record per line:
+    #
+    #     {"type": "run", "playlist_id": ..., "playlist_name": ..., "sharding": ..., "pipelined": ...,
+    #      "started_at": ...}
+    #     {"type": "resolved", "key": <search key>, "track_id": <id or null>}
+    #     {"type": "batch", "track_ids": [...], "playlist_id": ...}  # after playlist_add_items succeeded
+    #
+    # Records are flushed as they happen, so if a run dies the next one can reuse every
+    # search result and knows exactly which tracks already made it into the playlist.
+    # The journal is deleted when a run completes.
+
+    def __init__(self, path: str = 'upload_journal.jsonl'):
+        self.path = path
+        self.run = None
+        self.resolved: Dict[str, Optional[str]] = {}
+        self.committed: Set[str] = set()
+        # Bytes of whole records, where a resumed run carries on writing
+        self._size = 0
+        self._file = None
+
+    @classmethod
+    def load(cls, path: str = 'upload_journal.jsonl') -> Optional['UploadJournal']:
+        # Read the journal of an interrupted run, or None if there isn't one
+        if not os.path.exists(path):
+            return None
+        journal = cls(path)
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    break
+                journal._size += len(line)
+                if record['type'] == 'run':
+                    journal.run = record
+                elif record['type'] == 'resolved':
+                    journal.resolved[record['key']] = record['track_id']
+                elif record['type'] == 'batch':
+                    journal.committed.update(record['track_ids'])
+        return journal if journal.run else None
+
+    def start(self, playlist_id: Optional[str], playlist_name: str, sharding: str = 'numbered',
+              pipelined: bool = False) -> None:
+        # Begin a new run, replacing any previous journal. playlist_id is the first
+        # playlist of the run, if it has been created yet. A pipelined run uploads songs
+        # as they're scanned, so resuming it means scanning again.
+        self._file = open(self.path, 'w')
+        self.run = {'type': 'run', 'playlist_id': playlist_id, 'playlist_name': playlist_name,
+                    'sharding': sharding, 'pipelined': pipelined, 'started_at': time.time()}
+        self._write(self.run)
+
+    def reopen(self) -> None:
+        # Continue appending to the journal of the run being resumed, after dropping a
+        # torn final line so the records written from here on can be read back
+        self._file = open(self.path, 'a')
+        self._file.truncate(self._size)
+
+    def record_resolved(self, key: str, track_id: Optional[str]) -> None:
+        self.resolved[key] = track_id
+        self._write({'type': 'resolved', 'key': key, 'track_id': track_id})
+
+    def record_batch(self, track_ids: List[str], playlist_id: Optional[str] = None) -> None:
+        self.committed.update(track_ids)
+        self._write({'type': 'batch', 'track_ids': track_ids, 'playlist_id': playlist_id}, sync=True)
+
+    def finish(self) -> None:
+        # The run completed, nothing left to resume
+        self._file.close()
+        os.remove(self.path)
+
+    def _write(self, record: Dict, sync: bool = False) -> None:
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
@@ -0,0 +1,35 @@
+import json
+import os
+from typing import Any, Iterator, List, Optional
+from .song import Song, RawMetadataStore
+
+def write_json_atomic(path: str, data: Any, **dump_args) -> None:
+    # Dump JSON through a temporary file so a crash never leaves path half written
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **dump_args)
+    os.replace(tmp_path, path)
+
+def iter_songs(path: str, raw_path: Optional[str] = None) -> Iterator[Song]:
+    # Lazily read a song library file, one Song per line of a JSON Lines file. These
+    # are libraries saved by older versions (now kept in the LibraryStore) or exported
+    # by hand; ones saved as a single JSON array are still read.
+    raw_store = RawMetadataStore(raw_path) if raw_path else None
+    with open(path, 'r') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+
+        if first == '[':
+            for entry in json.load(f):
+                yield Song.from_dict(entry, raw_store=raw_store)
+            return
+
+        for line in f:
+            if line.strip():
+                yield Song.from_dict(json.loads(line), raw_store=raw_store)
+
+def load_songs(path: str, raw_path: Optional[str] = None) -> List[Song]:
+    # Read a whole song library into memory
+    return list(iter_songs(path, raw_path))
@@ -1,69 +1,123 @@
+import argparse
 from .commands import (
     load_existing_songs,
     print_song_samples,
     handle_spotify_upload,
+    resume_spotify_upload,
+    handle_pipelined_upload,
     check_metadata,
-    handle_ipod_scan
+    handle_ipod_scan,
+    handle_all_devices_scan
 )
+from .journal import UploadJournal
+from .store import LibraryStore
+
+def offer_next_steps(store, songs):
+    # After a scan: upload, check metadata, or stop
+    if songs:
+        print_song_samples(songs)
+        print("\nWhat would you like to do?")
+        print("1. Upload to Spotify")
+        print("2. Check metadata only")
+        print("3. Exit")
+        
+        while True:
+            choice = input("\nEnter your choice (1-3): ").strip()
+            if choice == "1":
+                handle_spotify_upload(store, songs)
+                break
+            elif choice == "2":
+                check_metadata(store, songs)
+                break
+            elif choice == "3":
+                print("Exiting script...")
+                break
+            else:
+                print("Invalid choice. Please enter 1-3.")
+    else:
+        print("No songs found with readable metadata")
 
 def main():
+    parser = argparse.ArgumentParser(description="Transfer your iPod library to a Spotify playlist")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted Spotify upload using the saved song data")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="scan the iPod and upload to Spotify at the same time")
+    parser.add_argument('--all-devices', action='store_true',
+                        help="scan every connected iPod at once and combine their songs")
+    args = parser.parse_args()
+    
+    # One store for the whole run, shared by every command
+    store = LibraryStore()
+    try:
+        run(args, store)
+    finally:
+        store.close()
+
+def run(args, store):
     # Check for existing songs data
-    existing_songs = load_existing_songs()
+    existing_songs = load_existing_songs(store)
+    
+    if args.resume:
+        journal = UploadJournal.load()
+        if journal and journal.run.get('pipelined'):
+            # Its songs came straight from a scan that never finished, so scan again
+            handle_pipelined_upload(store, incremental=bool(existing_songs), resume=True)
+        elif existing_songs:
+            resume_spotify_upload(store, existing_songs)
+        else:
+            print("No saved song data to resume from, run without --resume to scan your iPod")
+        return
+    
+    if args.pipeline:
+        handle_pipelined_upload(store, incremental=bool(existing_songs))
+        return
+    
+    if args.all_devices:
+        offer_next_steps(store, handle_all_devices_scan(store))
+        return
     
     if existing_songs:
         print(f"Found existing song data ({len(existing_songs)} songs)")
+        journal = UploadJournal.load()
+        if journal:
+            print(f"An upload to '{journal.run['playlist_name']}' was interrupted, "
+                  f"run `poetry run start --resume` to continue it")
         print("\nWhat would you like to do?")
         print("1. Use existing song data")
         print("2. Check metadata only")
-        print("3. Rescan iPod")
-        print("4. Exit")
+        print("3. Rescan iPod (new and changed files only)")
+        print("4. Full rescan of iPod")
+        print("5. Rescan iPod and upload to Spotify at the same time")
+        print("6. Exit")
         
         while True:
-            choice = input("\nEnter your choice (1-4): ").strip()
+            choice = input("\nEnter your choice (1-6): ").strip()
             if choice == "1":
                 print_song_samples(existing_songs)
-                handle_spotify_upload(existing_songs)
+                handle_spotify_upload(store, existing_songs)
                 break
             elif choice == "2":
-                check_metadata(existing_songs)
+                check_metadata(store, existing_songs)
                 break
-            elif choice == "3":
+            elif choice in ["3", "4"]:
                 # Fall through to iPod scanning
                 break
-            elif choice == "4":
+            elif choice == "5":
+                handle_pipelined_upload(store, incremental=True)
+                return
+            elif choice == "6":
                 print("Exiting script...")
                 return
             else:
-                print("Invalid choice. Please enter 1-4.")
+                print("Invalid choice. Please enter 1-6.")
         
         if choice in ["1", "2"]:  # If user chose to use existing data or check metadata, we're done
             return
     
     # If we get here, we need to scan the iPod
-    songs = handle_ipod_scan()
-    
-    if songs:
-        print_song_samples(songs)
-        print("\nWhat would you like to do?")
-        print("1. Upload to Spotify")
-        print("2. Check metadata only")
-        print("3. Exit")
-        
-        while True:
-            choice = input("\nEnter your choice (1-3): ").strip()
-            if choice == "1":
-                handle_spotify_upload(songs)
-                break
-            elif choice == "2":
-                check_metadata(songs)
-                break
-            elif choice == "3":
-                print("Exiting script...")
-                break
-            else:
-                print("Invalid choice. Please enter 1-3.")
-    else:
-        print("No songs found with readable metadata")
+    songs = handle_ipod_scan(store, incremental=bool(existing_songs) and choice == "3")
+    offer_next_steps(store, songs)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
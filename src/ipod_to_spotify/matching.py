@@ -0,0 +1,109 @@
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+from .metadata import normalize_search_text
+
+# Weights of the title, artist and album similarities in a candidate's score
+TITLE_WEIGHT = 0.5
+ARTIST_WEIGHT = 0.35
+ALBUM_WEIGHT = 0.15
+
+# A candidate must reach all of these to be accepted
+MIN_TITLE_SIMILARITY = 0.6
+MIN_ARTIST_SIMILARITY = 0.5
+MIN_SCORE = 0.7
+
+# An album search result must be at least this close to the local album name
+MIN_ALBUM_SIMILARITY = 0.7
+
+# Durations within this many seconds count as the same recording; the score falls off
+# linearly beyond it and a candidate this far out is rejected outright
+DURATION_TOLERANCE = 10
+MAX_DURATION_DIFFERENCE = 45
+
+class _Similarity:
+    # Similarity of many strings against one local string. SequenceMatcher caches its
+    # analysis of the second sequence, so the local string is set once per song and
+    # every candidate is compared against it without re-analysing it.
+
+    def __init__(self, text: str):
+        self.text = normalize_search_text(text)
+        self._matcher = SequenceMatcher(autojunk=False)
+        self._matcher.set_seq2(self.text)
+
+    def __call__(self, other: str) -> float:
+        other = normalize_search_text(other)
+        if not self.text or not other:
+            return 0.0
+        if other == self.text:
+            return 1.0
+        self._matcher.set_seq1(other)
+        return self._matcher.ratio()
+
+def _artist_similarity(similarity: _Similarity, artists: List[Dict]) -> float:
+    # Best match against any credited artist, or against all of them joined, which
+    # covers local tags like "Artist A & Artist B"
+    names = [artist['name'] for artist in artists if artist.get('name')]
+    if not names:
+        return 0.0
+    return max([similarity(name) for name in names] + [similarity(' & '.join(names))])
+
+def score_candidate(track: Dict, title: _Similarity, artist: _Similarity, album: Optional[_Similarity],
+                    length_seconds: Optional[int]) -> Tuple[float, bool]:
+    # Returns (score, acceptable) for one Spotify track
+    title_score = title(track.get('name', ''))
+    artist_score = _artist_similarity(artist, track.get('artists', []))
+
+    if album is not None:
+        album_score = album((track.get('album') or {}).get('name', ''))
+        score = TITLE_WEIGHT * title_score + ARTIST_WEIGHT * artist_score + ALBUM_WEIGHT * album_score
+    else:
+        # No album to compare, so title and artist carry the whole score
+        score = (TITLE_WEIGHT * title_score + ARTIST_WEIGHT * artist_score) / (TITLE_WEIGHT + ARTIST_WEIGHT)
+
+    acceptable = title_score >= MIN_TITLE_SIMILARITY and artist_score >= MIN_ARTIST_SIMILARITY
+    if length_seconds and track.get('duration_ms'):
+        difference = abs(track['duration_ms'] / 1000 - length_seconds)
+        if difference > MAX_DURATION_DIFFERENCE:
+            acceptable = False
+        elif difference > DURATION_TOLERANCE:
+            score *= 1 - 0.5 * (difference - DURATION_TOLERANCE) / (MAX_DURATION_DIFFERENCE - DURATION_TOLERANCE)
+
+    return score, acceptable and score >= MIN_SCORE
+
+def rank_candidates(candidates: List[Dict], title: str, artist: str, album: Optional[str] = None,
+                    length_seconds: Optional[int] = None) -> Optional[Dict]:
+    # Pick the Spotify track that best matches a local song, or None if no candidate is
+    # a convincing match (wrong song, wrong artist, or a different length recording)
+    title_similarity = _Similarity(title)
+    artist_similarity = _Similarity(artist)
+    album_similarity = _Similarity(album) if album and album != 'Unknown Album' else None
+
+    best = None
+    best_score = 0.0
+    for track in candidates:
+        if not track or not track.get('id'):
+            continue
+        score, acceptable = score_candidate(track, title_similarity, artist_similarity, album_similarity,
+                                            length_seconds)
+        if acceptable and score > best_score:
+            best, best_score = track, score
+    return best
+
+def rank_albums(candidates: List[Dict], album: str, artist: str) -> Optional[Dict]:
+    # Pick the Spotify album that best matches a local album and its artist, or None.
+    # Among equally good matches (e.g. clean and explicit releases) the first wins.
+    album_similarity = _Similarity(album)
+    artist_similarity = _Similarity(artist)
+
+    best = None
+    best_score = 0.0
+    for candidate in candidates:
+        if not candidate or not candidate.get('id'):
+            continue
+        album_score = album_similarity(candidate.get('name', ''))
+        artist_score = _artist_similarity(artist_similarity, candidate.get('artists', []))
+        if album_score < MIN_ALBUM_SIMILARITY or artist_score < MIN_ARTIST_SIMILARITY:
+            continue
+        if album_score + artist_score > best_score:
+            best, best_score = candidate, album_score + artist_score
+    return best
@@ -1,6 +1,26 @@
 import os
+import re
+import time
 from mutagen import File
-from typing import Optional
+from mutagen.id3 import TCON
+from collections import deque
+from functools import partial
+from typing import Optional, List, Dict, Iterator, Tuple
+from . import env
+from .pool import ordered_map
+from .song import Song
+from .itunesdb import read_itunesdb
+from .fasttags import read_tags_fast
+from .metrics import metrics, print_above_progress, read_io_counters, ProgressLine
+
+# Files handed to each worker at a time when scanning with a process pool
+SCAN_CHUNK_SIZE = 16
+
+# Freeform MP4 atom iTunes stores a track's ISRC in
+MP4_ISRC_KEY = '----:com.apple.iTunes:ISRC'
+
+# Audio file extensions
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.aac', '.wav', '.aiff', '.alac', '.m4p')
 
 def parse_title_metadata(title: str) -> tuple[Optional[str], str]:
     # Parse a title into artist and song components
@@ -36,8 +56,79 @@ def parse_title_metadata(title: str) -> tuple[Optional[str], str]:
     
     return None, title
 
-def extract_metadata(file_path):
+# "(ft. X)" / "[featuring X]" credits up to the closing bracket, and bare "feat. X" credits
+# up to the next dash or bracket (so "Song feat. X - Remix" keeps its "- Remix")
+_FEATURE_PATTERN = re.compile(
+    r'\s*[(\[]\s*\b(?:feat\.?|ft\.?|featuring)\s[^)\]]*[)\]]?'
+    r'|\s*\b(?:feat\.?|ft\.?|featuring)\s.*?(?=\s+-\s|\s*(?:--|\u2013|\u2014|[(\[])|$)',
+    re.IGNORECASE
+)
+# Bracketed or dash-suffixed release noise that doesn't change which recording it is
+_NOISE_PATTERN = re.compile(
+    r'\s*[(\[][^)\]]*\b(?:remaster(?:ed)?|explicit|clean|album version|single version|bonus track)\b[^)\]]*[)\]]'
+    r'|\s+-\s+(?:\d{4}\s+)?(?:digital(?:ly)?\s+)?remaster(?:ed)?\b.*$',
+    re.IGNORECASE
+)
+# Dash variants also handled by parse_title_metadata; a bare hyphen only counts when spaced
+_DASH_PATTERN = re.compile(r'\s*(?:--|\u2013|\u2014)\s*|\s+-\s+')
+
+def normalize_search_text(text: str) -> str:
+    # Lowercase, drop featuring credits and release noise, unify dashes and whitespace
+    text = (text or '').casefold()
+    text = _FEATURE_PATTERN.sub(' ', text)
+    text = _NOISE_PATTERN.sub(' ', text)
+    text = _DASH_PATTERN.sub(' - ', text)
+    return ' '.join(text.split())
+
+def make_search_key(title: str, artist: str) -> str:
+    # Normalized (title, artist) key used to cache and deduplicate Spotify searches,
+    # so re-imports and compilation copies of the same song share one lookup
+    return f"{normalize_search_text(title)}\x1f{normalize_search_text(artist)}"
+
+# CC-XXX-YY-NNNNN: country, registrant, year and designation code
+_ISRC_PATTERN = re.compile(r'^[A-Z]{2}[A-Z0-9]{3}[0-9]{7}$')
+
+def normalize_isrc(isrc: Optional[str]) -> Optional[str]:
+    # Canonical 12 character ISRC ("USRC17607839"), or None if the tag doesn't hold one.
+    # Tags often carry the hyphenated display form or stray whitespace.
+    if not isrc:
+        return None
+    isrc = re.sub(r'[\s-]', '', str(isrc)).upper()
+    return isrc if _ISRC_PATTERN.match(isrc) else None
+
+def normalize_genre(genre: Optional[str]) -> Optional[str]:
+    # Genre name from a genre tag, or None if it's empty. ID3v1 style references
+    # ("(17)", "17") are resolved to their names the way mutagen does.
+    if not genre:
+        return None
+    genres = TCON(encoding=3, text=[str(genre)]).genres
+    return (genres[0].strip() or None) if genres else None
+
+def apply_title_parsing(metadata: Dict) -> Dict:
+    # Keep the raw title and, when the artist is unknown, try to split it out of the title
+    metadata['raw_title'] = metadata['title']
+    
+    if metadata['artist'] == 'Unknown Artist' and metadata['title'] != 'Unknown Title':
+        parsed_artist, parsed_title = parse_title_metadata(metadata['title'])
+        if parsed_artist:
+            metadata['artist'] = parsed_artist
+            metadata['title'] = parsed_title
+            metadata['raw_metadata']['parsed_from_title'] = True
+    
+    return metadata
+
+def extract_metadata(file_path, fast: bool = False, with_duration: bool = True) -> Optional[Song]:
     # Extract metadata from an audio file.
+    # With fast=True MP3 and MP4 files are read by the tags-only readers in fasttags,
+    # which skip artwork and only look at the audio stream when with_duration is set;
+    # anything they can't handle falls back to mutagen.
+    if fast:
+        metadata = read_tags_fast(file_path, with_duration)
+        if metadata is not None:
+            metadata['isrc'] = normalize_isrc(metadata.get('isrc'))
+            metadata['genre'] = normalize_genre(metadata.get('genre'))
+            return Song.from_dict(apply_title_parsing(metadata))
+    
     try:
         audio = File(file_path)
         if audio is None:
@@ -79,7 +170,8 @@ def extract_metadata(file_path):
                     'TXXX': 'user_defined',    # User defined text
                     'TCOP': 'copyright',       # Copyright
                     'TENC': 'encoded_by',      # Encoded by
-                    'TSSE': 'encoder_settings' # Encoder settings
+                    'TSSE': 'encoder_settings', # Encoder settings
+                    'TSRC': 'isrc'             # ISRC
                 }
                 
                 # Extract all available ID3 tags
@@ -102,7 +194,7 @@ def extract_metadata(file_path):
                                 metadata['raw_metadata'][tag] = [str(frame) for frame in frames]
                             
                             # For main fields, also store in top level
-                            if tag in ['TIT2', 'TPE1', 'TALB']:
+                            if tag in ['TIT2', 'TPE1', 'TALB', 'TSRC', 'TCON']:
                                 metadata[id3_map[tag]] = str(frames[0])
                     except Exception as e:
                         pass
@@ -123,75 +215,237 @@ def extract_metadata(file_path):
                 mp4_map = {
                     '©nam': 'title',
                     '©ART': 'artist',
-                    '©alb': 'album'
+                    '©alb': 'album',
+                    '©gen': 'genre'
                 }
                 for mp4_tag, field in mp4_map.items():
                     if mp4_tag in audio:
                         metadata[field] = str(audio[mp4_tag][0])
+                # iTunes keeps the ISRC in a freeform atom holding UTF-8 bytes
+                if MP4_ISRC_KEY in audio:
+                    value = audio[MP4_ISRC_KEY][0]
+                    metadata['isrc'] = bytes(value).decode('utf-8', errors='replace')
         
-        # Store raw title before any parsing
-        metadata['raw_title'] = metadata['title']
-        
-        # If artist is unknown but we have a title, try to parse title
-        if metadata['artist'] == 'Unknown Artist' and metadata['title'] != 'Unknown Title':
-            parsed_artist, parsed_title = parse_title_metadata(metadata['title'])
-            if parsed_artist:
-                metadata['artist'] = parsed_artist
-                metadata['title'] = parsed_title
-                metadata['raw_metadata']['parsed_from_title'] = True
-        
-        return metadata
+        metadata['isrc'] = normalize_isrc(metadata.get('isrc'))
+        metadata['genre'] = normalize_genre(metadata.get('genre'))
+        return Song.from_dict(apply_title_parsing(metadata))
     except Exception as e:
-        print(f"Error processing {file_path}: {e}")
+        print_above_progress(f"Error processing {file_path}: {e}")
         return None
 
-def scan_ipod_for_audio(ipod_path):
-    # Scan iPod for audio files and extract metadata.
+def get_file_fingerprint(file_path: str) -> Optional[List[int]]:
+    # Cheap change detector for a file: [size, mtime_ns, inode]
+    # Returns None if the file can't be stat'ed
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+def _list_audio_files(dir_path: str) -> List[str]:
+    # Audio files in a directory and its subdirectories, one scandir call per directory
+    found = []
+    try:
+        with os.scandir(dir_path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError as e:
+        print_above_progress(f"Error reading {dir_path}: {e}")
+        return found
+    
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            found.extend(_list_audio_files(entry.path))
+        elif entry.name.lower().endswith(AUDIO_EXTENSIONS):
+            found.append(entry.path)
+    return found
+
+def iter_audio_files(music_path: str) -> Iterator[Tuple[str, float]]:
+    # Stream the audio files under iPod_Control/Music in a single pass.
+    # Yields (file_path, progress) where progress (0-1] is how far through the tree
+    # the file is, based on its position among the F00..F49 hash directories, so a
+    # progress bar doesn't need a separate counting walk.
+    try:
+        with os.scandir(music_path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError as e:
+        print_above_progress(f"Error reading {music_path}: {e}")
+        return
+    
+    hash_dirs = [e.path for e in entries if e.is_dir(follow_symlinks=False)]
+    loose_files = [e.path for e in entries
+                   if e.is_file() and e.name.lower().endswith(AUDIO_EXTENSIONS)]
+    groups = ([loose_files] if loose_files else []) + hash_dirs
+    
+    for index, group in enumerate(groups):
+        if isinstance(group, list):
+            files = group
+        else:
+            with metrics.timer('scan_list_dir'):
+                files = _list_audio_files(group)
+        for position, file_path in enumerate(files, 1):
+            yield file_path, (index + position / len(files)) / len(groups)
+
+def _scan_job(file_path: str, fast: bool = False, with_duration: bool = True) -> Tuple[Optional[Song], float]:
+    # Worker entry point: extract one file's metadata.
+    # Returns (song, seconds spent extracting); the time travels back with the result so
+    # it's recorded even when extraction runs in another process.
+    started = time.perf_counter()
+    song = extract_metadata(file_path, fast=fast, with_duration=with_duration)
+    return song, time.perf_counter() - started
+
+def iter_ipod_audio(ipod_path, previous_songs: Optional[List[Song]] = None,
+                    fingerprints: Optional[Dict[str, List[int]]] = None,
+                    workers: Optional[int] = None, engine: Optional[str] = None,
+                    use_itunesdb: Optional[bool] = None, show_progress: bool = True) -> Iterator[Song]:
+    # Scan iPod for audio files and yield each song's metadata as soon as it's extracted.
+    # For an incremental rescan pass the songs and fingerprints from the previous
+    # scan: files whose fingerprint is unchanged reuse their previous metadata and
+    # only new or changed files are re-extracted. If fingerprints is given it is
+    # updated in place to describe the files found by this scan.
+    # Files are enumerated in a single streaming pass and extracted on a pool of
+    # workers (SCAN_WORKERS / SCAN_ENGINE by default); songs are always yielded
+    # in directory walk order. Unless use_itunesdb is False (or SCAN_SOURCE=files),
+    # songs listed in the iPod's iTunesDB are taken from it instead of opening the file.
+    # show_progress=False leaves the terminal's progress line to whoever consumes the songs.
     if not ipod_path:
-        print("iPod path not found")
-        return []
+        print_above_progress("iPod path not found")
+        return
     
     music_path = os.path.join(ipod_path, "iPod_Control", "Music")
     if not os.path.exists(music_path):
-        print(f"Music folder not found at {music_path}")
-        return []
+        print_above_progress(f"Music folder not found at {music_path}")
+        return
+    
+    print_above_progress(f"Scanning for audio files in: {music_path}")
+    
+    # Tracks the iPod already knows about come from its iTunesDB; only files
+    # missing from it have their tags read individually
+    itunesdb_songs = None
+    if use_itunesdb if use_itunesdb is not None else env.get_scan_source() == 'auto':
+        with metrics.timer('read_itunesdb'):
+            itunesdb_songs = read_itunesdb(ipod_path)
+        if itunesdb_songs is not None:
+            print_above_progress(f"Read {len(itunesdb_songs)} tracks from iTunesDB")
+    
+    incremental = previous_songs is not None and fingerprints is not None
+    previous_by_path = {song['file_path']: song for song in previous_songs} if incremental else {}
+    old_fingerprints = dict(fingerprints) if fingerprints is not None else {}
+    if fingerprints is not None:
+        fingerprints.clear()
+    new_fingerprints = {}
+    seen = set()
+    counts = {'added': 0, 'changed': 0, 'unchanged': 0, 'itunesdb': 0}
     
-    print(f"Scanning for audio files in: {music_path}")
+    progress_marks = deque()
     
-    # Audio file extensions
-    audio_extensions = ('.mp3', '.m4a', '.aac', '.wav', '.aiff', '.alac', '.m4p')
+    def jobs():
+        # Yield either a path to extract or the reusable song from the previous scan
+        for file_path, progress in iter_audio_files(music_path):
+            seen.add(file_path)
+            progress_marks.append(progress)
+            
+            fingerprint = get_file_fingerprint(file_path) if fingerprints is not None else None
+            if fingerprint is not None:
+                new_fingerprints[file_path] = fingerprint
+            
+            if incremental and file_path in previous_by_path and old_fingerprints.get(file_path) == fingerprint:
+                # Unchanged since the last scan, reuse previous metadata
+                counts['unchanged'] += 1
+                yield previous_by_path[file_path]
+            else:
+                counts['changed' if file_path in old_fingerprints else 'added'] += 1
+                db_metadata = itunesdb_songs.get(file_path.lower()) if itunesdb_songs else None
+                if db_metadata:
+                    counts['itunesdb'] += 1
+                    db_metadata = dict(db_metadata, file_path=file_path)
+                    db_metadata['genre'] = normalize_genre(db_metadata.get('genre'))
+                    yield Song.from_dict(apply_title_parsing(db_metadata))
+                else:
+                    yield file_path
     
-    # First pass: count total files to process
-    total_files = 0
-    for root, dirs, files in os.walk(music_path):
-        total_files += sum(1 for f in files if f.lower().endswith(audio_extensions))
+    workers = workers or env.get_scan_workers()
+    engine = engine or env.get_scan_engine()
+    chunk_size = SCAN_CHUNK_SIZE if engine == 'process' else 1
+    reader = env.get_scan_reader()
+    scan_job = partial(_scan_job, fast=reader == 'fast', with_duration=env.get_scan_read_duration())
     
-    if total_files == 0:
-        print("No audio files found")
-        return []
+    # Only paths go to the workers. Songs already known (reused, or from the iTunesDB)
+    # wait in walk order alongside the paths in flight and are yielded as is, so they
+    # never make a round trip through a worker process (and needn't be picklable).
+    pending = deque()
     
-    print(f"\nFound {total_files} audio files to process")
-    print("Progress: [", end="", flush=True)
+    def paths():
+        for job in jobs():
+            pending.append(job)
+            if not isinstance(job, Song):
+                yield job
     
-    songs = []
+    def settled():
+        # (song, seconds spent extracting or None) for every file, in walk order
+        for result in ordered_map(scan_job, paths(), workers, engine, chunk_size):
+            # Everything queued before this result's path is a known song
+            while isinstance(pending[0], Song):
+                yield pending.popleft(), None
+            pending.popleft()
+            yield result
+        while pending:
+            yield pending.popleft(), None
+    
+    if workers > 1:
+        print_above_progress(f"Extracting metadata with {workers} {engine} workers")
+    progress_line = ProgressLine(unit='files') if show_progress else None
+    io_before = read_io_counters()
+    
+    extracted = 0
     processed = 0
     
-    # Process files with progress bar
-    for root, dirs, files in os.walk(music_path):
-        for file in files:
-            if file.lower().endswith(audio_extensions):
-                file_path = os.path.join(root, file)
-                
-                # Update progress bar roughly 50 times
-                if processed % (total_files // 50 + 1) == 0:
-                    print("=", end="", flush=True)
-                
-                metadata = extract_metadata(file_path)
-                if metadata:
-                    songs.append(metadata)
-                
-                processed += 1
+    # Files stream straight from the directory walk into extraction
+    for metadata, seconds in settled():
+        # Songs come back in walk order, so the oldest mark belongs to this file
+        progress = progress_marks.popleft()
+        processed += 1
+        if progress_line:
+            progress_line.update(processed, progress)
+        if seconds is not None:
+            metrics.observe('extract_metadata', seconds, reader=reader)
+        
+        if metadata:
+            extracted += 1
+            # Only remember files we could read so failures are retried next time
+            fingerprint = new_fingerprints.get(metadata['file_path'])
+            if fingerprints is not None and fingerprint is not None:
+                fingerprints[metadata['file_path']] = fingerprint
+            yield metadata
+    
+    if progress_line:
+        progress_line.finish()
+    
+    # Bytes read by this process (and its threads) while scanning; reads through
+    # mmap and in process pool workers aren't counted
+    io_after = read_io_counters()
+    if io_after:
+        metrics.count('scan_bytes_read', io_after['rchar'] - io_before['rchar'])
+    metrics.count('scan_files', processed)
+    metrics.count('scan_extracted', extracted)
+    metrics.count('scan_itunesdb_songs', counts['itunesdb'])
+    metrics.count('scan_reused', counts['unchanged'])
     
-    print("]\n")  # Close progress bar
-    print(f"Successfully extracted metadata from {len(songs)} out of {processed} audio files")
-    return songs 
\ No newline at end of file
+    if processed == 0:
+        print_above_progress("No audio files found")
+        return
+    
+    print_above_progress(f"Successfully extracted metadata from {extracted} out of {processed} audio files")
+    if itunesdb_songs is not None:
+        print_above_progress(f"{counts['itunesdb']} songs came from iTunesDB, "
+                             f"{counts['added'] + counts['changed'] - counts['itunesdb']} files had their tags read")
+    if incremental:
+        removed = sum(1 for path in old_fingerprints if path not in seen)
+        print_above_progress(f"Incremental scan: {counts['added']} added, {counts['changed']} changed, "
+                             f"{removed} removed, {counts['unchanged']} unchanged")
+
+def scan_ipod_for_audio(ipod_path, previous_songs: Optional[List[Song]] = None,
+                        fingerprints: Optional[Dict[str, List[int]]] = None,
+                        workers: Optional[int] = None, engine: Optional[str] = None,
+                        use_itunesdb: Optional[bool] = None) -> List[Song]:
+    # Scan iPod for audio files and extract metadata, see iter_ipod_audio.
+    return list(iter_ipod_audio(ipod_path, previous_songs, fingerprints, workers, engine, use_itunesdb))
@@ -0,0 +1,257 @@
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+from .library import write_json_atomic
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_PREFIX = 'ipod_to_spotify_'
+
+def _series(name: str, labels: Tuple) -> str:
+    # name{key="value",...} as used in both reports
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+class Histogram:
+    # Latency distribution over LATENCY_BUCKETS, plus count, sum and max
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        # Estimated the way Prometheus's histogram_quantile does, interpolating within a bucket
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            if count and cumulative + count >= rank:
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - cumulative) / count)
+            cumulative += count
+        return self.max
+
+class Metrics:
+    # Counters and latency histograms shared by the scan and upload stages.
+    # Each series is a name plus optional labels, e.g.
+    #
+    #     metrics.count('search_cache_hits')
+    #     with metrics.timer('spotify_request', endpoint='search'):
+    #         ...
+    #
+    # export() writes everything as a JSON report and in Prometheus text format.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters: Dict[Tuple[str, Tuple], float] = {}
+            self.histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+            self.started_at = time.time()
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def get(self, name: str, **labels) -> float:
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def report(self) -> Dict:
+        # Everything recorded so far, with latency percentiles and cache hit rates worked out
+        with self._lock:
+            counters = {_series(name, labels): value for (name, labels), value in sorted(self.counters.items())}
+            timers = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                timers[_series(name, labels)] = {
+                    'count': histogram.count,
+                    'total_seconds': round(histogram.sum, 3),
+                    'mean_ms': round(histogram.sum / histogram.count * 1000, 2),
+                    'p50_ms': round(histogram.quantile(0.5) * 1000, 2),
+                    'p95_ms': round(histogram.quantile(0.95) * 1000, 2),
+                    'p99_ms': round(histogram.quantile(0.99) * 1000, 2),
+                    'max_ms': round(histogram.max * 1000, 2)
+                }
+
+        # Every <name>_hits / <name>_misses pair gets a <name>_hit_rate
+        hit_rates = {}
+        for series in counters:
+            for suffix in ('_hits', '_misses'):
+                if series.endswith(suffix):
+                    base = series[:-len(suffix)]
+                    hits = counters.get(base + '_hits', 0)
+                    misses = counters.get(base + '_misses', 0)
+                    hit_rates[base + '_hit_rate'] = round(hits / (hits + misses), 4)
+
+        return {
+            'generated_at': time.time(),
+            'elapsed_seconds': round(time.time() - self.started_at, 3),
+            'counters': counters,
+            'timers': timers,
+            'hit_rates': hit_rates
+        }
+
+    def prometheus(self) -> str:
+        # Prometheus text exposition format: counters as <name>_total, timers as
+        # <name>_seconds histograms
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f"{PROMETHEUS_PREFIX}{name}_total"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{_series(metric, labels)} {value:g}")
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f"{PROMETHEUS_PREFIX}{name}_seconds"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram.buckets):
+                    cumulative += count
+                    lines.append(f"{_series(metric + '_bucket', labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{_series(metric + '_sum', labels)} {histogram.sum:.6f}")
+                lines.append(f"{_series(metric + '_count', labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, json_path: str = 'metrics.json', prometheus_path: str = 'metrics.prom') -> None:
+        write_json_atomic(json_path, self.report(), indent=2)
+        with open(prometheus_path, 'w') as f:
+            f.write(self.prometheus())
+
+# Shared by every stage of a run
+metrics = Metrics()
+
+def read_io_counters() -> Dict[str, int]:
+    # This process's I/O counters from /proc/self/io (Linux), or {} elsewhere.
+    # rchar is bytes returned by read calls, read_bytes is what came from the disk.
+    try:
+        with open('/proc/self/io', 'r') as f:
+            return {key: int(value) for key, value in (line.split(': ') for line in f)}
+    except OSError:
+        return {}
+
+class ProgressLine:
+    # Progress bar redrawn in place with throughput and an ETA, e.g.
+    #
+    #     [=============                 ] 45%  1234 songs  85.2/s  ETA 0:18
+    #
+    # Only one bar is drawn at a time. Output from elsewhere while it's up (a scan
+    # feeding an upload, say) goes through print_above_progress so it isn't written
+    # into the middle of the bar.
+
+    _lock = threading.RLock()
+    _active: Optional['ProgressLine'] = None
+
+    def __init__(self, unit: str = 'songs', total: Optional[int] = None, width: int = 30,
+                 interval: float = 0.1):
+        self.unit = unit
+        self.total = total
+        self.width = width
+        self.interval = interval
+        self.started = time.monotonic()
+        self._last_draw = 0.0
+        self._line = ''
+        self._done = 0
+        self._fraction: Optional[float] = 0.0
+        self._finished = False
+        with ProgressLine._lock:
+            # Any bar still up was left behind by an interrupted run
+            ProgressLine._active = None
+
+    def update(self, done: int, fraction: Optional[float] = None) -> None:
+        # done items so far; fraction of the work finished, which defaults to done / total.
+        # Without either only the count and throughput are shown.
+        self._done = done
+        if fraction is None and self.total:
+            fraction = done / self.total
+        self._fraction = min(1.0, fraction) if fraction is not None else None
+        now = time.monotonic()
+        if now - self._last_draw >= self.interval:
+            self._last_draw = now
+            with ProgressLine._lock:
+                ProgressLine._active = self
+                self._draw(now)
+
+    def message(self, text: str) -> None:
+        # Print a line of output above the bar
+        with ProgressLine._lock:
+            ProgressLine._active = self
+            sys.stdout.write('\r' + ' ' * len(self._line) + '\r' + text + '\n')
+            self._draw(time.monotonic())
+
+    def finish(self) -> None:
+        with ProgressLine._lock:
+            self._finished = True
+            self._draw(time.monotonic())
+            sys.stdout.write('\n\n')
+            sys.stdout.flush()
+            if ProgressLine._active is self:
+                ProgressLine._active = None
+
+    def _draw(self, now: float) -> None:
+        elapsed = now - self.started
+        rate = self._done / elapsed if elapsed > 0 else 0.0
+        fraction = 1.0 if self._finished else self._fraction
+        if self._finished:
+            eta = f"in {self._format_time(elapsed)}"
+        elif fraction:
+            eta = f"ETA {self._format_time(elapsed * (1 - fraction) / fraction)}"
+        elif fraction is not None:
+            eta = 'ETA --:--'
+        else:
+            eta = ''
+        line = f"{self._done} {self.unit}  {rate:.1f}/s  {eta}".rstrip()
+        if fraction is not None:
+            filled = int(fraction * self.width)
+            line = f"[{'=' * filled}{' ' * (self.width - filled)}] {fraction * 100:3.0f}%  " + line
+        sys.stdout.write('\r' + line + ' ' * max(0, len(self._line) - len(line)))
+        sys.stdout.flush()
+        self._line = line
+
+    @staticmethod
+    def _format_time(seconds: float) -> str:
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def print_above_progress(text: str) -> None:
+    # print() for output that may come while another part of the run draws a progress bar
+    with ProgressLine._lock:
+        if ProgressLine._active:
+            ProgressLine._active.message(text)
+        else:
+            print(text)
@@ -0,0 +1,114 @@
+import itertools
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    # Split an iterable (possibly a lazy generator) into lists of at most size items
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _apply_chunk(fn: Callable, chunk: List) -> List:
+    # Run fn over one chunk of items inside a worker
+    return [fn(item) for item in chunk]
+
+def ordered_map(fn: Callable, items: Iterable, workers: int = 1, engine: str = 'thread',
+                chunk_size: int = 1, max_pending: int = None) -> Iterator:
+    # Apply fn to every item on a pool of workers and yield the results in input order.
+    # Items are submitted in chunks of chunk_size and at most max_pending chunks are in
+    # flight at once, so items can be a lazy generator of any length. With engine='process'
+    # fn and the items must be picklable. workers <= 1 runs everything in the calling thread.
+    if workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    executor_cls = ProcessPoolExecutor if engine == 'process' else ThreadPoolExecutor
+    max_pending = max_pending or workers * 2
+
+    with executor_cls(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in _chunks(items, chunk_size):
+            pending.append(executor.submit(_apply_chunk, fn, chunk))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+class _Prefetched:
+    # What prefetch returns: an iterator over the produced items whose close() stops the
+    # producer and waits for its cleanup to finish, whether or not anything was consumed
+    def __init__(self, items: Iterator, stop: threading.Event, producer: threading.Thread):
+        self._items = items
+        self._stop = stop
+        self._producer = producer
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self):
+        return next(self._items)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._items.close()
+        self._producer.join()
+
+def prefetch(items: Iterable, max_size: int) -> _Prefetched:
+    # Produce items on a background thread, running up to max_size items ahead of the
+    # consumer, so a slow producer (e.g. the iPod scan) and a slow consumer (e.g. Spotify)
+    # work at the same time. The thread starts right away. An exception raised by the
+    # producer is re-raised in the consumer once the items before it are consumed.
+    # When the consumer stops early (it's closed, or fails) the producer stops too, and
+    # a generator producer is closed so its cleanup runs; close() waits for that, so
+    # whatever the producer writes to is safe to close afterwards.
+    buffer = queue.Queue(maxsize=max_size)
+    done = object()
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        # Wait for room in the buffer, giving up if the consumer has gone
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    break
+            else:
+                put((done, None))
+        except BaseException as e:
+            put((done, e))
+        finally:
+            if stop.is_set() and hasattr(items, 'close'):
+                items.close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    def consume():
+        try:
+            while True:
+                item, error = buffer.get()
+                if item is done:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    return _Prefetched(consume(), stop, producer)
@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+class RateGovernor:
+    # Client-side token bucket shared by every Spotify API call.
+    # The rate adapts AIMD-style: each successful call nudges it up by roughly one
+    # request/second per second of traffic, and each 429 halves it and pauses all
+    # callers for the server's Retry-After. The learned rate is saved to state_file
+    # (straight away whenever it's cut, so an interrupted run keeps it) so the next
+    # run starts at the last sustainable throughput. clock and sleep can be swapped
+    # out to drive it without waiting in real time.
+
+    def __init__(self, rate: float = 10.0, min_rate: float = 0.5, max_rate: float = 30.0,
+                 state_file: Optional[str] = 'rate_limit_state.json',
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self._clock = clock
+        self._sleep = sleep
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.state_file = state_file
+        self.rate = self._load_rate(rate)
+        self.throttle_count = 0
+        self._tokens = 1.0
+        self._last = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _load_rate(self, default: float) -> float:
+        # Start from the rate learned by a previous run if there is one
+        if self.state_file and os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r') as f:
+                    default = float(json.load(f)['rate'])
+            except (ValueError, KeyError, TypeError):
+                pass
+        return min(self.max_rate, max(self.min_rate, default))
+
+    def save(self) -> None:
+        # Persist the current rate for the next run
+        if not self.state_file:
+            return
+        with self._lock:
+            state = {'rate': round(self.rate, 3), 'updated_at': time.time()}
+        with open(self.state_file, 'w') as f:
+            json.dump(state, f)
+
+    def acquire(self) -> None:
+        # Block until the caller may send one request
+        while True:
+            with self._lock:
+                now = self._clock()
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                else:
+                    # Allow bursts of up to one second's worth of requests
+                    capacity = max(1.0, self.rate)
+                    self._tokens = min(capacity, self._tokens + (now - self._last) * self.rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def on_success(self) -> None:
+        # Additive increase
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 1.0 / self.rate)
+
+    def on_throttle(self, retry_after: float) -> None:
+        # Multiplicative decrease, and hold every caller until Retry-After has passed
+        with self._lock:
+            self.throttle_count += 1
+            # Concurrent callers tend to hit the same limit together, so only back off once per pause
+            now = self._clock()
+            if now >= self._blocked_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+        # Persist the lower rate now, a run that's being throttled may well not finish
+        self.save()
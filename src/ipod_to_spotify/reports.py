@@ -0,0 +1,57 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from .store import LibraryStore
+
+class ReportWriter:
+    # Streams a per-song report into the library store as results come in: the upload
+    # or metadata check is a row in runs, and every song a row in results tagged with
+    # its category ('success', 'failed', ...). The run's summary counts are saved when
+    # the report is closed; a run without them was interrupted.
+    #
+    # Only the counters and the first few records of each category (for printing) are
+    # kept, so memory stays flat however many songs go through.
+
+    # Commit every this many records, so the report can be followed while it grows
+    COMMIT_EVERY = 500
+
+    # Records of each category kept in memory as samples
+    SAMPLE_SIZE = 5
+
+    def __init__(self, store: LibraryStore, kind: str, categories: Sequence[str],
+                 playlist_name: Optional[str] = None):
+        self.store = store
+        self.run_id = store.start_run(kind, playlist_name)
+        self.counts: Dict[str, int] = {category: 0 for category in categories}
+        self.samples: Dict[str, List[Dict]] = {category: [] for category in categories}
+        self._pending: List[Tuple[str, Dict]] = []
+
+    def write(self, category: str, record: Dict) -> None:
+        self._pending.append((category, record))
+        self.counts[category] += 1
+        if len(self.samples[category]) < self.SAMPLE_SIZE:
+            self.samples[category].append(record)
+        if len(self._pending) >= self.COMMIT_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self.store.add_results(self.run_id, self._pending)
+            self._pending = []
+
+    def close(self, total_songs: int, **extra) -> Dict:
+        # Save the remaining records and the summary, and return the summary with the
+        # samples as <category>_sample
+        self.flush()
+        summary = {'total_songs': total_songs}
+        summary.update({f"{category}_count": count for category, count in self.counts.items()})
+        summary.update(extra)
+        self.store.finish_run(self.run_id, summary)
+        summary.update({f"{category}_sample": sample for category, sample in self.samples.items()})
+        summary['run_id'] = self.run_id
+        return summary
+
+    def __enter__(self) -> 'ReportWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # An interrupted report keeps the records written so far, without a summary
+        self.flush()
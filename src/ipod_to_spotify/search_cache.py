@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import time
+from typing import Optional, Tuple
+from .metadata import make_search_key
+from .store import LibraryStore
+
+# File older versions kept the cache in, merged into the store's the first time it's opened
+LEGACY_CACHE_FILE = 'search_cache.db'
+
+class SearchCache:
+    # On-disk cache of Spotify search results keyed on the normalized (title, artist).
+    # Misses are stored too (track_id NULL) with a shorter TTL, so songs Spotify doesn't
+    # have aren't searched again on every run but are retried once the catalog may have
+    # changed. When the cache grows past max_entries the least recently used entries
+    # are evicted. Its table (search_results) is one of the library store's, and it
+    # goes through the store's connection and lock like the rest, so it's closed with
+    # the store.
+
+    def __init__(self, store: LibraryStore, ttl_days: int = 90,
+                 miss_ttl_days: int = 14, max_entries: int = 200000):
+        self.path = store.path
+        self.ttl = ttl_days * 86400
+        self.miss_ttl = miss_ttl_days * 86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = store._lock
+        self._conn = store._conn
+        with self._lock:
+            self._import_legacy_cache()
+            self._size = self._conn.execute('SELECT COUNT(*) FROM search_results').fetchone()[0]
+
+    def _import_legacy_cache(self) -> None:
+        # Copy the entries of a search_cache.db next to the store into it (keeping any
+        # entry the store already has), then delete the old file and its WAL files.
+        # Called with the lock held.
+        legacy_path = os.path.join(os.path.dirname(self.path), LEGACY_CACHE_FILE)
+        if not os.path.exists(legacy_path) or os.path.abspath(legacy_path) == os.path.abspath(self.path):
+            return
+        try:
+            self._conn.execute('ATTACH DATABASE ? AS legacy', (legacy_path,))
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        'INSERT OR IGNORE INTO search_results (search_key, track_id, created_at, last_used) '
+                        'SELECT search_key, track_id, created_at, last_used FROM legacy.search_results'
+                    )
+            finally:
+                self._conn.execute('DETACH DATABASE legacy')
+        except sqlite3.DatabaseError as e:
+            print(f"Couldn't move the search cache in '{legacy_path}' into '{self.path}': {str(e)}")
+            return
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(legacy_path + suffix):
+                os.remove(legacy_path + suffix)
+
+    def get(self, title: str, artist: str) -> Tuple[bool, Optional[str]]:
+        # Return (found, track_id). found is False if the song isn't cached or the entry
+        # expired; track_id is None for a cached "not on Spotify" result.
+        key = make_search_key(title, artist)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT track_id, created_at FROM search_results WHERE search_key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+
+            track_id, created_at = row
+            ttl = self.ttl if track_id else self.miss_ttl
+            if now - created_at > ttl:
+                self._conn.execute('DELETE FROM search_results WHERE search_key = ?', (key,))
+                self._conn.commit()
+                self._size -= 1
+                self.misses += 1
+                return False, None
+
+            self._conn.execute('UPDATE search_results SET last_used = ? WHERE search_key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return True, track_id
+
+    def contains(self, title: str, artist: str) -> bool:
+        # Whether an unexpired result is cached, without counting a hit or miss or
+        # refreshing the entry's last use
+        key = make_search_key(title, artist)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT track_id, created_at FROM search_results WHERE search_key = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return False
+        track_id, created_at = row
+        return time.time() - created_at <= (self.ttl if track_id else self.miss_ttl)
+
+    def set(self, title: str, artist: str, track_id: Optional[str]) -> None:
+        # Store a search result; track_id None records that nothing matched
+        key = make_search_key(title, artist)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE search_results SET track_id = ?, created_at = ?, last_used = ? WHERE search_key = ?',
+                (track_id, now, now, key)
+            )
+            if cursor.rowcount == 0:
+                self._conn.execute(
+                    'INSERT INTO search_results (search_key, track_id, created_at, last_used) VALUES (?, ?, ?, ?)',
+                    (key, track_id, now, now)
+                )
+                self._size += 1
+
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        # Drop the least recently used entries, leaving 10% headroom so we don't evict on every insert
+        target = int(self.max_entries * 0.9)
+        self._conn.execute('''
+            DELETE FROM search_results WHERE search_key IN (
+                SELECT search_key FROM search_results ORDER BY last_used ASC LIMIT ?
+            )
+        ''', (self._size - target,))
+        self._size = target
@@ -0,0 +1,108 @@
+import re
+from typing import Dict, List, Optional, Set, Tuple
+from .song import Song
+
+# Spotify's limit on the number of items in one playlist
+PLAYLIST_ITEM_LIMIT = 10000
+
+# Tracks added per request (Spotify API limit)
+BATCH_SIZE = 100
+
+# How an upload is split over playlists
+SHARDING_MODES = ('numbered', 'artist', 'genre')
+
+def shard_group(song: Song, mode: str) -> Optional[str]:
+    # The group that decides a song's playlist: nothing for numbered shards, the first
+    # letter of the artist ("A".."Z", "0-9" or "#"), or the genre
+    if mode == 'artist':
+        artist = song['artist'].strip()
+        if artist.lower().startswith('the '):
+            artist = artist[4:]
+        first = artist[:1].upper()
+        if first.isascii() and first.isalpha():
+            return first
+        return '0-9' if first.isdigit() else '#'
+    if mode == 'genre':
+        # Read from the ID3, MP4 or iTunesDB genre when the song was scanned
+        return song.genre or 'Unknown Genre'
+    return None
+
+def shard_name(name: str, group: Optional[str], number: int) -> str:
+    # "iPod Library", "iPod Library (2)", ... or "iPod Library: A", "iPod Library: A (2)", ...
+    if group is not None:
+        name = f"{name}: {group}"
+    return name if number == 1 else f"{name} ({number})"
+
+class PlaylistShards:
+    # Bookkeeping for the set of playlists one upload fills. Spotify caps a playlist at
+    # PLAYLIST_ITEM_LIMIT items, so tracks overflow into "<name> (2)", "<name> (3)", ...
+    # or, by artist or genre, go to one playlist per group ("<name>: A", "<name>: Rock"),
+    # each of which overflows the same way. Every track already in a shard or queued for
+    # one is indexed by id, so duplicate checks are a dict lookup however many shards
+    # there are. Talking to Spotify is left to the caller.
+
+    def __init__(self, name: str, mode: str = 'numbered', shard_size: int = PLAYLIST_ITEM_LIMIT):
+        self.name = name
+        self.mode = mode
+        self.shard_size = shard_size
+        self.playlist_ids: Dict[str, str] = {}
+        self.sizes: Dict[str, int] = {}
+        self._shard_of: Dict[str, str] = {}
+        self._pending: Dict[str, List[Tuple[str, Dict]]] = {}
+        # Lowest shard number of each group that may still have room
+        self._filling: Dict[Optional[str], int] = {}
+        if mode == 'numbered':
+            self._pattern = re.compile(rf"{re.escape(name)}(?: \(\d+\))?")
+        else:
+            self._pattern = re.compile(rf"{re.escape(name)}: .+")
+
+    def owns(self, playlist_name: str) -> bool:
+        # Whether a playlist with this name is one of the shards
+        return bool(self._pattern.fullmatch(playlist_name))
+
+    def register(self, name: str, playlist_id: str, track_ids: Set[str]) -> None:
+        # Index an existing shard and the tracks already in it
+        self.playlist_ids[name] = playlist_id
+        self.sizes[name] = len(track_ids)
+        for track_id in track_ids:
+            self._shard_of.setdefault(track_id, name)
+
+    def locate(self, track_id: str) -> Optional[str]:
+        # The shard a track is in or queued for
+        return self._shard_of.get(track_id)
+
+    @property
+    def track_count(self) -> int:
+        return len(self._shard_of)
+
+    def queue(self, track_id: str, song: Song, song_info: Dict) -> Tuple[str, bool]:
+        # Queue a track for the first shard of its group with room left.
+        # Returns (shard name, whether that shard has a full batch waiting).
+        group = shard_group(song, self.mode)
+        number = self._filling.get(group, 1)
+        while self.sizes.get(shard_name(self.name, group, number), 0) >= self.shard_size:
+            number += 1
+        self._filling[group] = number
+        name = shard_name(self.name, group, number)
+
+        self.sizes[name] = self.sizes.get(name, 0) + 1
+        self._shard_of[track_id] = name
+        self._pending.setdefault(name, []).append((track_id, song_info))
+        return name, len(self._pending[name]) >= BATCH_SIZE
+
+    def queued_shards(self) -> List[str]:
+        # Shards with tracks waiting to be added
+        return [name for name, batch in self._pending.items() if batch]
+
+    def take(self, name: str) -> List[Tuple[str, Dict]]:
+        # Remove and return a shard's queued (track id, song info) pairs
+        return self._pending.pop(name, [])
+
+    def discard(self, name: str, track_ids: List[str]) -> None:
+        # Forget tracks whose add failed, so later copies of them are tried again
+        for track_id in track_ids:
+            if self._shard_of.get(track_id) == name:
+                del self._shard_of[track_id]
+        self.sizes[name] -= len(track_ids)
+        # That may have made room in a shard already passed over
+        self._filling.clear()
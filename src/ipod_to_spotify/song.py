@@ -0,0 +1,126 @@
+import json
+import os
+from typing import Any, Dict, Optional
+
+class RawMetadataStore:
+    # Sidecar file holding the raw_metadata of every scanned song, keyed by file path.
+    # It's only read the first time a song's raw_metadata is actually needed (metadata
+    # reports, failed uploads), so the normal scan and upload paths never load it.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data = None
+
+    def get(self, file_path: str) -> Dict:
+        if self._data is None:
+            self._data = {}
+            if os.path.exists(self.path):
+                try:
+                    self._load()
+                except json.JSONDecodeError:
+                    print(f"Error reading {self.path}, raw metadata will be unavailable")
+        return self._data.get(file_path, {})
+
+    def _load(self) -> None:
+        with open(self.path, 'r') as f:
+            if not self.path.endswith('.jsonl'):
+                # Single JSON object written by older versions
+                self._data = json.load(f)
+                return
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._data[entry['file_path']] = entry['raw_metadata']
+
+class Song:
+    # Compact in-memory record for one scanned audio file.
+    # Only the fields the scan, check and upload paths use are kept. raw_metadata is
+    # held as compact JSON text (or left in a RawMetadataStore or the LibraryStore) and
+    # only decoded on access. Supports song['title'] / song.get('format') so code written
+    # against the old song dicts keeps working.
+
+    __slots__ = ('file_path', 'title', 'artist', 'album', 'raw_title', 'format',
+                 'length_seconds', 'isrc', 'genre', '_raw', '_raw_store')
+
+    FIELDS = ('file_path', 'title', 'artist', 'album', 'raw_title', 'format', 'length_seconds', 'isrc', 'genre')
+
+    def __init__(self, file_path: str, title: str = 'Unknown Title', artist: str = 'Unknown Artist',
+                 album: str = 'Unknown Album', raw_title: Optional[str] = None,
+                 format: Optional[str] = None, length_seconds: Optional[int] = None,
+                 isrc: Optional[str] = None, genre: Optional[str] = None, raw_metadata: Optional[Dict] = None,
+                 raw_store: Optional[RawMetadataStore] = None):
+        self.file_path = file_path
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.raw_title = raw_title if raw_title is not None else title
+        self.format = format
+        self.length_seconds = length_seconds
+        self.isrc = isrc
+        self.genre = genre
+        self._raw = json.dumps(raw_metadata, separators=(',', ':')) if raw_metadata else None
+        self._raw_store = raw_store
+
+    @classmethod
+    def from_dict(cls, data: Dict, raw_store: Optional[RawMetadataStore] = None) -> 'Song':
+        # Build a Song from a song dict (extract_metadata output or a saved library entry)
+        raw_metadata = data.get('raw_metadata')
+        length_seconds = data.get('length_seconds')
+        if length_seconds is None and raw_metadata:
+            length_seconds = raw_metadata.get('length_seconds')
+        genre = data.get('genre')
+        if genre is None and raw_metadata and raw_metadata.get('TCON'):
+            # Saved before songs had a genre field
+            genre = raw_metadata['TCON'][0]
+        return cls(
+            file_path=data['file_path'],
+            title=data.get('title', 'Unknown Title'),
+            artist=data.get('artist', 'Unknown Artist'),
+            album=data.get('album', 'Unknown Album'),
+            raw_title=data.get('raw_title'),
+            format=data.get('format'),
+            length_seconds=length_seconds,
+            isrc=data.get('isrc'),
+            genre=genre,
+            raw_metadata=raw_metadata,
+            raw_store=raw_store
+        )
+
+    @property
+    def raw_metadata(self) -> Dict:
+        if self._raw is not None:
+            return json.loads(self._raw)
+        if self._raw_store is not None:
+            return self._raw_store.get(self.file_path)
+        return {}
+
+    @property
+    def raw_metadata_json(self) -> str:
+        # raw_metadata as compact JSON text, without decoding it when we already have it
+        if self._raw is not None:
+            return self._raw
+        return json.dumps(self.raw_metadata, separators=(',', ':'))
+
+    def release_raw_metadata(self, raw_store: RawMetadataStore) -> None:
+        # Drop the in-memory raw_metadata once it's saved, reading it back from raw_store on demand
+        self._raw = None
+        self._raw_store = raw_store
+
+    def to_dict(self) -> Dict:
+        # Compact dict for saving; raw_metadata is saved separately
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'raw_metadata' or key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def __repr__(self) -> str:
+        return f"Song({self.title!r} by {self.artist!r}, {self.file_path!r})"
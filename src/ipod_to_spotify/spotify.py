@@ -1,9 +1,40 @@
 import os
-import json
+import time
+import requests
 import spotipy
-from typing import Optional, List, Dict, Set
+from functools import partial
+from typing import Optional, List, Dict, Set, Union, Iterable, Tuple
 from spotipy.oauth2 import SpotifyOAuth
+from spotipy.exceptions import SpotifyException
+from urllib3.util.retry import Retry
 from . import env
+from .ratelimit import RateGovernor
+from .search_cache import SearchCache
+from .pool import ordered_map
+from .metadata import make_search_key, normalize_search_text
+from .matching import rank_albums, rank_candidates
+from .song import Song
+from .library import load_songs
+from .journal import UploadJournal
+from .shards import PlaylistShards
+from .reports import ReportWriter
+from .store import LibraryStore
+from .metrics import metrics, ProgressLine
+
+# How many times a throttled (429) call is retried before giving up
+MAX_THROTTLE_RETRIES = 8
+
+# Playlist items per page (Spotify API limit)
+PLAYLIST_PAGE_SIZE = 100
+
+# Albums with fewer songs than this are cheaper to resolve one search per song
+MIN_ALBUM_GROUP_SIZE = 3
+
+# Album search results compared against each local album
+ALBUM_SEARCH_CANDIDATES = 5
+
+# Album tracks per page (Spotify API limit)
+ALBUM_TRACKS_PAGE_SIZE = 50
 
 def debug_env_loading():
     # Debug helper to check .env loading status
@@ -50,9 +81,40 @@ def debug_env_loading():
     print("\nSuccessfully loaded all required environment variables")
     return True
 
+def _build_session() -> requests.Session:
+    # HTTP session that retries server errors but hands 429s straight back to us,
+    # so the rate governor sees them instead of urllib3 sleeping blindly
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        respect_retry_after_header=False
+    )
+    adapter = requests.adapters.HTTPAdapter(max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _retry_after(error: SpotifyException) -> float:
+    # Seconds to wait according to a 429 response, with a conservative default
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return max(0.0, float(headers.get('Retry-After', 5)))
+    except (TypeError, ValueError):
+        return 5.0
+
 class SpotifyUploader:
-    def __init__(self):
-        # Initialize Spotify client with necessary scopes
+    def __init__(self, client: Optional[spotipy.Spotify] = None, governor: Optional[RateGovernor] = None,
+                 store: Optional[LibraryStore] = None):
+        # Initialize Spotify client with necessary scopes.
+        # client and governor can be passed in to run against a stand-in for the Web API
+        # (see benchmarks/) instead of signing in to Spotify. The playlist index, playlist
+        # contents, search cache and upload results live in store.
         scopes = [
             'playlist-modify-public',
             'playlist-modify-private',
@@ -60,18 +122,24 @@ class SpotifyUploader:
         ]
         
         # Check environment configuration
-        error = env.load_spotify_env()
-        if error:
-            raise ValueError(error)
+        if client is None:
+            error = env.load_spotify_env()
+            if error:
+                raise ValueError(error)
         
         try:
-            creds = env.get_spotify_creds()
-            self.sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
-                scope=' '.join(scopes),
-                **creds
-            ))
-            self.user_id = self.sp.current_user()['id']
+            if client is None:
+                creds = env.get_spotify_creds()
+                client = spotipy.Spotify(auth_manager=SpotifyOAuth(
+                    scope=' '.join(scopes),
+                    **creds
+                ), requests_session=_build_session())
+            self.sp = client
+            self.governor = governor or RateGovernor()
+            self.user_id = self._call(self.sp.current_user)['id']
+            self.store = store or LibraryStore()
             self._load_playlist_cache()
+            self.search_cache = SearchCache(self.store, **env.get_search_cache_settings())
         except Exception as e:
             if "invalid_client" in str(e).lower():
                 print("\nError: Invalid Spotify client credentials")
@@ -80,214 +148,475 @@ class SpotifyUploader:
                 raise
             raise
 
+    def _call(self, method, *args, **kwargs):
+        # Run a Spotify API call through the shared rate governor.
+        # A 429 slows the governor down, waits out Retry-After and tries again.
+        endpoint = getattr(method, '__name__', 'unknown')
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            with metrics.timer('rate_limit_wait'):
+                self.governor.acquire()
+            started = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except SpotifyException as e:
+                metrics.observe('spotify_request', time.perf_counter() - started, endpoint=endpoint)
+                if e.http_status != 429 or attempt == MAX_THROTTLE_RETRIES:
+                    metrics.count('spotify_errors', endpoint=endpoint)
+                    raise
+                metrics.count('spotify_retries', endpoint=endpoint)
+                wait = _retry_after(e)
+                self.governor.on_throttle(wait)
+                print(f"\nRate limited by Spotify, retrying in {wait:.0f}s "
+                      f"(now {self.governor.rate:.1f} requests/s)...")
+                continue
+            metrics.observe('spotify_request', time.perf_counter() - started, endpoint=endpoint)
+            self.governor.on_success()
+            return result
+
     def _load_playlist_cache(self):
-        # Load or create playlist cache file
-        self.cache_file = 'playlist_cache.json'
-        if os.path.exists(self.cache_file):
-            with open(self.cache_file, 'r') as f:
-                self.playlist_cache = json.load(f)
-        else:
-            self.playlist_cache = {}
+        # Load the playlist index ({name: id}) and when it was built from the store.
+        # An index older versions saved in playlist_cache.json isn't read; with no index
+        # saved yet it's rebuilt on first use.
+        self.playlist_cache, self.playlists_indexed_at = self.store.playlist_index()
 
-    def _save_playlist_cache(self):
-        # Save playlist cache to file
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.playlist_cache, f)
+    def _refresh_playlist_index(self):
+        # Rebuild the name -> id index from every page of the user's playlists.
+        # Only playlists the user owns are indexed, since those are the ones we can add to.
+        playlists = {}
+        created = self.store.created_playlists()
+        results = self._call(self.sp.user_playlists, self.user_id, limit=50)
+        while results:
+            for playlist in results['items']:
+                if playlist['owner']['id'] == self.user_id:
+                    # Keep the first playlist when several share a name, unless a later
+                    # one is ours (e.g. a shard named like one of the user's playlists)
+                    if playlist['id'] in created:
+                        playlists[playlist['name']] = playlist['id']
+                    else:
+                        playlists.setdefault(playlist['name'], playlist['id'])
+            if results['next']:
+                results = self._call(self.sp.next, results)
+            else:
+                break
+        
+        self.playlist_cache = playlists
+        self.playlists_indexed_at = time.time()
+        self.store.save_playlist_index(playlists, self.playlists_indexed_at)
+
+    def _refresh_stale_playlist_index(self) -> bool:
+        # Rebuild the index once it's older than the refresh interval, so renamed and
+        # deleted playlists drop out of it. Returns whether it was rebuilt.
+        if time.time() - self.playlists_indexed_at > env.get_playlist_index_ttl_hours() * 3600:
+            self._refresh_playlist_index()
+            return True
+        return False
 
     def get_or_create_playlist(self, name: str) -> str:
         # Get existing playlist ID or create new one
-        # Check cache first
+        refreshed = self._refresh_stale_playlist_index()
+        
         if name in self.playlist_cache:
-            # Verify playlist still exists
+            if refreshed:
+                return self.playlist_cache[name]
+            # Verify playlist still exists, asking for nothing but its id
             try:
-                self.sp.playlist(self.playlist_cache[name])
+                self._call(self.sp.playlist, self.playlist_cache[name], fields='id')
                 return self.playlist_cache[name]
-            except:
+            except SpotifyException:
                 pass
+        
+        # It may have been created or renamed on another device since the index was
+        # built, so check the full list before creating a new one
+        if not refreshed:
+            self._refresh_playlist_index()
+            if name in self.playlist_cache:
+                return self.playlist_cache[name]
 
-        # Search for existing playlist
-        playlists = self.sp.user_playlists(self.user_id)
-        for playlist in playlists['items']:
-            if playlist['name'] == name:
-                self.playlist_cache[name] = playlist['id']
-                self._save_playlist_cache()
-                return playlist['id']
+        return self.create_playlist(name)
 
-        # Create new playlist
-        playlist = self.sp.user_playlist_create(self.user_id, name)
+    def create_playlist(self, name: str) -> str:
+        # Create a new playlist, recording it as one of ours
+        playlist = self._call(self.sp.user_playlist_create, self.user_id, name)
         self.playlist_cache[name] = playlist['id']
-        self._save_playlist_cache()
+        self.store.set_playlist(name, playlist['id'])
+        self.store.add_created_playlist(playlist['id'])
         return playlist['id']
 
-    def search_track(self, title: str, artist: str) -> Optional[str]:
-        # Search for track with fuzzy matching
-        # Try exact match first
-        query = f"track:{title} artist:{artist}"
-        results = self.sp.search(q=query, type='track', limit=1)
+    def search_track(self, title: str, artist: str, album: Optional[str] = None,
+                     length_seconds: Optional[int] = None, isrc: Optional[str] = None) -> Optional[str]:
+        # Search for track with fuzzy matching, using the on-disk cache when possible.
+        # album and length_seconds, when known, help pick the right candidate. With an
+        # isrc the recording is looked up exactly first, and the fuzzy search is only
+        # needed when Spotify doesn't know that ISRC.
+        found, track_id = self.search_cache.get(title, artist)
+        if found:
+            metrics.count('search_cache_hits')
+            return track_id
         
-        if results['tracks']['items']:
-            return results['tracks']['items'][0]['id']
+        metrics.count('search_cache_misses')
+        with metrics.timer('search_track'):
+            track_id = self._search_isrc(isrc) if isrc else None
+            if not track_id:
+                track_id = self._search_spotify(title, artist, album, length_seconds)
+        metrics.count('tracks_found' if track_id else 'tracks_not_found')
+        self.search_cache.set(title, artist, track_id)
+        return track_id
+
+    def _search_isrc(self, isrc: str) -> Optional[str]:
+        # An ISRC identifies one recording, so any track Spotify returns for it is a match
+        results = self._call(self.sp.search, q=f"isrc:{isrc}", type='track', limit=1)
+        items = [track for track in results['tracks']['items'] if track and track.get('id')]
+        metrics.count('isrc_lookup_hits' if items else 'isrc_lookup_misses')
+        return items[0]['id'] if items else None
+
+    def _search_spotify(self, title: str, artist: str, album: Optional[str] = None,
+                        length_seconds: Optional[int] = None) -> Optional[str]:
+        # One free text query for several candidates, ranked locally on title, artist,
+        # album and duration rather than trusting Spotify's first result
+        query = f"{normalize_search_text(title)} {normalize_search_text(artist)}".replace(' - ', ' ')
+        results = self._call(self.sp.search, q=query, type='track', limit=env.get_search_candidates())
+        candidates = results['tracks']['items']
         
-        # Try more lenient search
-        query = f"{title} {artist}"
-        results = self.sp.search(q=query, type='track', limit=5)
+        best = rank_candidates(candidates, title, artist, album, length_seconds)
+        if best:
+            return best['id']
+        if candidates:
+            metrics.count('search_candidates_rejected')
+        return None
+
+    def resolve_albums(self, songs: Iterable[Song], resolved: Optional[Dict] = None) -> Dict[str, str]:
+        # Match whole albums at once: songs are grouped by (album, artist) and each group
+        # of at least MIN_ALBUM_GROUP_SIZE costs one album search plus its tracklist,
+        # instead of a search per song. Songs already cached or resolved, and
+        # songs with an ISRC (looked up exactly), are left out. Returns {search key:
+        # track id} for the songs matched; the rest are left to search_track.
+        groups: Dict[str, Dict[str, Song]] = {}
+        for song in songs:
+            if (song['title'] == 'Unknown Title' or song['artist'] == 'Unknown Artist'
+                    or song['album'] == 'Unknown Album' or song.get('isrc')):
+                continue
+            key = make_search_key(song['title'], song['artist'])
+            if (resolved and key in resolved) or self.search_cache.contains(song['title'], song['artist']):
+                continue
+            # One song per search key, duplicates share its match
+            groups.setdefault(make_search_key(song['album'], song['artist']), {}).setdefault(key, song)
+        albums = [list(group.values()) for group in groups.values() if len(group) >= MIN_ALBUM_GROUP_SIZE]
+        if not albums:
+            return {}
         
-        if results['tracks']['items']:
-            return results['tracks']['items'][0]['id']
+        print(f"\nMatching {len(albums)} albums against their Spotify tracklists...")
+        track_ids_by_key = {}
+        progress = ProgressLine(unit='albums', total=len(albums))
+        for done, matches in enumerate(ordered_map(self._resolve_album, albums, env.get_spotify_workers()), 1):
+            track_ids_by_key.update(matches)
+            progress.update(done)
+        progress.finish()
+        print(f"Matched {len(track_ids_by_key)} songs by album")
+        return track_ids_by_key
+
+    def _resolve_album(self, songs: List[Song]) -> Dict[str, str]:
+        # Find one local album on Spotify and match its songs against the tracklist.
+        # Matches are cached like search results so later runs skip them too.
+        album, artist = songs[0]['album'], songs[0]['artist']
+        with metrics.timer('resolve_album'):
+            query = f"album:{normalize_search_text(album)} artist:{normalize_search_text(artist)}".replace(' - ', ' ')
+            results = self._call(self.sp.search, q=query, type='album', limit=ALBUM_SEARCH_CANDIDATES)
+            best = rank_albums(results['albums']['items'], album, artist)
+            metrics.count('album_lookup_hits' if best else 'album_lookup_misses')
+            if not best:
+                return {}
+            tracklist = self._album_tracklist(best['id'])
         
-        return None
+        matches = {}
+        for song in songs:
+            track = rank_candidates(tracklist, song['title'], song['artist'], length_seconds=song.get('length_seconds'))
+            if track:
+                matches[make_search_key(song['title'], song['artist'])] = track['id']
+                self.search_cache.set(song['title'], song['artist'], track['id'])
+        metrics.count('album_tracks_matched', len(matches))
+        metrics.count('album_tracks_unmatched', len(songs) - len(matches))
+        return matches
+
+    def _album_tracklist(self, album_id: str) -> List[Dict]:
+        # Every track on an album, following pages for albums longer than one page
+        results = self._call(self.sp.album_tracks, album_id, limit=ALBUM_TRACKS_PAGE_SIZE)
+        tracks = list(results['items'])
+        while results['next']:
+            results = self._call(self.sp.next, results)
+            tracks.extend(results['items'])
+        return tracks
+
+    def _resolve_song(self, song: Song) -> Optional[str]:
+        # Look up one song
+        return self.search_track(song['title'], song['artist'], song['album'], song.get('length_seconds'),
+                                 song.get('isrc'))
+
+    def _resolve_job(self, job: Tuple[Song, Optional[str], bool]) -> Tuple[Song, Optional[str], Optional[str]]:
+        # Worker entry point for upload_songs: (song, key, search) -> (song, key, track_id),
+        # only calling Spotify when the job needs a search
+        song, key, search = job
+        return song, key, self._resolve_song(song) if search else None
 
     def get_existing_tracks(self, playlist_id: str) -> Set:
-        # Get all tracks currently in the playlist
-        existing_tracks = set()
-        results = self.sp.playlist_tracks(playlist_id)
+        # Get all tracks currently in the playlist.
+        # Contents are cached by the playlist's snapshot_id, which changes whenever the
+        # playlist does, so an unchanged playlist costs a single small request.
+        info = self._call(self.sp.playlist, playlist_id, fields='snapshot_id,tracks.total')
+        if self.store.playlist_snapshot(playlist_id) == info['snapshot_id']:
+            metrics.count('playlist_tracks_cache_hits')
+            return self.store.playlist_tracks(playlist_id)
         
-        while results:
-            for item in results['items']:
-                if item['track']:
-                    existing_tracks.add(item['track']['id'])
-            
-            if results['next']:
-                results = self.sp.next(results)
-            else:
-                break
+        # Only ask for track IDs, and fetch the pages concurrently
+        metrics.count('playlist_tracks_cache_misses')
+        offsets = range(0, info['tracks']['total'], PLAYLIST_PAGE_SIZE)
+        fetch_page = partial(self._fetch_playlist_page, playlist_id)
+        existing_tracks = set()
+        with metrics.timer('get_existing_tracks'):
+            for page in ordered_map(fetch_page, offsets, env.get_spotify_workers()):
+                for item in page['items']:
+                    if item['track'] and item['track']['id']:
+                        existing_tracks.add(item['track']['id'])
         
+        self.store.save_playlist_tracks(playlist_id, info['snapshot_id'], existing_tracks)
         return existing_tracks
 
-    def upload_songs(self, songs: List[Dict], playlist_name: Optional[str] = None) -> Dict:
-        # Upload songs to Spotify playlist and return results
-        playlist_name = playlist_name or env.get_default_playlist_name()
-        playlist_id = self.get_or_create_playlist(playlist_name)
+    def _fetch_playlist_page(self, playlist_id: str, offset: int) -> Dict:
+        return self._call(self.sp.playlist_items, playlist_id, fields='items(track(id))',
+                          limit=PLAYLIST_PAGE_SIZE, offset=offset, additional_types=('track',))
+
+    def _load_shards(self, name: str, mode: str) -> PlaylistShards:
+        # Find the playlists an upload named name already fills and index their tracks.
+        # Numbered shards always have their first playlist, so it's created up front (or an
+        # existing one of that name is used) the way a single playlist upload always did.
+        # Any other shard must be a playlist this tool created, so the user's own playlists
+        # that happen to be named like one ("<name> (2)", "<name>: Live") are left alone.
+        # A store that never uploaded to name (a fresh one after `poetry run cleanup`)
+        # can't tell, so then every owned playlist named like a shard is taken as one
+        # and recorded, rather than filling duplicates of shards made before.
+        shards = PlaylistShards(name, mode, env.get_playlist_shard_size())
+        if mode == 'numbered':
+            playlist_id = self.get_or_create_playlist(name)
+            shards.register(name, playlist_id, self.get_existing_tracks(playlist_id))
+        else:
+            self._refresh_stale_playlist_index()
+        created = self.store.created_playlists()
+        known_upload = self.store.has_uploaded_to(name)
+        for playlist_name, playlist_id in sorted(self.playlist_cache.items()):
+            if playlist_name == name or not shards.owns(playlist_name):
+                continue
+            if known_upload and playlist_id not in created:
+                continue
+            playlist_id = self.get_or_create_playlist(playlist_name)
+            self.store.add_created_playlist(playlist_id)
+            shards.register(playlist_name, playlist_id, self.get_existing_tracks(playlist_id))
+        return shards
+
+    def _add_to_playlist(self, playlist_id: str, track_ids: List[str]) -> None:
+        # Add tracks and keep the cached playlist contents in step with the new snapshot
+        with metrics.timer('playlist_add_items'):
+            result = self._call(self.sp.playlist_add_items, playlist_id, track_ids)
+        metrics.count('tracks_added', len(track_ids))
+        if self.store.playlist_snapshot(playlist_id) is not None:
+            self.store.add_playlist_tracks(playlist_id, result['snapshot_id'], track_ids)
+
+    def upload_songs(self, songs: Iterable[Song], playlist_name: Optional[str] = None, resume: bool = False,
+                     pipelined: bool = False) -> Dict:
+        # Upload songs to Spotify playlist and return a summary of the results.
+        # songs can be a list or a lazy iterator (e.g. songs still being scanned), which is
+        # consumed as it goes: each song is searched and batched into the playlist as it arrives.
+        # pipelined marks songs coming straight from a scan, which the journal records.
+        # With resume, an interrupted run's journal supplies its playlist, every track it
+        # already resolved and every batch it already added.
+        # Tracks are spread over as many playlists as needed (see PlaylistShards).
+        # Every song's outcome is saved to the library store as it is settled.
+        journal = UploadJournal.load() if resume else None
+        if journal:
+            playlist_name = journal.run['playlist_name']
+            sharding = journal.run.get('sharding', 'numbered')
+            journal.reopen()
+            print(f"\nResuming upload to '{playlist_name}': {len(journal.resolved)} tracks already "
+                  f"resolved, {len(journal.committed)} already added")
+        else:
+            if resume:
+                print("\nNo interrupted upload to resume, starting a new one")
+            playlist_name = playlist_name or env.get_default_playlist_name()
+            sharding = env.get_playlist_sharding()
+            journal = UploadJournal()
         
         # Get existing tracks to avoid duplicates
         print("\nChecking existing playlist tracks...")
-        existing_tracks = self.get_existing_tracks(playlist_id)
-        if existing_tracks:
-            print(f"Found {len(existing_tracks)} existing tracks in playlist")
-        
-        results = {
-            'success': [],
-            'failed': [],
-            'skipped': [],  # Track songs already in playlist
-            'invalid_metadata': []  # Track songs with missing/unknown metadata
-        }
-        
-        # Process songs in batches
-        track_ids = []
-        total_songs = len(songs)
+        shards = self._load_shards(playlist_name, sharding)
+        if not journal.run:
+            journal.start(shards.playlist_ids.get(playlist_name), playlist_name, sharding, pipelined)
+        if shards.track_count:
+            print(f"Found {shards.track_count} existing tracks in {len(shards.playlist_ids)} playlist(s)")
         
-        print(f"\nSearching and uploading {total_songs} songs to Spotify...")
-        print("Progress: [", end="", flush=True)
-        
-        for idx, song in enumerate(songs, 1):
-            # Print progress bar
-            if idx % (total_songs // 50 + 1) == 0:  # Update roughly 50 times
-                print("=", end="", flush=True)
+        # skipped: songs already in the playlist; invalid_metadata: missing/unknown metadata
+        with ReportWriter(self.store, 'upload', ('success', 'failed', 'skipped', 'invalid_metadata'),
+                          playlist_name) as report:
+            total_songs = len(songs) if hasattr(songs, '__len__') else None
             
-            # Create base song info with debug metadata
-            song_info = {
-                'file_path': song['file_path'],
-                'title': song['title'],
-                'artist': song['artist'],
-                'album': song['album'],
-                'raw_title': song.get('raw_title', song['title']),
-                'raw_metadata': song.get('raw_metadata', {}),
-                'format': song.get('format', 'unknown')
-            }
+            # Search results by key; tracks resolved before an interruption don't need searching again
+            track_ids_by_key = journal.resolved
+            # When the whole song list is known up front, albums are matched as a whole first
+            album_track_ids = {}
+            if total_songs is not None and env.get_resolve_by_album():
+                album_track_ids = self.resolve_albums(songs, track_ids_by_key)
+            requested_keys = set()
+            shared_searches = 0
             
-            # Skip songs with Unknown metadata
-            if song['title'] == 'Unknown Title' or song['artist'] == 'Unknown Artist':
-                invalid_reason = []
-                if song['title'] == 'Unknown Title':
-                    invalid_reason.append('Unknown Title')
-                if song['artist'] == 'Unknown Artist':
-                    invalid_reason.append('Unknown Artist')
-                
-                song_info['reason'] = f"Invalid metadata: {' '.join(invalid_reason)}"
-                results['invalid_metadata'].append(song_info)
-                continue
+            def jobs():
+                # Pair each song with its search key and whether it needs searching. Duplicate
+                # songs (re-imports, compilations, copies in several F-directories) share the
+                # search of the first copy, which is always handled before them.
+                nonlocal shared_searches
+                for song in songs:
+                    key = None
+                    search = False
+                    if song['title'] != 'Unknown Title' and song['artist'] != 'Unknown Artist':
+                        key = make_search_key(song['title'], song['artist'])
+                        if key in requested_keys:
+                            shared_searches += 1
+                        elif key not in track_ids_by_key and key not in album_track_ids:
+                            search = True
+                        requested_keys.add(key)
+                    yield song, key, search
             
-            track_id = self.search_track(song['title'], song['artist'])
+            workers = env.get_spotify_workers()
+            print(f"\nSearching and uploading {total_songs if total_songs is not None else 'scanned'} songs to Spotify...")
+            if workers > 1:
+                print(f"Resolving tracks with {workers} concurrent workers")
+            progress = ProgressLine(total=total_songs)
             
-            if track_id:
-                if track_id in existing_tracks:
-                    song_info['reason'] = 'Already in playlist'
-                    results['skipped'].append(song_info)
-                else:
-                    track_ids.append(track_id)
-                    song_info['spotify_track_id'] = track_id
-                    results['success'].append(song_info)
-            else:
-                song_info['reason'] = 'No matching song found on Spotify'
-                results['failed'].append(song_info)
+            # Searches run concurrently but come back in song order, so the bookkeeping and
+            # batching below still walks songs in order
+            resolved = ordered_map(self._resolve_job, jobs(), workers)
+            queued_tracks = set()
+            processed = 0
             
-            # Add tracks in batches of 100 (Spotify API limit)
-            if len(track_ids) >= 100:
+            def add_batch(shard: str) -> None:
+                # Add one shard's queued tracks. Their songs are only reported once the add
+                # succeeds or fails, so just the queued batches are held in memory.
+                batch = shards.take(shard)
+                track_ids = [track_id for track_id, _ in batch]
                 try:
-                    self.sp.playlist_add_items(playlist_id, track_ids)
-                    print(f"\nUploaded batch of {len(track_ids)} songs...")
-                    track_ids = []
+                    if shard not in shards.playlist_ids:
+                        # Shards are only ever our own playlists, even if the user has one of that name
+                        shards.playlist_ids[shard] = self.create_playlist(shard)
+                    self._add_to_playlist(shards.playlist_ids[shard], track_ids)
+                    journal.record_batch(track_ids, shards.playlist_ids[shard])
+                    progress.message(f"Uploaded batch of {len(track_ids)} songs to '{shard}'...")
+                    for _, song_info in batch:
+                        report.write('success', song_info)
                 except Exception as e:
-                    print(f"\nError uploading batch: {str(e)}")
-                    # Move failed batch to failed results
-                    last_batch = results['success'][-len(track_ids):]
-                    results['success'] = results['success'][:-len(track_ids)]
-                    for item in last_batch:
-                        item['reason'] = f'Batch upload failed: {str(e)}'
-                        results['failed'].append(item)
-                    track_ids = []
-        
-        # Add remaining tracks
-        if track_ids:
-            try:
-                self.sp.playlist_add_items(playlist_id, track_ids)
-                print(f"\nUploaded final batch of {len(track_ids)} songs...")
-            except Exception as e:
-                print(f"\nError uploading final batch: {str(e)}")
-                # Move failed batch to failed results
-                last_batch = results['success'][-len(track_ids):]
-                results['success'] = results['success'][:-len(track_ids)]
-                for item in last_batch:
-                    item['reason'] = f'Batch upload failed: {str(e)}'
-                    results['failed'].append(item)
-        
-        print("]\n")  # Close progress bar
-        
-        # Save results to file with more details
-        output_data = {
-            'total_songs': total_songs,
-            'success_count': len(results['success']),
-            'failed_count': len(results['failed']),
-            'skipped_count': len(results['skipped']),
-            'invalid_metadata_count': len(results['invalid_metadata']),
-            'success_songs': results['success'],
-            'failed_songs': results['failed'],
-            'skipped_songs': results['skipped'],
-            'invalid_metadata_songs': results['invalid_metadata']
-        }
-        
-        with open('upload_results.json', 'w') as f:
-            json.dump(output_data, f, indent=2)
+                    progress.message(f"Error uploading batch to '{shard}': {str(e)}")
+                    shards.discard(shard, track_ids)
+                    queued_tracks.difference_update(track_ids)
+                    for _, song_info in batch:
+                        song_info['reason'] = f'Batch upload failed: {str(e)}'
+                        report.write('failed', song_info)
+            
+            for idx, (song, key, track_id) in enumerate(resolved, 1):
+                processed = idx
+                progress.update(idx)
+                
+                # Create base song info; raw metadata is only attached to songs that
+                # fail, where it helps debugging, so it isn't loaded for every song
+                song_info = {
+                    'file_path': song['file_path'],
+                    'title': song['title'],
+                    'artist': song['artist'],
+                    'album': song['album'],
+                    'raw_title': song.get('raw_title', song['title']),
+                    'format': song.get('format', 'unknown')
+                }
+                
+                # Skip songs with Unknown metadata
+                if song['title'] == 'Unknown Title' or song['artist'] == 'Unknown Artist':
+                    invalid_reason = []
+                    if song['title'] == 'Unknown Title':
+                        invalid_reason.append('Unknown Title')
+                    if song['artist'] == 'Unknown Artist':
+                        invalid_reason.append('Unknown Artist')
+                    
+                    song_info['reason'] = f"Invalid metadata: {' '.join(invalid_reason)}"
+                    song_info['raw_metadata'] = song.get('raw_metadata', {})
+                    report.write('invalid_metadata', song_info)
+                    continue
+                
+                if key not in track_ids_by_key:
+                    journal.record_resolved(key, album_track_ids.get(key, track_id))
+                track_id = track_ids_by_key[key]
+                
+                if track_id:
+                    song_info['spotify_track_id'] = track_id
+                    # Which shard (if any) already has it, whichever of them that is
+                    shard = shards.locate(track_id)
+                    if track_id in journal.committed and track_id not in queued_tracks:
+                        # Added by the interrupted run this one is resuming
+                        queued_tracks.add(track_id)
+                        song_info['playlist'] = shard
+                        report.write('success', song_info)
+                    elif shard and track_id not in queued_tracks:
+                        song_info['reason'] = f"Already in playlist '{shard}'"
+                        report.write('skipped', song_info)
+                    elif track_id in queued_tracks:
+                        song_info['reason'] = 'Duplicate of an earlier song in this upload'
+                        report.write('skipped', song_info)
+                    else:
+                        shard, batch_full = shards.queue(track_id, song, song_info)
+                        queued_tracks.add(track_id)
+                        song_info['playlist'] = shard
+                        # Add tracks in batches of 100 (Spotify API limit)
+                        if batch_full:
+                            add_batch(shard)
+                else:
+                    song_info['reason'] = 'No matching song found on Spotify'
+                    song_info['raw_metadata'] = song.get('raw_metadata', {})
+                    report.write('failed', song_info)
+            
+            # Add remaining tracks
+            for shard in shards.queued_shards():
+                add_batch(shard)
+            
+            progress.finish()
+            total_songs = processed
+            results = report.close(total_songs, playlists=shards.playlist_ids)
+        self.governor.save()
+        journal.finish()
         
         # Print summary
         print("\nUpload Summary:")
         print(f"Total songs processed: {total_songs}")
-        print(f"Successfully uploaded: {len(results['success'])} songs")
-        print(f"Already in playlist: {len(results['skipped'])} songs")
-        print(f"Invalid metadata: {len(results['invalid_metadata'])} songs")
-        print(f"Failed to upload: {len(results['failed'])} songs")
+        print(f"Successfully uploaded: {results['success_count']} songs")
+        if len(shards.playlist_ids) > 1:
+            print(f"Spread over {len(shards.playlist_ids)} playlists:")
+            for shard in sorted(shards.playlist_ids):
+                print(f"  {shard}: {shards.sizes.get(shard, 0)} tracks")
+        print(f"Already in playlist or duplicate: {results['skipped_count']} songs")
+        print(f"Invalid metadata: {results['invalid_metadata_count']} songs")
+        print(f"Failed to upload: {results['failed_count']} songs")
+        if shared_searches:
+            print(f"Duplicate songs sharing a search: {shared_searches}")
+        print(f"Search cache: {self.search_cache.hits} hits, {self.search_cache.misses} misses")
+        if self.governor.throttle_count:
+            print(f"Rate limited {self.governor.throttle_count} times, settled at {self.governor.rate:.1f} requests/s")
         
-        if results['success']:
-            success_rate = (len(results['success'])/total_songs)*100
+        if results['success_count'] and total_songs:
+            success_rate = (results['success_count']/total_songs)*100
             print(f"Success rate: {success_rate:.1f}%")
         
-        if results['failed'] or results['skipped'] or results['invalid_metadata']:
-            print(f"\nDetailed results saved to 'upload_results.json'")
+        if results['failed_count'] or results['skipped_count'] or results['invalid_metadata_count']:
+            print(f"\nDetailed results saved to '{self.store.path}' (run {results['run_id']})")
+        
+        metrics.export()
+        print("Timings and counters saved to 'metrics.json' and 'metrics.prom'")
         
         return results
 
-def process_songs(songs_data: List[Dict] = None, json_path: str = None, playlist_name: Optional[str] = None):
-    # Process songs either from direct data or JSON file
+def process_songs(songs_data: List[Union[Song, Dict]] = None, json_path: str = None, playlist_name: Optional[str] = None,
+                  resume: bool = False, store: Optional[LibraryStore] = None):
+    # Process songs either from direct data or a library file (JSON Lines or older JSON)
     songs = songs_data
     
     # If no direct data provided, try loading from JSON
@@ -296,15 +625,16 @@ def process_songs(songs_data: List[Dict] = None, json_path: str = None, playlist
             raise ValueError("Either songs_data or json_path must be provided")
             
         try:
-            with open(json_path, 'r') as f:
-                songs = json.load(f)
+            songs = load_songs(json_path)
         except Exception as e:
             raise ValueError(f"Failed to load songs from {json_path}: {str(e)}")
+    else:
+        songs = [song if isinstance(song, Song) else Song.from_dict(song) for song in songs]
     
     # Validate we have data after all attempts
     if not songs:
         raise ValueError("No songs provided (empty data)")
     
     # Process the songs
-    uploader = SpotifyUploader()
-    return uploader.upload_songs(songs, playlist_name) 
\ No newline at end of file
+    uploader = SpotifyUploader(store=store)
+    return uploader.upload_songs(songs, playlist_name, resume) 
\ No newline at end of file
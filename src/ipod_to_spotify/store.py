@@ -0,0 +1,402 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from .metadata import make_search_key
+from .song import Song
+
+# The one database file holding the library, run history and playlist index
+STORE_PATH = 'ipod_library.db'
+
+# The library every menu option works from; multi-device scans add one per device
+MAIN_LIBRARY = 'main'
+
+# Bump when the tables below change in a way older databases need migrating for
+SCHEMA_VERSION = 1
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS songs (
+        library TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        search_key TEXT,
+        title TEXT NOT NULL,
+        artist TEXT NOT NULL,
+        album TEXT NOT NULL,
+        raw_title TEXT,
+        format TEXT,
+        length_seconds INTEGER,
+        isrc TEXT,
+        genre TEXT,
+        raw_metadata TEXT,
+        fingerprint TEXT,
+        PRIMARY KEY (library, file_path)
+    );
+    CREATE INDEX IF NOT EXISTS idx_songs_file_path ON songs (file_path);
+    CREATE INDEX IF NOT EXISTS idx_songs_search_key ON songs (search_key);
+
+    CREATE TABLE IF NOT EXISTS runs (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        playlist_name TEXT,
+        started_at REAL NOT NULL,
+        finished_at REAL,
+        summary TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS results (
+        run_id INTEGER NOT NULL REFERENCES runs (run_id),
+        status TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        search_key TEXT,
+        title TEXT,
+        artist TEXT,
+        album TEXT,
+        track_id TEXT,
+        playlist TEXT,
+        reason TEXT,
+        details TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_results_run_status ON results (run_id, status);
+    CREATE INDEX IF NOT EXISTS idx_results_status_artist ON results (status, artist);
+    CREATE INDEX IF NOT EXISTS idx_results_file_path ON results (file_path);
+    CREATE INDEX IF NOT EXISTS idx_results_search_key ON results (search_key);
+
+    CREATE TABLE IF NOT EXISTS playlists (
+        name TEXT PRIMARY KEY,
+        playlist_id TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS created_playlists (
+        playlist_id TEXT PRIMARY KEY
+    );
+
+    CREATE TABLE IF NOT EXISTS playlist_snapshots (
+        playlist_id TEXT PRIMARY KEY,
+        snapshot_id TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS playlist_tracks (
+        playlist_id TEXT NOT NULL,
+        track_id TEXT NOT NULL,
+        PRIMARY KEY (playlist_id, track_id)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS search_results (
+        search_key TEXT PRIMARY KEY,
+        track_id TEXT,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_search_results_last_used ON search_results (last_used);
+
+    CREATE TABLE IF NOT EXISTS store_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+'''
+
+# Song columns, in the order they're selected and inserted
+_SONG_COLUMNS = ('file_path', 'title', 'artist', 'album', 'raw_title', 'format', 'length_seconds', 'isrc', 'genre')
+
+# Results columns other than run_id, status and details; everything else in a
+# report record is kept as JSON in details
+_RESULT_COLUMNS = ('file_path', 'title', 'artist', 'album', 'spotify_track_id', 'playlist', 'reason')
+
+def _search_key(title: str, artist: str) -> Optional[str]:
+    # The search key of a song with usable metadata, None for Unknown titles and artists
+    if title == 'Unknown Title' or artist == 'Unknown Artist':
+        return None
+    return make_search_key(title, artist)
+
+class LibraryStore:
+    # SQLite database holding everything that outlives a run: the songs of every scanned
+    # library (with their raw metadata and scan fingerprints), the history of uploads
+    # and metadata checks with one row per song, and the index of the user's Spotify
+    # playlists and their contents. Everything is read and written a row or a batch at
+    # a time inside transactions, so nothing is loaded or rewritten whole, and the
+    # indexes on file path, search key and status keep questions like "failed songs by
+    # this artist" a query away:
+    #
+    #     SELECT title, reason FROM results WHERE status = 'failed' AND artist = 'Queen'
+    #
+    # The Spotify search cache (see SearchCache) keeps its table here too.
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    # Songs
+
+    def has_library(self, library: str = MAIN_LIBRARY) -> bool:
+        with self._lock:
+            row = self._conn.execute('SELECT 1 FROM songs WHERE library = ? LIMIT 1', (library,)).fetchone()
+        return row is not None
+
+    def iter_songs(self, library: str = MAIN_LIBRARY, page_size: int = 1000) -> Iterator[Song]:
+        # Lazily read a library in scan order, a page at a time. Raw metadata stays in
+        # the database until a song's raw_metadata is used.
+        raw_store = _StoredRawMetadata(self, library)
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f'SELECT rowid, {", ".join(_SONG_COLUMNS)} FROM songs '
+                    f'WHERE library = ? AND rowid > ? ORDER BY rowid LIMIT ?',
+                    (library, last_rowid, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield Song(*row[1:], raw_store=raw_store)
+            last_rowid = rows[-1][0]
+
+    def load_songs(self, library: str = MAIN_LIBRARY) -> List[Song]:
+        return list(self.iter_songs(library))
+
+    def raw_metadata(self, library: str, file_path: str) -> Dict:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT raw_metadata FROM songs WHERE library = ? AND file_path = ?', (library, file_path)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def fingerprints(self, library: str = MAIN_LIBRARY) -> Dict[str, List[int]]:
+        # File fingerprints from a library's last scan, for incremental rescans
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT file_path, fingerprint FROM songs WHERE library = ? AND fingerprint IS NOT NULL', (library,)
+            ).fetchall()
+        return {file_path: json.loads(fingerprint) for file_path, fingerprint in rows}
+
+    def main_devices(self) -> List[str]:
+        # The device libraries the main library was combined from, [] if it's a single scan
+        return self._state('main_devices', [])
+
+    def set_main_devices(self, libraries: List[str]) -> None:
+        self._set_state('main_devices', libraries)
+
+    def device_libraries(self) -> Dict[str, str]:
+        # {device id: library} of every device scanned into a library of its own
+        return self._state('device_libraries', {})
+
+    def set_device_libraries(self, libraries: Dict[str, str]) -> None:
+        self._set_state('device_libraries', libraries)
+
+    def _state(self, key: str, default):
+        # A JSON value from store_state
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM store_state WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_state(self, key: str, value) -> None:
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO store_state (key, value) VALUES (?, ?)',
+                               (key, json.dumps(value)))
+
+    def writer(self, library: str = MAIN_LIBRARY, keep_raw_metadata: bool = False) -> 'LibraryWriter':
+        return LibraryWriter(self, library, keep_raw_metadata)
+
+    def _insert_songs(self, library: str, rows: List[Tuple]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f'INSERT OR REPLACE INTO songs (library, search_key, raw_metadata, fingerprint, '
+                f'{", ".join(_SONG_COLUMNS)}) VALUES ({", ".join("?" * (len(_SONG_COLUMNS) + 4))})',
+                [(library,) + row for row in rows]
+            )
+
+    def _replace_library(self, library: str, staging: str) -> None:
+        # Swap a finished scan in for the previous one in a single transaction
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM songs WHERE library = ?', (library,))
+            self._conn.execute('UPDATE songs SET library = ? WHERE library = ?', (library, staging))
+
+    def _delete_library(self, library: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM songs WHERE library = ?', (library,))
+
+    # Runs and their per-song results
+
+    def start_run(self, kind: str, playlist_name: Optional[str] = None) -> int:
+        # Record the start of an upload or metadata check and return its run id
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'INSERT INTO runs (kind, playlist_name, started_at) VALUES (?, ?, ?)',
+                (kind, playlist_name, time.time())
+            )
+        return cursor.lastrowid
+
+    def has_uploaded_to(self, playlist_name: str) -> bool:
+        # Whether an upload to this playlist name was ever started with this store
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM runs WHERE kind = 'upload' AND playlist_name = ? LIMIT 1", (playlist_name,)
+            ).fetchone()
+        return row is not None
+
+    def add_results(self, run_id: int, records: List[Tuple[str, Dict]]) -> None:
+        # Store a batch of (status, report record) pairs
+        rows = []
+        for status, record in records:
+            details = {key: value for key, value in record.items() if key not in _RESULT_COLUMNS}
+            rows.append((run_id, status, _search_key(record['title'], record['artist']))
+                        + tuple(record.get(column) for column in _RESULT_COLUMNS)
+                        + (json.dumps(details, separators=(',', ':')) if details else None,))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO results (run_id, status, search_key, file_path, title, artist, album, '
+                'track_id, playlist, reason, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+
+    def finish_run(self, run_id: int, summary: Dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE runs SET finished_at = ?, summary = ? WHERE run_id = ?',
+                (time.time(), json.dumps(summary), run_id)
+            )
+
+    # Spotify playlists
+
+    def playlist_index(self) -> Tuple[Dict[str, str], float]:
+        # The saved {name: playlist id} index and when it was built (0 if never)
+        with self._lock:
+            playlists = dict(self._conn.execute('SELECT name, playlist_id FROM playlists').fetchall())
+            row = self._conn.execute("SELECT value FROM store_state WHERE key = 'playlists_indexed_at'").fetchone()
+        return playlists, float(row[0]) if row else 0.0
+
+    def save_playlist_index(self, playlists: Dict[str, str], indexed_at: float) -> None:
+        # Replace the whole index with a freshly fetched one
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM playlists')
+            self._conn.executemany('INSERT INTO playlists (name, playlist_id) VALUES (?, ?)', playlists.items())
+            self._conn.execute("INSERT OR REPLACE INTO store_state (key, value) VALUES ('playlists_indexed_at', ?)",
+                               (str(indexed_at),))
+
+    def set_playlist(self, name: str, playlist_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO playlists (name, playlist_id) VALUES (?, ?)', (name, playlist_id))
+
+    def add_created_playlist(self, playlist_id: str) -> None:
+        # Remember a playlist this tool created, as opposed to one the user made
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR IGNORE INTO created_playlists (playlist_id) VALUES (?)', (playlist_id,))
+
+    def created_playlists(self) -> Set[str]:
+        with self._lock:
+            return {playlist_id for playlist_id, in self._conn.execute('SELECT playlist_id FROM created_playlists')}
+
+    def playlist_snapshot(self, playlist_id: str) -> Optional[str]:
+        # snapshot_id of the saved contents of a playlist, None if they aren't saved
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT snapshot_id FROM playlist_snapshots WHERE playlist_id = ?', (playlist_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def playlist_tracks(self, playlist_id: str) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute('SELECT track_id FROM playlist_tracks WHERE playlist_id = ?', (playlist_id,))
+            return {track_id for track_id, in rows}
+
+    def save_playlist_tracks(self, playlist_id: str, snapshot_id: str, track_ids: Set[str]) -> None:
+        # Replace the saved contents of a playlist
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM playlist_tracks WHERE playlist_id = ?', (playlist_id,))
+            self._set_snapshot(playlist_id, snapshot_id, track_ids)
+
+    def add_playlist_tracks(self, playlist_id: str, snapshot_id: str, track_ids: List[str]) -> None:
+        # Keep saved contents in step with tracks we just added
+        with self._lock, self._conn:
+            self._set_snapshot(playlist_id, snapshot_id, track_ids)
+
+    def _set_snapshot(self, playlist_id: str, snapshot_id: str, track_ids) -> None:
+        self._conn.executemany('INSERT OR IGNORE INTO playlist_tracks (playlist_id, track_id) VALUES (?, ?)',
+                               ((playlist_id, track_id) for track_id in track_ids))
+        self._conn.execute('INSERT OR REPLACE INTO playlist_snapshots (playlist_id, snapshot_id) VALUES (?, ?)',
+                           (playlist_id, snapshot_id))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class _StoredRawMetadata:
+    # Stands in for a RawMetadataStore: songs read from the database fetch their own
+    # raw_metadata row when they need it
+    def __init__(self, store: LibraryStore, library: str):
+        self.store = store
+        self.library = library
+
+    def get(self, file_path: str) -> Dict:
+        return self.store.raw_metadata(self.library, file_path)
+
+class LibraryWriter:
+    # Streams songs into one library of the store as they are produced. They're written
+    # under a staging name and replace the library in one transaction when the writer
+    # is committed, so a crash mid-scan leaves the previous library intact. Written songs
+    # drop their in-memory raw_metadata and read it back from the store on demand,
+    # unless keep_raw_metadata is set for songs that are used before the writer is
+    # committed.
+    #
+    #     with store.writer() as writer:
+    #         for song in songs:
+    #             writer.write(song, fingerprints.get(song.file_path))
+
+    # Commit every this many songs, so a big scan is written in bounded transactions
+    COMMIT_EVERY = 500
+
+    def __init__(self, store: LibraryStore, library: str = MAIN_LIBRARY, keep_raw_metadata: bool = False):
+        self.store = store
+        self.library = library
+        self.keep_raw_metadata = keep_raw_metadata
+        self.count = 0
+        self.closed = False
+        self._staging = f"{library}.scanning"
+        self._raw_store = _StoredRawMetadata(store, library)
+        self._rows = []
+        # Leftovers of a scan that crashed
+        store._delete_library(self._staging)
+
+    def write(self, song: Song, fingerprint: Optional[List[int]] = None) -> None:
+        self._rows.append((_search_key(song.title, song.artist), song.raw_metadata_json,
+                           json.dumps(fingerprint) if fingerprint is not None else None)
+                          + tuple(getattr(song, column) for column in _SONG_COLUMNS))
+        if not self.keep_raw_metadata:
+            song.release_raw_metadata(self._raw_store)
+        self.count += 1
+        if len(self._rows) >= self.COMMIT_EVERY:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._rows:
+            self.store._insert_songs(self._staging, self._rows)
+            self._rows = []
+
+    def commit(self) -> None:
+        # Write what's left and swap the new library in
+        self._flush()
+        self.store._replace_library(self.library, self._staging)
+        self.closed = True
+
+    def discard(self) -> None:
+        # Throw away everything written, leaving any existing library untouched
+        self._rows = []
+        self.store._delete_library(self._staging)
+        self.closed = True
+
+    def __enter__(self) -> 'LibraryWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.closed:
+            return
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
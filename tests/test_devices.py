@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from ipod_to_spotify.commands import assign_device_libraries
+from ipod_to_spotify.device import device_id
+from ipod_to_spotify.store import LibraryStore
+
+class DeviceLibrariesTest(unittest.TestCase):
+    # Naming the per-device libraries of multi-device scans
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.store = LibraryStore(os.path.join(self._dir.name, 'ipod_library.db'))
+
+    def tearDown(self):
+        self.store.close()
+        self._dir.cleanup()
+
+    def volume(self, *parts: str, guid: str = None) -> str:
+        path = os.path.join(self._dir.name, *parts)
+        os.makedirs(os.path.join(path, 'iPod_Control', 'Device'))
+        if guid:
+            with open(os.path.join(path, 'iPod_Control', 'Device', 'SysInfo'), 'w') as f:
+                f.write(f"BoardHwName: iPod Q98\nFirewireGuid: {guid}\n")
+        return path
+
+    def test_colliding_labels_get_free_numbers(self):
+        paths = [self.volume('a', 'IPOD'), self.volume('IPOD-2'), self.volume('b', 'IPOD'), self.volume('c', 'IPOD')]
+        self.assertEqual(assign_device_libraries(self.store, paths),
+                         ['device:IPOD', 'device:IPOD-2', 'device:IPOD-3', 'device:IPOD-4'])
+
+    def test_names_survive_reordering(self):
+        paths = [self.volume('a', 'IPOD'), self.volume('b', 'IPOD')]
+        first = dict(zip(paths, assign_device_libraries(self.store, paths)))
+        reversed_paths = paths[::-1]
+        second = dict(zip(reversed_paths, assign_device_libraries(self.store, reversed_paths)))
+        self.assertEqual(first, second)
+
+    def test_device_id_prefers_sysinfo(self):
+        self.assertEqual(device_id(self.volume('IPOD', guid='0x000A27001A2B3C4D')), 'FirewireGuid:0x000A27001A2B3C4D')
+        plain = self.volume('OTHER')
+        self.assertEqual(device_id(plain), os.path.realpath(plain))
+
+    def test_same_ipod_keeps_its_library_at_another_mount_point(self):
+        first = self.volume('a', 'IPOD', guid='0x1')
+        self.assertEqual(assign_device_libraries(self.store, [first]), ['device:IPOD'])
+        moved = self.volume('b', 'IPOD 1', guid='0x1')
+        self.assertEqual(assign_device_libraries(self.store, [self.volume('c', 'IPOD'), moved]),
+                         ['device:IPOD-2', 'device:IPOD'])
+
+if __name__ == '__main__':
+    unittest.main()
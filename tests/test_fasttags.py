@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from mutagen import File
+from benchmarks.library import build_mp3, generate_library
+from ipod_to_spotify.fasttags import read_mp3_tags, read_mp4_tags
+from ipod_to_spotify.metadata import extract_metadata
+
+class FastTagsTest(unittest.TestCase):
+    # The tags-only readers against mutagen, on a synthetic library covering ID3v2.3
+    # and v2.4 MP3s, M4As, files with large artwork, tagless files and ISRCs
+
+    @classmethod
+    def setUpClass(cls):
+        cls._dir = tempfile.TemporaryDirectory()
+        generate_library(cls._dir.name, 80, seed=3, audio_kb=4, artwork_kb=64, itunesdb=False)
+        cls.files = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(os.path.join(cls._dir.name, 'iPod_Control', 'Music'))
+            for name in names
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._dir.cleanup()
+
+    def test_matches_mutagen(self):
+        for file_path in self.files:
+            with self.subTest(file=os.path.basename(file_path)):
+                fast = extract_metadata(file_path, fast=True)
+                slow = extract_metadata(file_path, fast=False)
+                for field in ('title', 'artist', 'album', 'raw_title', 'isrc', 'genre', 'format'):
+                    self.assertEqual(fast[field], slow[field], field)
+
+    def test_mp3_frames_match_mutagen(self):
+        for file_path in self.files:
+            if not file_path.endswith('.mp3'):
+                continue
+            with self.subTest(file=os.path.basename(file_path)):
+                fast = extract_metadata(file_path, fast=True, with_duration=True)
+                slow = extract_metadata(file_path, fast=False)
+                self.assertEqual(fast.raw_metadata, slow.raw_metadata)
+
+    def test_mp4_fields_and_duration_match_mutagen(self):
+        for file_path in self.files:
+            if not file_path.endswith('.m4a'):
+                continue
+            with self.subTest(file=os.path.basename(file_path)):
+                tags = read_mp4_tags(file_path, with_duration=True)
+                audio = File(file_path)
+                self.assertEqual(tags['title'], audio['\xa9nam'][0])
+                self.assertEqual(tags['artist'], audio['\xa9ART'][0])
+                self.assertEqual(tags['album'], audio['\xa9alb'][0])
+                self.assertEqual(tags['genre'], audio['\xa9gen'][0])
+                self.assertEqual(tags['raw_metadata']['length_seconds'], int(audio.info.length))
+
+    def test_tagless_mp3_falls_back(self):
+        file_path = os.path.join(self._dir.name, 'tagless.mp3')
+        with open(file_path, 'wb') as f:
+            f.write(build_mp3({}, 10))
+        self.assertIsNone(read_mp3_tags(file_path))
+        self.assertEqual(extract_metadata(file_path, fast=True)['title'], 'Unknown Title')
+
+    def test_non_mp4_is_rejected(self):
+        mp3 = next(path for path in self.files if path.endswith('.mp3'))
+        self.assertIsNone(read_mp4_tags(mp3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import struct
+import tempfile
+import unittest
+from mutagen import File
+from benchmarks.library import build_itunesdb, generate_library
+from ipod_to_spotify.itunesdb import ITunesDBError, parse_itunesdb, read_itunesdb
+
+def _mutagen_fields(file_path: str):
+    # (title, artist, album, genre) as mutagen reads them from the file's own tags
+    audio = File(file_path)
+    if file_path.endswith('.m4a'):
+        keys = ('\xa9nam', '\xa9ART', '\xa9alb', '\xa9gen')
+        return tuple(str(audio[key][0]) if key in audio else None for key in keys)
+    keys = ('TIT2', 'TPE1', 'TALB', 'TCON')
+    return tuple(str(audio.tags[key]) if key in audio.tags else None for key in keys)
+
+class ITunesDBTest(unittest.TestCase):
+    # The iTunesDB reader against the tags mutagen reads from the same files
+
+    @classmethod
+    def setUpClass(cls):
+        cls._dir = tempfile.TemporaryDirectory()
+        cls.counts = generate_library(cls._dir.name, 80, seed=5, audio_kb=4, artwork_kb=8, itunesdb_coverage=0.8)
+        cls.songs = read_itunesdb(cls._dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._dir.cleanup()
+
+    def test_reads_every_track(self):
+        self.assertEqual(len(self.songs), self.counts['itunesdb_tracks'])
+
+    def test_paths_resolve_to_files(self):
+        for key, song in self.songs.items():
+            self.assertEqual(key, song['file_path'].lower())
+            self.assertTrue(os.path.isfile(song['file_path']), song['file_path'])
+
+    def test_matches_file_tags(self):
+        for song in self.songs.values():
+            with self.subTest(file=os.path.basename(song['file_path'])):
+                title, artist, album, genre = _mutagen_fields(song['file_path'])
+                self.assertEqual(song['title'], title)
+                # Titles holding "Artist - Title" have no artist, in the file or the database
+                self.assertEqual(song['artist'], artist or 'Unknown Artist')
+                self.assertEqual(song['album'], album)
+                self.assertEqual(song['genre'], genre)
+                self.assertEqual(song['raw_metadata']['TCON'], [genre])
+                self.assertEqual(song['format'], 'mp4' if song['file_path'].endswith('.m4a') else 'mp3')
+
+    def test_missing_database(self):
+        with tempfile.TemporaryDirectory() as empty:
+            self.assertIsNone(read_itunesdb(empty))
+
+    def test_empty_and_corrupt_databases(self):
+        self.assertEqual(parse_itunesdb(build_itunesdb([])), {})
+        with self.assertRaises(ITunesDBError):
+            parse_itunesdb(b'XXXX' + build_itunesdb([])[4:])
+
+def _chunk(tag: bytes, header: bytes, header_len: int, children: bytes = b'', third_field: int = None) -> bytes:
+    # tag, header length, total length (or the given third field) and the rest of the header,
+    # zero padded to header_len, then the children
+    third = len(children) + header_len if third_field is None else third_field
+    fields = tag + struct.pack('<II', header_len, third) + header
+    return fields.ljust(header_len, b'\0') + children
+
+def _string_mhod(mhod_type: int, encoding: int, raw: bytes) -> bytes:
+    # Header of 24 bytes, then the string header (encoding at 24, byte length at 28) and the string at 40
+    string_header = struct.pack('<IIII', encoding, len(raw), 1, 0)
+    return _chunk(b'mhod', struct.pack('<I', mhod_type), 24, string_header + raw)
+
+class HandBuiltITunesDBTest(unittest.TestCase):
+    # The reader against a database laid out byte by byte, independent of the benchmark generator
+
+    def database(self) -> bytes:
+        mhods = [
+            _string_mhod(1, 1, b'C\x00a\x00f\x00\xe9\x00'),       # title, UTF-16LE
+            _string_mhod(2, 2, b':iPod_Control:Music:F07:ABCD.mp3'),  # location, UTF-8
+            _string_mhod(4, 2, 'Björk'.encode('utf-8')),          # artist, UTF-8
+            _string_mhod(3, 1, 'Début'.encode('utf-16-le')),      # album, UTF-16LE
+            _string_mhod(6, 1, 'MPEG audio file'.encode('utf-16-le')),  # file type, not read
+        ]
+        # length_ms, track, total tracks, year, bitrate at 40..63; disc number at 92
+        mhit_header = struct.pack('<I', len(mhods)).ljust(28, b'\0') + struct.pack(
+            '<IIIIII', 215000, 3, 12, 1993, 192, 44100 << 16).ljust(52, b'\0') + struct.pack('<I', 2)
+        mhit = _chunk(b'mhit', mhit_header, 0x184, b''.join(mhods))
+        # A track without a location isn't a file on the iPod
+        orphan = _chunk(b'mhit', struct.pack('<I', 1), 0x184, _string_mhod(1, 2, b'Orphan'))
+        mhlt = _chunk(b'mhlt', b'', 92, mhit + orphan, third_field=2)
+        tracks = _chunk(b'mhsd', struct.pack('<I', 1), 96, mhlt)
+        # Playlists come first in some databases and are skipped
+        playlists = _chunk(b'mhsd', struct.pack('<I', 2), 96, _chunk(b'mhlp', b'', 92, third_field=0))
+        return _chunk(b'mhbd', b'', 104, playlists + tracks)
+
+    def test_reads_fields_at_their_offsets(self):
+        tracks = parse_itunesdb(self.database())
+        self.assertEqual(tracks, {':iPod_Control:Music:F07:ABCD.mp3': {
+            'location': ':iPod_Control:Music:F07:ABCD.mp3',
+            'title': 'Café',
+            'artist': 'Björk',
+            'album': 'Début',
+            'length_ms': 215000,
+            'track_number': 3,
+            'year': 1993,
+            'bitrate': 192,
+            'sample_rate': 44100,
+            'disc_number': 2,
+        }})
+
+    def test_builds_song_paths_and_metadata(self):
+        with tempfile.TemporaryDirectory() as ipod:
+            os.makedirs(os.path.join(ipod, 'iPod_Control', 'iTunes'))
+            with open(os.path.join(ipod, 'iPod_Control', 'iTunes', 'iTunesDB'), 'wb') as f:
+                f.write(self.database())
+            songs = read_itunesdb(ipod)
+            file_path = os.path.join(ipod, 'iPod_Control', 'Music', 'F07', 'ABCD.mp3')
+            self.assertEqual(list(songs), [file_path.lower()])
+            song = songs[file_path.lower()]
+            self.assertEqual(song['file_path'], file_path)
+            self.assertEqual(song['format'], 'mp3')
+            self.assertEqual(song['raw_metadata'], {'source': 'itunesdb', 'TDRC': ['1993'], 'TRCK': ['3'],
+                                                    'TPOS': ['2'], 'bitrate': 192000, 'sample_rate': 44100,
+                                                    'length_seconds': 215})
+
+    def test_truncated_database(self):
+        with self.assertRaises((ITunesDBError, struct.error)):
+            parse_itunesdb(self.database()[:300])
+
+if __name__ == '__main__':
+    unittest.main()
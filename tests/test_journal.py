@@ -0,0 +1,143 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from benchmarks.fake_spotify import Catalog, FakeSpotify
+from ipod_to_spotify.journal import UploadJournal
+from ipod_to_spotify.ratelimit import RateGovernor
+from ipod_to_spotify.song import Song
+from ipod_to_spotify.spotify import SpotifyUploader
+from ipod_to_spotify.store import LibraryStore
+
+class InterruptingSpotify(FakeSpotify):
+    # Dies with Ctrl+C right after the given playlist add went through, before the
+    # uploader could journal it
+
+    interrupt_after_add = None
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        result = super().playlist_add_items(playlist_id, items, position)
+        if self.interrupt_after_add is not None:
+            self.interrupt_after_add -= 1
+            if self.interrupt_after_add == 0:
+                raise KeyboardInterrupt
+        return result
+
+class ResumeTest(unittest.TestCase):
+    # Resuming an interrupted upload adds every track exactly once
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        # The journal and metrics are written to the working directory
+        self._cwd = os.getcwd()
+        os.chdir(self._dir.name)
+        self._env = mock.patch.dict(os.environ, {'SPOTIFY_WORKERS': '1', 'PLAYLIST_SHARD_SIZE': '10000'})
+        self._env.start()
+        self.catalog = Catalog(500, num_artists=50, seed=1)
+        self.client = InterruptingSpotify(self.catalog, latency=0)
+        self.songs = [Song.from_dict({'file_path': f"/song{number}.mp3", 'title': track['name'],
+                                      'artist': track['artists'][0]['name'], 'album': track['album']['name']})
+                      for number, track in enumerate(self.catalog.tracks[:250])]
+
+    def tearDown(self):
+        self._env.stop()
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    def upload(self, songs, resume=False):
+        store = LibraryStore()
+        try:
+            uploader = SpotifyUploader(client=self.client, store=store,
+                                       governor=RateGovernor(rate=1e6, max_rate=1e6, state_file=None))
+            with contextlib.redirect_stdout(io.StringIO()):
+                return uploader.upload_songs(songs, 'Lib', resume=resume)
+        finally:
+            store.close()
+
+    def interrupted(self, songs):
+        with self.assertRaises(KeyboardInterrupt):
+            self.upload(songs)
+        self.assertTrue(os.path.exists('upload_journal.jsonl'))
+
+    def playlist_tracks(self):
+        return [track_id for playlist in self.client.playlists.values() for track_id in playlist['track_ids']]
+
+    def assert_uploaded_once(self):
+        tracks = self.playlist_tracks()
+        self.assertEqual(len(tracks), len(set(tracks)))
+        self.assertEqual(set(tracks), {track['id'] for track in self.catalog.tracks[:250]})
+        self.assertFalse(os.path.exists('upload_journal.jsonl'))
+
+    def test_resume_after_interrupted_scan(self):
+        def scanned():
+            yield from self.songs[:230]
+            raise KeyboardInterrupt
+        self.interrupted(scanned())
+        self.assertEqual(len(self.playlist_tracks()), 200)
+        self.assertEqual(len(UploadJournal.load().committed), 200)
+
+        results = self.upload(self.songs, resume=True)
+        self.assert_uploaded_once()
+        self.assertEqual(results['success_count'], 250)
+
+    def test_resume_after_add_that_was_not_journaled(self):
+        self.client.interrupt_after_add = 2
+        self.interrupted(self.songs)
+        self.assertEqual(len(self.playlist_tracks()), 200)
+        self.assertEqual(len(UploadJournal.load().committed), 100)
+
+        results = self.upload(self.songs, resume=True)
+        self.assert_uploaded_once()
+        self.assertEqual(results['skipped_count'], 100)
+
+class JournalFileTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, 'upload_journal.jsonl')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def write_journal(self):
+        journal = UploadJournal(self.path)
+        journal.start('id1', 'Lib')
+        journal.record_resolved('song\x1fartist', 'track1')
+        journal.record_batch(['track1'], 'id1')
+        journal._file.close()
+
+    def test_torn_last_line_is_ignored(self):
+        self.write_journal()
+        with open(self.path, 'a') as f:
+            f.write('{"type": "batch", "track_ids": ["track2", "tr')
+        journal = UploadJournal.load(self.path)
+        self.assertEqual(journal.run['playlist_name'], 'Lib')
+        self.assertEqual(journal.resolved, {'song\x1fartist': 'track1'})
+        self.assertEqual(journal.committed, {'track1'})
+
+    def test_complete_record_missing_its_newline_is_ignored(self):
+        self.write_journal()
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'type': 'batch', 'track_ids': ['track2'], 'playlist_id': 'id1'}))
+        self.assertEqual(UploadJournal.load(self.path).committed, {'track1'})
+
+    def test_resumed_run_writes_over_the_torn_line(self):
+        self.write_journal()
+        with open(self.path, 'a') as f:
+            f.write('{"type": "resol')
+        journal = UploadJournal.load(self.path)
+        journal.reopen()
+        journal.record_batch(['track2'], 'id1')
+        journal._file.close()
+        self.assertEqual(UploadJournal.load(self.path).committed, {'track1', 'track2'})
+
+    def test_journal_without_run_is_not_resumable(self):
+        with open(self.path, 'w') as f:
+            f.write('{"type": "ru')
+        self.assertIsNone(UploadJournal.load(self.path))
+        self.assertIsNone(UploadJournal.load(os.path.join(self._dir.name, 'missing.jsonl')))
+
+if __name__ == '__main__':
+    unittest.main()
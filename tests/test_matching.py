@@ -0,0 +1,46 @@
+import unittest
+from ipod_to_spotify.matching import rank_candidates
+
+def _track(track_id: str, name: str, artist: str = 'Queen', album: str = 'A Night at the Opera',
+           duration_ms: int = 355000) -> dict:
+    return {'id': track_id, 'name': name, 'artists': [{'name': artist}], 'album': {'name': album},
+            'duration_ms': duration_ms}
+
+class RankCandidatesTest(unittest.TestCase):
+    def rank(self, candidates, title='Bohemian Rhapsody', artist='Queen', album='A Night at the Opera',
+             length_seconds=355):
+        best = rank_candidates(candidates, title, artist, album, length_seconds)
+        return best['id'] if best else None
+
+    def test_exact_match_beats_variants(self):
+        candidates = [_track('remix', 'Bohemian Rhapsody - Remix'),
+                      _track('live', 'Bohemian Rhapsody (Live)', album='Live Killers'),
+                      _track('exact', 'Bohemian Rhapsody')]
+        self.assertEqual(self.rank(candidates), 'exact')
+
+    def test_featuring_credits_are_ignored(self):
+        candidates = [_track('other', 'Rhapsody'), _track('credited', 'Bohemian Rhapsody (feat. X)')]
+        self.assertEqual(self.rank(candidates, title='Bohemian Rhapsody feat. Y'), 'credited')
+        self.assertEqual(self.rank([_track('plain', 'Bohemian Rhapsody')], title='Bohemian Rhapsody ft. Y'),
+                         'plain')
+
+    def test_no_candidate_good_enough(self):
+        candidates = [_track('title', 'Somebody to Love'),
+                      _track('artist', 'Bohemian Rhapsody', artist='The Braids'),
+                      _track('length', 'Bohemian Rhapsody', duration_ms=180000)]
+        self.assertIsNone(self.rank(candidates))
+        self.assertIsNone(self.rank([]))
+        self.assertIsNone(self.rank([None, {'name': 'Bohemian Rhapsody'}]))
+
+    def test_first_of_equal_candidates_wins(self):
+        candidates = [_track('first', 'Bohemian Rhapsody'), _track('second', 'Bohemian Rhapsody')]
+        self.assertEqual(self.rank(candidates), 'first')
+        self.assertEqual(self.rank(candidates[::-1]), 'second')
+
+    def test_closer_duration_wins(self):
+        candidates = [_track('edit', 'Bohemian Rhapsody', duration_ms=330000),
+                      _track('album', 'Bohemian Rhapsody', duration_ms=356000)]
+        self.assertEqual(self.rank(candidates), 'album')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import contextlib
+import io
+import unittest
+from ipod_to_spotify.metrics import ProgressLine, print_above_progress
+
+class ProgressLineTest(unittest.TestCase):
+    # Output from elsewhere while a bar is drawn, like a scan feeding a pipelined upload
+
+    def test_output_goes_above_the_bar(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            progress = ProgressLine(interval=0)
+            progress.update(1)
+            print_above_progress('Scanning for audio files')
+            progress.update(2)
+            progress.finish()
+        lines = out.getvalue().split('\n')
+        self.assertEqual(lines[0].rsplit('\r', 1)[-1], 'Scanning for audio files')
+        # The bar is drawn again under it
+        self.assertTrue(lines[1].startswith('\r1 songs'))
+        self.assertIn('\r2 songs', lines[1])
+
+    def test_plain_print_without_a_bar(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            ProgressLine(interval=0).finish()
+            print_above_progress('Saved metadata')
+        self.assertTrue(out.getvalue().endswith('in 0:00\n\nSaved metadata\n'))
+
+    def test_interrupted_bar_is_not_drawn_again(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            ProgressLine(interval=0).update(1)
+            ProgressLine()
+            print_above_progress('Resuming')
+        self.assertEqual(out.getvalue().count('1 songs'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
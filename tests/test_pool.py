@@ -0,0 +1,61 @@
+import threading
+import unittest
+from ipod_to_spotify.pool import ordered_map, prefetch
+
+class OrderedMapTest(unittest.TestCase):
+    def test_keeps_input_order(self):
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                self.assertEqual(list(ordered_map(lambda x: x * 2, iter(range(50)), workers)),
+                                 [x * 2 for x in range(50)])
+
+class PrefetchTest(unittest.TestCase):
+    def test_yields_every_item_in_order(self):
+        self.assertEqual(list(prefetch(iter(range(100)), 4)), list(range(100)))
+
+    def test_reraises_producer_error(self):
+        def failing():
+            yield 1
+            raise ValueError('scan failed')
+
+        items = prefetch(failing(), 4)
+        self.assertEqual(next(items), 1)
+        with self.assertRaises(ValueError):
+            next(items)
+
+    def test_stops_producer_when_consumer_stops(self):
+        closed = threading.Event()
+        produced = []
+
+        def endless():
+            try:
+                while True:
+                    produced.append(len(produced))
+                    yield produced[-1]
+            finally:
+                closed.set()
+
+        items = prefetch(endless(), 4)
+        self.assertEqual([next(items) for _ in range(3)], [0, 1, 2])
+        items.close()
+        self.assertTrue(closed.wait(5))
+        # No more than a buffer's worth (and the item in hand) ran ahead
+        self.assertLessEqual(len(produced), 3 + 4 + 1)
+
+    def test_close_before_consuming_stops_producer(self):
+        closed = threading.Event()
+
+        def endless():
+            try:
+                while True:
+                    yield 1
+            finally:
+                closed.set()
+
+        items = prefetch(endless(), 4)
+        items.close()
+        # close() waits for the producer's cleanup
+        self.assertTrue(closed.is_set())
+
+if __name__ == '__main__':
+    unittest.main()
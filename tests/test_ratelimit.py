@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+from ipod_to_spotify.ratelimit import RateGovernor
+
+class FakeClock:
+    # Monotonic clock that only moves when slept on or advanced
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+class RateGovernorTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def governor(self, **kwargs) -> RateGovernor:
+        kwargs.setdefault('state_file', None)
+        return RateGovernor(clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    def test_throttle_halves_the_rate_and_pauses(self):
+        governor = self.governor(rate=8.0)
+        governor.on_throttle(retry_after=2.0)
+        self.assertEqual(governor.rate, 4.0)
+        self.assertEqual(governor.throttle_count, 1)
+        governor.acquire()
+        self.assertEqual(self.clock.slept, [2.0])
+
+    def test_throttles_during_one_pause_back_off_once(self):
+        governor = self.governor(rate=8.0)
+        governor.on_throttle(retry_after=2.0)
+        governor.on_throttle(retry_after=2.0)
+        self.assertEqual(governor.rate, 4.0)
+        self.assertEqual(governor.throttle_count, 2)
+        self.clock.now += 2.0
+        governor.on_throttle(retry_after=2.0)
+        self.assertEqual(governor.rate, 2.0)
+
+    def test_success_grows_the_rate_additively(self):
+        governor = self.governor(rate=4.0)
+        governor.on_success()
+        self.assertEqual(governor.rate, 4.25)
+        for _ in range(100):
+            governor.on_success()
+        # About one request/second more per second of traffic at that rate
+        self.assertAlmostEqual(governor.rate, (4.0 ** 2 + 2 * 101) ** 0.5, delta=0.05)
+
+    def test_rate_stays_within_bounds(self):
+        governor = self.governor(rate=100.0, min_rate=1.0, max_rate=5.0)
+        self.assertEqual(governor.rate, 5.0)
+        governor.on_success()
+        self.assertEqual(governor.rate, 5.0)
+        for _ in range(5):
+            self.clock.now += 10
+            governor.on_throttle(retry_after=1.0)
+        self.assertEqual(governor.rate, 1.0)
+
+    def test_acquire_paces_requests_to_the_rate(self):
+        governor = self.governor(rate=4.0)
+        for _ in range(5):
+            governor.acquire()
+        self.assertEqual(self.clock.slept, [0.25] * 4)
+
+    def test_state_file_round_trips(self):
+        with tempfile.TemporaryDirectory() as directory:
+            state_file = os.path.join(directory, 'rate_limit_state.json')
+            governor = self.governor(rate=8.0, state_file=state_file)
+            governor.on_throttle(retry_after=1.0)
+            with open(state_file) as f:
+                self.assertEqual(json.load(f)['rate'], 4.0)
+            self.assertEqual(self.governor(state_file=state_file).rate, 4.0)
+            # Out of range and unreadable states fall back within the bounds
+            self.assertEqual(self.governor(state_file=state_file, max_rate=2.0).rate, 2.0)
+            with open(state_file, 'w') as f:
+                f.write('{"rate": "fast"}')
+            self.assertEqual(self.governor(rate=3.0, state_file=state_file).rate, 3.0)
+
+if __name__ == '__main__':
+    unittest.main()
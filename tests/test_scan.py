@@ -0,0 +1,43 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from benchmarks.library import generate_library
+from ipod_to_spotify.commands import iter_new_songs
+from ipod_to_spotify.store import LibraryStore
+
+class IncrementalScanTest(unittest.TestCase):
+    # Scanning an iPod into the library store and rescanning it, on both worker pools
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.ipod_path = os.path.join(self._dir.name, 'IPOD')
+        generate_library(self.ipod_path, 30, seed=7, audio_kb=4, artwork_kb=4, itunesdb_coverage=0.5)
+        self.store = LibraryStore(os.path.join(self._dir.name, 'ipod_library.db'))
+
+    def tearDown(self):
+        self.store.close()
+        self._dir.cleanup()
+
+    def scan(self, engine: str, incremental: bool):
+        with mock.patch.dict(os.environ, {'SCAN_ENGINE': engine, 'SCAN_WORKERS': '2'}), \
+                contextlib.redirect_stdout(io.StringIO()):
+            return list(iter_new_songs(self.store, self.ipod_path, incremental=incremental, show_progress=False,
+                                       export_metrics=False))
+
+    def test_rescan_matches_full_scan(self):
+        for engine in ('thread', 'process'):
+            with self.subTest(engine=engine):
+                first = self.scan(engine, incremental=False)
+                # One changed file is read again, everything else comes from the store
+                changed = first[len(first) // 2]['file_path']
+                os.utime(changed, (0, 0))
+                second = self.scan(engine, incremental=True)
+                third = self.scan(engine, incremental=True)
+                self.assertEqual([song.to_dict() for song in second], [song.to_dict() for song in first])
+                self.assertEqual([song.to_dict() for song in third], [song.to_dict() for song in first])
+
+if __name__ == '__main__':
+    unittest.main()
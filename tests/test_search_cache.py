@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from ipod_to_spotify.metadata import make_search_key
+from ipod_to_spotify.search_cache import LEGACY_CACHE_FILE, SearchCache
+from ipod_to_spotify.store import LibraryStore
+
+class LegacyCacheTest(unittest.TestCase):
+    # search_cache.db files of older versions are merged into the store's cache once
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self._dir.name, 'ipod_library.db')
+        self.legacy_path = os.path.join(self._dir.name, LEGACY_CACHE_FILE)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def write_legacy_cache(self, entries):
+        now = time.time()
+        conn = sqlite3.connect(self.legacy_path)
+        conn.execute('CREATE TABLE search_results (search_key TEXT PRIMARY KEY, track_id TEXT, '
+                     'created_at REAL NOT NULL, last_used REAL NOT NULL)')
+        conn.executemany('INSERT INTO search_results VALUES (?, ?, ?, ?)',
+                         [(make_search_key(title, artist), track_id, now, now) for title, artist, track_id in entries])
+        conn.commit()
+        conn.close()
+
+    def open_cache(self) -> SearchCache:
+        store = LibraryStore(self.store_path)
+        self.addCleanup(store.close)
+        return SearchCache(store)
+
+    def test_imports_and_deletes_old_file(self):
+        self.write_legacy_cache([('Song', 'A', 'track1'), ('Missing', 'B', None)])
+        cache = self.open_cache()
+        self.assertEqual(cache.get('Song', 'A'), (True, 'track1'))
+        self.assertEqual(cache.get('Missing', 'B'), (True, None))
+        self.assertFalse(os.path.exists(self.legacy_path))
+
+    def test_keeps_entries_already_in_the_store(self):
+        self.open_cache().set('Song', 'A', 'new')
+        self.write_legacy_cache([('Song', 'A', 'old'), ('Other', 'B', 'track2')])
+        cache = self.open_cache()
+        self.assertEqual(cache.get('Song', 'A'), (True, 'new'))
+        self.assertEqual(cache.get('Other', 'B'), (True, 'track2'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from ipod_to_spotify.metadata import make_search_key, normalize_search_text
+
+class NormalizeSearchTextTest(unittest.TestCase):
+    def test_drops_featuring_credits(self):
+        for title in ('Song feat. X', 'Song ft. X', 'Song featuring X', 'Song (feat. X)',
+                      'Song [ft. X & Y]', 'Song (Featuring X)'):
+            with self.subTest(title=title):
+                self.assertEqual(normalize_search_text(title), 'song')
+
+    def test_bare_credit_stops_at_dash_suffix(self):
+        self.assertEqual(normalize_search_text('Song feat. X - Remix'), 'song - remix')
+        self.assertEqual(normalize_search_text('Song ft. X - Live'), 'song - live')
+        self.assertEqual(normalize_search_text('Song featuring X – Radio Edit'), 'song - radio edit')
+        self.assertEqual(normalize_search_text('Song feat. X -- Extended Mix'), 'song - extended mix')
+
+    def test_bare_credit_stops_at_bracket(self):
+        self.assertEqual(normalize_search_text('Song feat. X (Live)'), 'song (live)')
+        self.assertEqual(normalize_search_text('Song ft. X [Acoustic]'), 'song [acoustic]')
+
+    def test_bracketed_credit_keeps_dash_suffix(self):
+        self.assertEqual(normalize_search_text('Song (feat. X) - Remix'), 'song - remix')
+        self.assertEqual(normalize_search_text('Song [ft. X] - Remix'), 'song - remix')
+
+    def test_words_containing_ft_are_kept(self):
+        self.assertEqual(normalize_search_text('Left Behind'), 'left behind')
+        self.assertEqual(normalize_search_text('Daft Punk'), 'daft punk')
+
+    def test_drops_remaster_noise(self):
+        self.assertEqual(normalize_search_text('Song - 2011 Remastered'), 'song')
+        self.assertEqual(normalize_search_text('Song (Remastered 2009)'), 'song')
+
+class MakeSearchKeyTest(unittest.TestCase):
+    def test_credits_share_a_key(self):
+        self.assertEqual(make_search_key('Song feat. X', 'A'), make_search_key('Song (ft. X)', 'A'))
+        self.assertEqual(make_search_key('Song', 'a'), make_search_key('SONG', 'A'))
+
+    def test_remix_keeps_its_own_key(self):
+        self.assertNotEqual(make_search_key('Song feat. X - Remix', 'A'), make_search_key('Song', 'A'))
+        self.assertNotEqual(make_search_key('Song ft. X - Live', 'A'), make_search_key('Song feat. X', 'A'))
+        self.assertEqual(make_search_key('Song feat. X - Remix', 'A'), make_search_key('Song (ft. Y) - Remix', 'A'))
+
+    def test_dash_variants_share_a_key(self):
+        self.assertEqual(make_search_key('Song – Live', 'A'), make_search_key('Song - Live', 'A'))
+
+if __name__ == '__main__':
+    unittest.main()
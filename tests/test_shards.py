@@ -0,0 +1,123 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from benchmarks.fake_spotify import Catalog, FakeSpotify
+from ipod_to_spotify.ratelimit import RateGovernor
+from ipod_to_spotify.shards import PlaylistShards, shard_group
+from ipod_to_spotify.song import Song
+from ipod_to_spotify.spotify import SpotifyUploader
+from ipod_to_spotify.store import LibraryStore
+
+def _song(artist: str = 'Artist', genre: str = None) -> Song:
+    return Song(file_path='/song.mp3', title='Song', artist=artist, album='Album', genre=genre)
+
+class PlaylistShardsTest(unittest.TestCase):
+    def queue(self, shards: PlaylistShards, count: int, song: Song = None):
+        return [shards.queue(f"track{shards.track_count}", song or _song(), {})[0] for _ in range(count)]
+
+    def test_numbered_shards_roll_over_when_full(self):
+        shards = PlaylistShards('Lib', shard_size=3)
+        self.assertEqual(self.queue(shards, 7), ['Lib'] * 3 + ['Lib (2)'] * 3 + ['Lib (3)'])
+        self.assertEqual(shards.sizes, {'Lib': 3, 'Lib (2)': 3, 'Lib (3)': 1})
+        self.assertEqual(shards.queued_shards(), ['Lib', 'Lib (2)', 'Lib (3)'])
+        self.assertEqual([track_id for track_id, _ in shards.take('Lib (3)')], ['track6'])
+
+    def test_existing_shards_are_filled_first(self):
+        shards = PlaylistShards('Lib', shard_size=3)
+        shards.register('Lib', 'id1', {'a', 'b', 'c'})
+        shards.register('Lib (2)', 'id2', {'d'})
+        self.assertEqual(shards.locate('d'), 'Lib (2)')
+        self.assertEqual(shards.track_count, 4)
+        self.assertEqual(self.queue(shards, 3), ['Lib (2)', 'Lib (2)', 'Lib (3)'])
+
+    def test_failed_batch_frees_its_room(self):
+        shards = PlaylistShards('Lib', shard_size=2)
+        self.queue(shards, 3)
+        shards.discard('Lib', [track_id for track_id, _ in shards.take('Lib')])
+        self.assertIsNone(shards.locate('track0'))
+        self.assertEqual(self.queue(shards, 1), ['Lib'])
+
+    def test_full_batch_is_reported(self):
+        shards = PlaylistShards('Lib')
+        for number in range(100):
+            name, batch_full = shards.queue(f"track{number}", _song(), {})
+        self.assertTrue(batch_full)
+
+    def test_grouped_shards(self):
+        shards = PlaylistShards('Lib', 'artist', shard_size=2)
+        names = [shards.queue(f"t{number}", _song(artist), {})[0]
+                 for number, artist in enumerate(['The Beatles', 'Beck', 'Blur', '2Pac', 'Ólafur'])]
+        self.assertEqual(names, ['Lib: B', 'Lib: B', 'Lib: B (2)', 'Lib: 0-9', 'Lib: #'])
+        self.assertEqual(shard_group(_song(genre='Rock'), 'genre'), 'Rock')
+        self.assertEqual(shard_group(_song(), 'genre'), 'Unknown Genre')
+        self.assertIsNone(shard_group(_song(), 'numbered'))
+
+    def test_recognizes_shard_names(self):
+        numbered = PlaylistShards('Lib')
+        for name, owned in [('Lib', True), ('Lib (2)', True), ('Lib (12)', True), ('Lib 2', False),
+                            ('Lib (two)', False), ('Lib: A', False), ('Library', False)]:
+            with self.subTest(name=name):
+                self.assertEqual(numbered.owns(name), owned)
+        grouped = PlaylistShards('Lib', 'genre')
+        self.assertTrue(grouped.owns('Lib: Rock (2)'))
+        self.assertFalse(grouped.owns('Lib (2)'))
+
+class LoadShardsTest(unittest.TestCase):
+    # Which of the user's playlists an upload takes as its shards
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        # The journal and metrics are written to the working directory
+        self._cwd = os.getcwd()
+        os.chdir(self._dir.name)
+        self._env = mock.patch.dict(os.environ, {'PLAYLIST_SHARD_SIZE': '40', 'SPOTIFY_WORKERS': '1'})
+        self._env.start()
+        self.catalog = Catalog(500, num_artists=50, seed=1)
+        self.client = FakeSpotify(self.catalog, latency=0)
+        self.songs = [Song.from_dict({'file_path': f"/song{number}.mp3", 'title': track['name'],
+                                      'artist': track['artists'][0]['name'], 'album': track['album']['name']})
+                      for number, track in enumerate(self.catalog.tracks[:100])]
+
+    def tearDown(self):
+        self._env.stop()
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    def upload(self, songs):
+        store = LibraryStore()
+        try:
+            uploader = SpotifyUploader(client=self.client, store=store,
+                                       governor=RateGovernor(rate=1e6, max_rate=1e6, state_file=None))
+            with contextlib.redirect_stdout(io.StringIO()):
+                return uploader.upload_songs(songs, 'Lib')
+        finally:
+            store.close()
+
+    def playlists(self):
+        return sorted((playlist['name'], len(playlist['track_ids'])) for playlist in self.client.playlists.values())
+
+    def test_users_lookalike_playlist_is_left_alone(self):
+        self.upload(self.songs[:10])
+        user_playlist = self.client.user_playlist_create('user', 'Lib (2)')['id']
+        self.client.playlists[user_playlist]['track_ids'] = [track['id'] for track in self.catalog.tracks[:5]]
+        self.upload(self.songs)
+        self.assertEqual(self.client.playlists[user_playlist]['track_ids'],
+                         [track['id'] for track in self.catalog.tracks[:5]])
+        self.assertEqual(self.playlists(), [('Lib', 40), ('Lib (2)', 5), ('Lib (2)', 40), ('Lib (3)', 20)])
+
+    def test_shards_are_found_again_after_cleanup(self):
+        self.upload(self.songs)
+        before = self.playlists()
+        self.assertEqual(before, [('Lib', 40), ('Lib (2)', 40), ('Lib (3)', 20)])
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists('ipod_library.db' + suffix):
+                os.remove('ipod_library.db' + suffix)
+        results = self.upload(self.songs)
+        self.assertEqual(results['success_count'], 0)
+        self.assertEqual(self.playlists(), before)
+
+if __name__ == '__main__':
+    unittest.main()
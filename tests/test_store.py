@@ -0,0 +1,124 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from ipod_to_spotify.commands import LEGACY_SCAN_INDEX, import_legacy_library, load_existing_songs
+from ipod_to_spotify.song import Song
+from ipod_to_spotify.store import LibraryStore
+
+def _song(number: int) -> Song:
+    data = {'file_path': f"/iPod_Control/Music/F00/{number:04d}.mp3", 'title': f"Song {number}",
+            'artist': 'Artist', 'album': 'Album', 'format': 'mp3', 'raw_metadata': {'TIT2': [f"Song {number}"]}}
+    return Song.from_dict(data)
+
+class LibraryWriterTest(unittest.TestCase):
+    # Scans are written under a staging library and only replace the library when committed
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.store = LibraryStore(os.path.join(self._dir.name, 'ipod_library.db'))
+        with self.store.writer() as writer:
+            for number in range(3):
+                writer.write(_song(number), [number, 0, 0])
+
+    def tearDown(self):
+        self.store.close()
+        self._dir.cleanup()
+
+    def paths(self, library: str = 'main'):
+        return [song.file_path for song in self.store.iter_songs(library)]
+
+    def test_commit_swaps_the_new_library_in(self):
+        with self.store.writer() as writer:
+            # Write every song straight to the staging library
+            writer.COMMIT_EVERY = 1
+            writer.write(_song(5), [5, 0, 0])
+            writer.write(_song(1), [1, 1, 1])
+            self.assertEqual(len(self.paths('main.scanning')), 2)
+            # Readers still see the previous library until the commit
+            self.assertEqual(len(self.paths()), 3)
+        self.assertEqual(self.paths(), [_song(5).file_path, _song(1).file_path])
+        self.assertEqual(self.store.fingerprints(), {_song(5).file_path: [5, 0, 0], _song(1).file_path: [1, 1, 1]})
+        self.assertFalse(self.store.has_library('main.scanning'))
+
+    def test_discard_keeps_the_previous_library(self):
+        with self.store.writer() as writer:
+            writer.COMMIT_EVERY = 1
+            writer.write(_song(5))
+            writer.discard()
+        self.assertEqual(len(self.paths()), 3)
+        self.assertFalse(self.store.has_library('main.scanning'))
+
+    def test_failed_scan_keeps_the_previous_library(self):
+        with self.assertRaises(RuntimeError):
+            with self.store.writer() as writer:
+                writer.COMMIT_EVERY = 1
+                writer.write(_song(5))
+                raise RuntimeError('scan failed')
+        self.assertEqual(len(self.paths()), 3)
+        self.assertFalse(self.store.has_library('main.scanning'))
+
+    def test_written_songs_read_raw_metadata_back(self):
+        songs = self.store.load_songs()
+        self.assertEqual(songs[1].raw_metadata, {'TIT2': ['Song 1']})
+        self.assertEqual(songs[1].title, 'Song 1')
+
+class LegacyImportTest(unittest.TestCase):
+    # Libraries saved as JSON files by older versions are moved into the store
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        # Older versions kept their files in the working directory
+        self._cwd = os.getcwd()
+        os.chdir(self._dir.name)
+        self.store = LibraryStore(os.path.join(self._dir.name, 'ipod_library.db'))
+
+    def tearDown(self):
+        self.store.close()
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    def load(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return load_existing_songs(self.store)
+
+    def test_imports_jsonl_library_with_raw_metadata_and_scan_index(self):
+        songs = [_song(number) for number in range(3)]
+        with open('ipod_songs.jsonl', 'w') as f:
+            for song in songs:
+                f.write(json.dumps(song.to_dict()) + '\n')
+        with open('ipod_raw_metadata.jsonl', 'w') as f:
+            for song in songs:
+                f.write(json.dumps({'file_path': song.file_path, 'raw_metadata': {'TCON': ['Rock']}}) + '\n')
+        with open(LEGACY_SCAN_INDEX, 'w') as f:
+            json.dump({songs[0].file_path: [1, 2, 3]}, f)
+
+        loaded = self.load()
+        self.assertEqual([song.file_path for song in loaded], [song.file_path for song in songs])
+        self.assertEqual(loaded[2].raw_metadata, {'TCON': ['Rock']})
+        # Saved before songs had a genre, which comes from the raw metadata
+        self.assertEqual(loaded[2].genre, 'Rock')
+        self.assertEqual(self.store.fingerprints(), {songs[0].file_path: [1, 2, 3]})
+        for path in ('ipod_songs.jsonl', 'ipod_raw_metadata.jsonl', LEGACY_SCAN_INDEX):
+            self.assertFalse(os.path.exists(path))
+
+    def test_imports_json_array_library(self):
+        with open('ipod_songs.json', 'w') as f:
+            json.dump([dict(_song(number).to_dict(), raw_metadata={}) for number in range(2)], f)
+        self.assertEqual(len(self.load()), 2)
+        self.assertFalse(os.path.exists('ipod_songs.json'))
+
+    def test_unreadable_library_is_kept(self):
+        with open('ipod_songs.jsonl', 'w') as f:
+            f.write('{"title": \n')
+        self.assertIsNone(self.load())
+        self.assertTrue(os.path.exists('ipod_songs.jsonl'))
+
+    def test_nothing_to_import(self):
+        self.assertFalse(import_legacy_library(self.store))
+        self.assertIsNone(self.load())
+
+if __name__ == '__main__':
+    unittest.main()